@@ -0,0 +1,130 @@
+"""
+Cold-start benchmark: how long importing the app takes in a fresh interpreter.
+
+Each run starts a new Python process that imports `main` (the FastAPI
+app), the way a uvicorn worker does. The interpreter's own start-up
+time is measured separately and subtracted. The script also fails if
+one of the heavy packages that should only load on first use was
+imported, since that is how cold-start regressions usually creep in.
+
+Usage (from the repository root):
+    python benchmarks/import_time.py
+    python benchmarks/import_time.py --runs 10 --budget 0.8 --json
+
+Exits with status 1 when the median import time is over the budget or
+a deferred package was imported, so it can guard start-up time in CI.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Loaded on first use (agent stack, image processing), never at import
+DEFERRED_PACKAGES = ["strands", "strands_tools", "openai", "PIL", "numpy", "langchain_core", "ddgs", "tiktoken"]
+
+_PROBE = (
+    "import sys, json, {module}; "
+    "print(json.dumps(sorted({{m.split('.')[0] for m in sys.modules}})))"
+)
+
+
+def _run(code: str, importtime: bool = False) -> tuple:
+    """Run `code` in a fresh interpreter; return (seconds, stdout, stderr)."""
+    command = [sys.executable] + (["-X", "importtime"] if importtime else []) + ["-c", code]
+    env = dict(os.environ, PYTHONDONTWRITEBYTECODE="1")
+
+    started = time.perf_counter()
+    result = subprocess.run(command, cwd=ROOT, env=env, capture_output=True, text=True)
+    elapsed = time.perf_counter() - started
+
+    if result.returncode != 0:
+        raise RuntimeError(f"Import failed:\n{result.stderr[-2000:]}")
+    return elapsed, result.stdout, result.stderr
+
+
+def _slowest_imports(importtime_log: str, module: str, top: int) -> list:
+    """The module's direct imports, grouped by package, by cumulative time."""
+    packages = {}
+    children = []
+    for line in importtime_log.splitlines():
+        if not line.startswith("import time:") or line.count("|") != 2:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if not cumulative.strip().isdigit():
+            continue  # header line
+
+        # Output is post-order: children are listed before their parent
+        depth = (len(name) - len(name.lstrip())) // 2
+        if depth == 1:
+            children.append((name.strip(), int(cumulative)))
+        elif depth == 0:
+            if name.strip() == module:
+                for child, us in children:
+                    package = child.split(".")[0]
+                    packages[package] = packages.get(package, 0) + us
+            children = []
+
+    ranked = sorted(packages.items(), key=lambda item: item[1], reverse=True)[:top]
+    return [{"package": name, "ms": round(us / 1000, 1)} for name, us in ranked]
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", default="main", help="module to import (default: main)")
+    parser.add_argument("--runs", type=int, default=5, help="fresh interpreters to time (default: 5)")
+    parser.add_argument("--budget", type=float, default=1.0, help="max median import seconds (default: 1.0)")
+    parser.add_argument("--top", type=int, default=10, help="slowest packages to list (default: 10)")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args()
+
+    # One untimed run so the page cache is warm, as on a restarted replica
+    _run(f"import {args.module}")
+
+    baseline = statistics.median(_run("pass")[0] for _ in range(args.runs))
+    samples = [_run(f"import {args.module}")[0] - baseline for _ in range(args.runs)]
+
+    _, stdout, _ = _run(_PROBE.format(module=args.module))
+    loaded = set(json.loads(stdout.strip().splitlines()[-1]))
+    premature = [package for package in DEFERRED_PACKAGES if package in loaded]
+
+    _, _, importtime_log = _run(f"import {args.module}", importtime=True)
+
+    median = statistics.median(samples)
+    report = {
+        "module": args.module,
+        "runs": args.runs,
+        "interpreter_seconds": round(baseline, 4),
+        "import_seconds": {
+            "median": round(median, 4),
+            "min": round(min(samples), 4),
+            "max": round(max(samples), 4)
+        },
+        "budget_seconds": args.budget,
+        "deferred_packages_loaded": premature,
+        "slowest_imports": _slowest_imports(importtime_log, args.module, args.top),
+        "passed": median <= args.budget and not premature
+    }
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print(f"import {args.module}: median {median * 1000:.0f} ms "
+              f"(min {min(samples) * 1000:.0f}, max {max(samples) * 1000:.0f}; "
+              f"interpreter {baseline * 1000:.0f} ms excluded) — budget {args.budget * 1000:.0f} ms")
+        print("slowest imports:")
+        for entry in report["slowest_imports"]:
+            print(f"  {entry['package']:<24} {entry['ms']:>8.1f} ms")
+        if premature:
+            print(f"❌ loaded at import time but should be deferred: {', '.join(premature)}")
+        print("✅ within budget" if report["passed"] else "❌ over budget")
+
+    return 0 if report["passed"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
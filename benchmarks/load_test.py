@@ -0,0 +1,498 @@
+"""
+Load benchmark: throughput and latency of POST /chat against stub upstreams.
+
+Starts benchmarks/stub_server.py (fake OpenAI chat, images and edits,
+plus a search endpoint standing in for DuckDuckGo) and the app itself
+(`uvicorn main:app`) on free local ports, with storage in a temporary
+directory. It then sends a seeded mix of text, search and image
+messages to /chat at each concurrency level and reports:
+
+    - latency p50/p95/p99/mean/max and requests per second
+    - errors (non-200 responses and "Sorry, I encountered an error" replies)
+    - event loop lag, from the app's event_loop_lag_seconds histogram
+    - memory per session: worker RSS growth and the agents' approx_bytes
+    - upstream calls the stub served
+
+Each level tags its messages (e.g. "... (level 2 c4)"), so the image,
+search and response caches filled by one level don't serve the next
+and the levels stay comparable. Repeats within a level still hit.
+
+Nothing leaves the machine, so numbers depend only on the code and the
+stub latencies, and reports from different commits can be compared.
+
+Usage (from the repository root):
+    python benchmarks/load_test.py
+    python benchmarks/load_test.py --concurrency 1,8,32 --requests 200 --llm-ttfb 0.3
+    python benchmarks/load_test.py --error-rate 0.05 --env OFFLOAD_MAX_WORKERS=8
+    python benchmarks/load_test.py --output after.json --compare before.json
+"""
+import os
+import sys
+import json
+import math
+import time
+import socket
+import random
+import asyncio
+import argparse
+import platform
+import tempfile
+import statistics
+import subprocess
+
+import httpx
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCHEMA_VERSION = 1
+
+MESSAGES = {
+    "text": [
+        "What is machine learning?",
+        "Explain the difference between TCP and UDP",
+        "Give me three tips for writing clean code",
+        "How do vaccines work?"
+    ],
+    "search": [
+        "search latest python release",
+        "search weather in Berlin today",
+        "search best hiking trails near Seattle"
+    ],
+    "image": [
+        "Create an image of a lighthouse at sunset",
+        "Make an image of a cat wearing a hat",
+        "Draw an image of a mountain lake in winter"
+    ]
+}
+
+# Reported in the "changes" section of --compare; True when higher is better
+COMPARED = {
+    "rps": True,
+    "latency_ms.p50": False,
+    "latency_ms.p95": False,
+    "latency_ms.p99": False,
+    "error_rate": False,
+    "event_loop_lag_ms.mean": False,
+    "memory.rss_bytes_per_session": False
+}
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _git(*args) -> str:
+    try:
+        return subprocess.run(["git", *args], cwd=ROOT, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def _rss_bytes(pid: int) -> int:
+    """Resident memory of a process (Linux); 0 where /proc isn't available."""
+    try:
+        with open(f"/proc/{pid}/status") as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return 0
+
+
+def _percentile(samples: list, fraction: float) -> float:
+    """Nearest-rank percentile of sorted samples."""
+    if not samples:
+        return 0.0
+    return samples[min(len(samples), max(1, math.ceil(fraction * len(samples)))) - 1]
+
+
+def _parse_mix(value: str) -> dict:
+    mix = {}
+    for part in value.split(","):
+        kind, _, weight = part.partition("=")
+        if kind not in MESSAGES:
+            raise argparse.ArgumentTypeError(f"unknown message kind {kind!r} (use {', '.join(MESSAGES)})")
+        mix[kind] = float(weight or 1)
+    return mix
+
+
+def _parse_lag(metrics_text: str) -> dict:
+    """Buckets, sum and count of event_loop_lag_seconds from /metrics."""
+    lag = {"buckets": {}, "sum": 0.0, "count": 0}
+    for line in metrics_text.splitlines():
+        if not line.startswith("event_loop_lag_seconds"):
+            continue
+        name, _, value = line.rpartition(" ")
+        if name.startswith("event_loop_lag_seconds_bucket"):
+            bound = name.split('le="', 1)[1].split('"', 1)[0]
+            lag["buckets"][float(bound)] = float(value)
+        elif name == "event_loop_lag_seconds_sum":
+            lag["sum"] = float(value)
+        elif name == "event_loop_lag_seconds_count":
+            lag["count"] = int(float(value))
+    return lag
+
+
+def _lag_delta(before: dict, after: dict) -> dict:
+    """Event loop lag observed between two /metrics scrapes, in ms."""
+    count = after["count"] - before["count"]
+    if count <= 0:
+        return {"samples": 0, "mean": None, "p99_le": None}
+
+    # Upper bound of the bucket holding the 99th percentile sample
+    p99 = None
+    for bound in sorted(after["buckets"]):
+        if after["buckets"][bound] - before["buckets"].get(bound, 0) >= 0.99 * count:
+            p99 = bound
+            break
+
+    return {
+        "samples": count,
+        "mean": round((after["sum"] - before["sum"]) / count * 1000, 2),
+        "p99_le": None if p99 is None or p99 == float("inf") else round(p99 * 1000, 2)
+    }
+
+
+class Servers:
+    """The stub and the app as subprocesses; stopped on exit."""
+
+    def __init__(self, args):
+        self.args = args
+        self.tmp = tempfile.TemporaryDirectory(prefix="sarvo-bench-")
+        self.stub_port = _free_port()
+        self.app_port = _free_port()
+        self.stub_url = f"http://127.0.0.1:{self.stub_port}"
+        self.app_url = f"http://127.0.0.1:{self.app_port}"
+        self.processes = []
+
+    def _spawn(self, command: list, env: dict, name: str) -> subprocess.Popen:
+        log = open(os.path.join(self.tmp.name, f"{name}.log"), "w")
+        process = subprocess.Popen(command, cwd=ROOT, env=env, stdout=log, stderr=subprocess.STDOUT)
+        self.processes.append((name, process, log))
+        return process
+
+    def log_tail(self, name: str) -> str:
+        with open(os.path.join(self.tmp.name, f"{name}.log")) as log:
+            return log.read()[-3000:]
+
+    def start(self):
+        args = self.args
+        self._spawn([
+            sys.executable, os.path.join(ROOT, "benchmarks", "stub_server.py"),
+            "--port", str(self.stub_port),
+            "--llm-ttfb", str(args.llm_ttfb),
+            "--llm-token-delay", str(args.llm_token_delay),
+            "--image-latency", str(args.image_latency),
+            "--search-latency", str(args.search_latency),
+            "--error-rate", str(args.error_rate),
+            "--error-status", str(args.error_status),
+            "--seed", str(args.seed)
+        ], dict(os.environ), "stub")
+
+        data = self.tmp.name
+        env = dict(
+            os.environ,
+            OPENAI_API_KEY="sk-benchmark",
+            OPENAI_BASE_URL=f"{self.stub_url}/v1",
+            SEARCH_API_URL=f"{self.stub_url}/search",
+            UPLOAD_DIR=os.path.join(data, "uploads"),
+            OUTPUT_DIR=os.path.join(data, "outputs"),
+            STORAGE_DB_PATH=os.path.join(data, "storage.sqlite3"),
+            JOB_DB_PATH=os.path.join(data, "jobs.sqlite3"),
+            STATE_DB_PATH=os.path.join(data, "state.sqlite3"),
+            LOG_LEVEL="WARNING",
+            PYTHONDONTWRITEBYTECODE="1"
+        )
+        env.update(args.env)
+
+        self.app = self._spawn([
+            sys.executable, "-m", "uvicorn", "main:app",
+            "--host", "127.0.0.1", "--port", str(self.app_port),
+            "--workers", str(args.workers), "--log-level", "warning"
+        ], env, "app")
+
+    async def wait_ready(self, client: httpx.AsyncClient, timeout: float = 60.0):
+        deadline = time.monotonic() + timeout
+        for name, url in (("stub", f"{self.stub_url}/stats"), ("app", f"{self.app_url}/health")):
+            while True:
+                process = next(p for n, p, _ in self.processes if n == name)
+                if process.poll() is not None:
+                    raise RuntimeError(f"{name} exited with {process.returncode}:\n{self.log_tail(name)}")
+                try:
+                    if (await client.get(url)).status_code == 200:
+                        break
+                except httpx.TransportError:
+                    pass
+                if time.monotonic() > deadline:
+                    raise RuntimeError(f"{name} not ready after {timeout:.0f}s:\n{self.log_tail(name)}")
+                await asyncio.sleep(0.2)
+
+    def app_pids(self) -> list:
+        """The app process and its uvicorn worker children, if any."""
+        pids = [self.app.pid]
+        try:
+            with open(f"/proc/{self.app.pid}/task/{self.app.pid}/children") as children:
+                pids += [int(pid) for pid in children.read().split()]
+        except OSError:
+            pass
+        return pids
+
+    def rss(self) -> int:
+        return sum(_rss_bytes(pid) for pid in self.app_pids())
+
+    def stop(self):
+        for _, process, _ in reversed(self.processes):
+            if process.poll() is None:
+                process.terminate()
+        for _, process, log in reversed(self.processes):
+            try:
+                process.wait(timeout=15)
+            except subprocess.TimeoutExpired:
+                process.kill()
+                process.wait()
+            log.close()
+        self.tmp.cleanup()
+
+
+def _conversations(requests: int, turns: int, mix: dict, rng: random.Random, tag: str) -> list:
+    """Message lists, one per session, `requests` messages in total, each ending in `tag`."""
+    kinds = list(mix)
+    weights = [mix[kind] for kind in kinds]
+    messages = [f"{rng.choice(MESSAGES[rng.choices(kinds, weights)[0]])} ({tag})" for _ in range(requests)]
+    return [messages[i:i + turns] for i in range(0, requests, turns)]
+
+
+async def _run_level(client: httpx.AsyncClient, servers: Servers, concurrency: int, tag: str, args, rng: random.Random) -> dict:
+    conversations = _conversations(args.requests, args.turns_per_session, args.mix, rng, tag)
+    queue = asyncio.Queue()
+    for conversation in conversations:
+        queue.put_nowait(conversation)
+
+    latencies = []
+    errors = {}
+
+    async def worker():
+        while not queue.empty():
+            conversation = queue.get_nowait()
+            session_id = None
+            for message in conversation:
+                started = time.perf_counter()
+                try:
+                    response = await client.post(
+                        f"{servers.app_url}/chat",
+                        json={"message": message, "session_id": session_id}
+                    )
+                    elapsed = time.perf_counter() - started
+                    if response.status_code != 200:
+                        error = f"http_{response.status_code}"
+                    else:
+                        body = response.json()
+                        session_id = body["session_id"]
+                        error = "agent_error" if body["content"].startswith("Sorry, I encountered an error") else None
+                except httpx.HTTPError as e:
+                    elapsed = time.perf_counter() - started
+                    error = type(e).__name__
+
+                latencies.append(elapsed)
+                if error:
+                    errors[error] = errors.get(error, 0) + 1
+
+    metrics_before = _parse_lag((await client.get(f"{servers.app_url}/metrics")).text)
+    stub_before = (await client.get(f"{servers.stub_url}/stats")).json()
+    state_before = (await client.get(f"{servers.app_url}/stats/state")).json()["sessions"]
+    rss_before = servers.rss()
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    wall = time.perf_counter() - started
+
+    metrics_after = _parse_lag((await client.get(f"{servers.app_url}/metrics")).text)
+    stub_after = (await client.get(f"{servers.stub_url}/stats")).json()
+    state_after = (await client.get(f"{servers.app_url}/stats/state")).json()["sessions"]
+    rss_after = servers.rss()
+
+    latencies.sort()
+    count = len(latencies)
+    failed = sum(errors.values())
+
+    # With several workers /stats/state only reflects the one that answered
+    new_sessions = state_after["active_sessions"] - state_before["active_sessions"]
+    rss_growth = rss_after - rss_before
+
+    return {
+        "concurrency": concurrency,
+        "requests": count,
+        "sessions": len(conversations),
+        "wall_seconds": round(wall, 3),
+        "rps": round(count / wall, 2) if wall else 0.0,
+        "latency_ms": {
+            "p50": round(_percentile(latencies, 0.50) * 1000, 1),
+            "p95": round(_percentile(latencies, 0.95) * 1000, 1),
+            "p99": round(_percentile(latencies, 0.99) * 1000, 1),
+            "mean": round(statistics.fmean(latencies) * 1000, 1) if latencies else 0.0,
+            "max": round(latencies[-1] * 1000, 1) if latencies else 0.0
+        },
+        "errors": errors,
+        "error_rate": round(failed / count, 4) if count else 0.0,
+        "event_loop_lag_ms": _lag_delta(metrics_before, metrics_after),
+        "memory": {
+            "rss_bytes": rss_after,
+            "rss_growth_bytes": rss_growth,
+            "rss_bytes_per_session": round(rss_growth / len(conversations)) if conversations else 0,
+            "active_sessions": state_after["active_sessions"],
+            "approx_bytes_per_session": round(
+                (state_after["approx_bytes"] - state_before["approx_bytes"]) / new_sessions
+            ) if new_sessions > 0 else None
+        },
+        "upstream_calls": {key: value - stub_before.get(key, 0) for key, value in stub_after.items()}
+    }
+
+
+def _lookup(level: dict, path: str):
+    value = level
+    for part in path.split("."):
+        value = value.get(part) if isinstance(value, dict) else None
+    return value
+
+
+def _compare(report: dict, baseline: dict) -> list:
+    """Per-level % changes of the COMPARED metrics against a baseline report."""
+    previous = {level["concurrency"]: level for level in baseline.get("levels", [])}
+    changes = []
+
+    for level in report["levels"]:
+        before = previous.get(level["concurrency"])
+        if before is None:
+            continue
+        for path, higher_is_better in COMPARED.items():
+            old, new = _lookup(before, path), _lookup(level, path)
+            if old is None or new is None:
+                continue
+            change = (new - old) / old * 100 if old else (0.0 if new == old else None)
+            changes.append({
+                "concurrency": level["concurrency"],
+                "metric": path,
+                "baseline": old,
+                "current": new,
+                "change_pct": None if change is None else round(change, 1),
+                "better": None if change is None or change == 0 else (change > 0) == higher_is_better
+            })
+
+    return changes
+
+
+async def _benchmark(args) -> dict:
+    servers = Servers(args)
+    rng = random.Random(args.seed)
+
+    limits = httpx.Limits(max_connections=max(args.concurrency) + 4, max_keepalive_connections=max(args.concurrency) + 4)
+    async with httpx.AsyncClient(timeout=args.timeout, limits=limits) as client:
+        try:
+            servers.start()
+            await servers.wait_ready(client)
+
+            # Warm the agent stack, tool imports and connection pools
+            for kind in args.mix:
+                await client.post(f"{servers.app_url}/chat", json={"message": MESSAGES[kind][0]})
+            rss_idle = servers.rss()
+
+            levels = []
+            for index, concurrency in enumerate(args.concurrency, 1):
+                level = await _run_level(client, servers, concurrency, f"level {index} c{concurrency}", args, rng)
+                levels.append(level)
+                if not args.json:
+                    latency = level["latency_ms"]
+                    lag = level["event_loop_lag_ms"]
+                    print(f"c={concurrency:<4} {level['rps']:>8.2f} req/s   "
+                          f"p50 {latency['p50']:>7.1f}  p95 {latency['p95']:>7.1f}  p99 {latency['p99']:>7.1f} ms   "
+                          f"errors {level['error_rate'] * 100:.1f}%   "
+                          f"loop lag {lag['mean'] if lag['mean'] is not None else '-'} ms   "
+                          f"rss/session {level['memory']['rss_bytes_per_session'] / 1024:.0f} KiB",
+                          file=sys.stderr)
+        finally:
+            servers.stop()
+
+    return {
+        "schema_version": SCHEMA_VERSION,
+        "git": {"commit": _git("rev-parse", "HEAD"), "dirty": bool(_git("status", "--porcelain", "--untracked-files=no"))},
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "settings": {
+            "concurrency": args.concurrency,
+            "requests": args.requests,
+            "turns_per_session": args.turns_per_session,
+            "mix": args.mix,
+            "prompts_tagged_per_level": True,
+            "workers": args.workers,
+            "seed": args.seed,
+            "llm_ttfb": args.llm_ttfb,
+            "llm_token_delay": args.llm_token_delay,
+            "image_latency": args.image_latency,
+            "search_latency": args.search_latency,
+            "error_rate": args.error_rate,
+            "env": args.env
+        },
+        "rss_idle_bytes": rss_idle,
+        "levels": levels
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=lambda v: [int(c) for c in v.split(",")], default=[1, 4, 16],
+                        help="comma-separated concurrent clients per level (default: 1,4,16)")
+    parser.add_argument("--requests", type=int, default=100, help="requests per level (default: 100)")
+    parser.add_argument("--turns-per-session", type=int, default=3, help="messages per session (default: 3)")
+    parser.add_argument("--mix", type=_parse_mix, default={"text": 6, "search": 3, "image": 1},
+                        help="message kind weights (default: text=6,search=3,image=1)")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn workers (default: 1)")
+    parser.add_argument("--seed", type=int, default=0, help="seed for messages and error injection (default: 0)")
+    parser.add_argument("--timeout", type=float, default=120.0, help="per-request timeout in seconds (default: 120)")
+    parser.add_argument("--llm-ttfb", type=float, default=0.05, help="stub seconds to the first chat chunk (default: 0.05)")
+    parser.add_argument("--llm-token-delay", type=float, default=0.005, help="stub seconds between words (default: 0.005)")
+    parser.add_argument("--image-latency", type=float, default=0.3, help="stub seconds per image call (default: 0.3)")
+    parser.add_argument("--search-latency", type=float, default=0.05, help="stub seconds per search (default: 0.05)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of stub calls that fail (default: 0)")
+    parser.add_argument("--error-status", type=int, default=500, help="HTTP status of injected failures (default: 500)")
+    parser.add_argument("--env", action="append", default=[], metavar="KEY=VALUE",
+                        help="extra app environment, e.g. --env STATE_BACKEND=sqlite (repeatable)")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    parser.add_argument("--output", help="also write the JSON report to this file")
+    parser.add_argument("--compare", metavar="BASELINE", help="JSON report from an earlier run to compare with")
+    args = parser.parse_args()
+    args.env = dict(item.split("=", 1) for item in args.env)
+
+    report = asyncio.run(_benchmark(args))
+
+    if args.compare:
+        with open(args.compare) as baseline:
+            previous = json.load(baseline)
+        report["comparison"] = {
+            "baseline": args.compare,
+            "settings_differ": previous.get("settings") != report["settings"],
+            "changes": _compare(report, previous)
+        }
+
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(report, output, indent=2)
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    elif args.compare:
+        print(f"compared with {args.compare}:")
+        if report["comparison"]["settings_differ"]:
+            print("  ⚠️  baseline was run with different settings")
+        for change in report["comparison"]["changes"]:
+            mark = "  " if change["better"] is None else ("✅" if change["better"] else "❌")
+            pct = "n/a" if change["change_pct"] is None else f"{change['change_pct']:+.1f}%"
+            print(f"  {mark} c={change['concurrency']:<4} {change['metric']:<30} "
+                  f"{change['baseline']} -> {change['current']} ({pct})")
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,213 @@
+"""
+Local stand-in for the upstreams the app calls, for benchmarks.
+
+Serves the OpenAI endpoints the app uses (streamed chat completions,
+non-streamed ones for the history summary, image generations and
+edits) plus a JSON search endpoint for SEARCH_API_URL, so the app can
+be load-tested without network access or API costs.
+
+The chat model is scripted from the last user message:
+    "... image of ..."  -> calls generate_image, then answers
+    "search ..."        -> calls websearch, then answers
+    anything else       -> a plain streamed answer
+
+Latency and failures are configurable, so slow or flaky upstreams can
+be simulated. GET /stats returns how many calls each endpoint served.
+
+Usage (from the repository root):
+    python benchmarks/stub_server.py --port 9100 --llm-ttfb 0.2 --error-rate 0.05
+Then start the app with OPENAI_BASE_URL=http://127.0.0.1:9100/v1 and
+SEARCH_API_URL=http://127.0.0.1:9100/search.
+"""
+import io
+import json
+import time
+import uuid
+import base64
+import random
+import asyncio
+import argparse
+from collections import Counter
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+ANSWER_WORDS = (
+    "Sure. Here is a short answer based on what I know. It covers the main idea, "
+    "a quick example and one thing to watch out for."
+).split(" ")
+
+
+def _png(size: int = 64) -> bytes:
+    from PIL import Image
+
+    buffer = io.BytesIO()
+    Image.new("RGB", (size, size), (40, 120, 200)).save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+def create_app(
+    llm_ttfb: float = 0.05,
+    llm_token_delay: float = 0.005,
+    image_latency: float = 0.3,
+    search_latency: float = 0.05,
+    error_rate: float = 0.0,
+    error_status: int = 500,
+    seed: int = 0
+) -> FastAPI:
+    """Build the stub app with the given latencies (seconds) and failure rate."""
+    app = FastAPI(title="Upstream stub")
+    calls = Counter()
+    rng = random.Random(seed)
+    png_base64 = base64.b64encode(_png()).decode()
+
+    def failure(endpoint: str):
+        """An injected error response, or None."""
+        if error_rate and rng.random() < error_rate:
+            calls[f"{endpoint}_errors"] += 1
+            return JSONResponse(
+                {"error": {"message": "Injected failure", "type": "server_error", "code": None}},
+                status_code=error_status
+            )
+        return None
+
+    def chunk(delta: dict, finish_reason=None) -> str:
+        body = {
+            "id": "chatcmpl-stub", "object": "chat.completion.chunk", "created": int(time.time()), "model": "stub",
+            "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]
+        }
+        return f"data: {json.dumps(body)}\n\n"
+
+    def user_text(message: dict) -> str:
+        content = message.get("content")
+        if isinstance(content, list):
+            return " ".join(part.get("text", "") for part in content if isinstance(part, dict))
+        return content or ""
+
+    def plan(messages: list):
+        """(tool name, arguments) the scripted model calls, or None to answer."""
+        last = messages[-1]
+        if last.get("role") != "user":
+            return None  # a tool result came back: answer
+        text = user_text(last).lower()
+        if "image of" in text:
+            return "generate_image", {"prompt": text.split("image of", 1)[1].strip()[:200] or "a test image", "quality": "low"}
+        if "search" in text:
+            return "websearch", {"keywords": text.replace("search", "").strip()[:100] or "test"}
+        return None
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        calls["chat"] += 1
+
+        error = failure("chat")
+        if error is not None:
+            return error
+
+        await asyncio.sleep(llm_ttfb)
+        usage = {"prompt_tokens": sum(len(user_text(m)) // 4 for m in body["messages"]), "completion_tokens": len(ANSWER_WORDS)}
+        usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+
+        if not body.get("stream"):
+            return {
+                "id": "chatcmpl-stub", "object": "chat.completion", "created": int(time.time()), "model": "stub",
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": " ".join(ANSWER_WORDS)}, "finish_reason": "stop"}],
+                "usage": usage
+            }
+
+        tool_call = plan(body["messages"])
+
+        async def stream():
+            if tool_call is not None:
+                name, arguments = tool_call
+                yield chunk({"role": "assistant", "tool_calls": [{
+                    "index": 0, "id": f"call_{uuid.uuid4().hex[:12]}", "type": "function",
+                    "function": {"name": name, "arguments": json.dumps(arguments)}
+                }]})
+                yield chunk({}, "tool_calls")
+            else:
+                for i, word in enumerate(ANSWER_WORDS):
+                    if llm_token_delay:
+                        await asyncio.sleep(llm_token_delay)
+                    yield chunk({"content": word if i == 0 else " " + word})
+                yield chunk({}, "stop")
+
+            yield f"data: {json.dumps({'id': 'chatcmpl-stub', 'object': 'chat.completion.chunk', 'created': 0, 'model': 'stub', 'choices': [], 'usage': usage})}\n\n"
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(stream(), media_type="text/event-stream")
+
+    @app.post("/v1/images/generations")
+    async def image_generations(request: Request):
+        body = await request.json()
+        calls["images"] += 1
+
+        error = failure("images")
+        if error is not None:
+            return error
+
+        await asyncio.sleep(image_latency)
+        return {"created": int(time.time()), "data": [{"b64_json": png_base64}] * int(body.get("n", 1))}
+
+    @app.post("/v1/images/edits")
+    async def image_edits(request: Request):
+        await request.form()
+        calls["edits"] += 1
+
+        error = failure("edits")
+        if error is not None:
+            return error
+
+        await asyncio.sleep(image_latency)
+        return {"created": int(time.time()), "data": [{"b64_json": png_base64}]}
+
+    @app.get("/search")
+    async def search(q: str, region: str = "us-en", max_results: int = 5):
+        calls["search"] += 1
+
+        error = failure("search")
+        if error is not None:
+            return error
+
+        await asyncio.sleep(search_latency)
+        return [
+            {"title": f"Result {i + 1} for {q}", "href": f"https://example.com/{i + 1}", "body": f"Snippet {i + 1} about {q}."}
+            for i in range(max_results)
+        ]
+
+    @app.get("/stats")
+    async def stats():
+        return dict(calls)
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--llm-ttfb", type=float, default=0.05, help="seconds before the first chat chunk (default: 0.05)")
+    parser.add_argument("--llm-token-delay", type=float, default=0.005, help="seconds between streamed words (default: 0.005)")
+    parser.add_argument("--image-latency", type=float, default=0.3, help="seconds per image call (default: 0.3)")
+    parser.add_argument("--search-latency", type=float, default=0.05, help="seconds per search (default: 0.05)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of calls that fail (default: 0)")
+    parser.add_argument("--error-status", type=int, default=500, help="HTTP status of injected failures (default: 500)")
+    parser.add_argument("--seed", type=int, default=0, help="seed for error injection (default: 0)")
+    args = parser.parse_args()
+
+    import uvicorn
+
+    app = create_app(
+        llm_ttfb=args.llm_ttfb,
+        llm_token_delay=args.llm_token_delay,
+        image_latency=args.image_latency,
+        search_latency=args.search_latency,
+        error_rate=args.error_rate,
+        error_status=args.error_status,
+        seed=args.seed
+    )
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,7 @@
 
 
-import os
+import asyncio
+import importlib
 from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
@@ -8,10 +9,39 @@ from fastapi.staticfiles import StaticFiles
 from fastapi.responses import FileResponse, RedirectResponse
 
 # Import configuration
-from src.agents.config import Config, validate_config
+from src.agents.config import Config, ensure_directories, validate_config
+from src.services.offload import install_offload_executor, run_blocking, shutdown_offload_executor
+from src.services.clients import start_clients, close_clients
+from src.services.telemetry import MetricsMiddleware, configure_logging, monitor_event_loop, setup_tracing
 
 # Import routers (API endpoints)
 from src.endpoints.chat_router import router as chat_router
+from src.endpoints.jobs_router import router as jobs_router
+from src.endpoints.stats_router import router as stats_router
+from src.endpoints.images_router import router as images_router
+from src.endpoints.outputs_router import router as outputs_router
+from src.endpoints.upload_router import router as upload_router
+
+
+def _lazy_handler(module: str, name: str):
+    """Job handler that imports its tool module on the first job, not at startup."""
+    async def handler(params: dict) -> dict:
+        return await getattr(importlib.import_module(module), name)(params)
+
+    return handler
+
+
+def _prewarm():
+    """Load the agent stack and build the shared model client. Runs in the offload pool."""
+    from src.agents.master_agent import get_shared_model
+    get_shared_model()
+
+
+def _load_tokenizer():
+    """Load the tiktoken encoding used for history budgets. Runs in the offload pool."""
+    from src.agents.history_manager import load_encoding
+    load_encoding()
+
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
@@ -22,6 +52,9 @@ async def lifespan(app: FastAPI):
     Shutdown: Runs when server stops
     """
     # ===== STARTUP =====
+    configure_logging()
+    setup_tracing()
+
     print("\n" + "="*60)
     print("🚀 SARVO AI AGENT CHATBOT - STARTING UP")
     print("="*60)
@@ -31,18 +64,77 @@ async def lifespan(app: FastAPI):
         print("⚠️  Configuration issues detected. Some features may not work.")
     
     # Create necessary directories
-    os.makedirs(Config.UPLOAD_DIR, exist_ok=True)
-    os.makedirs(Config.OUTPUT_DIR, exist_ok=True)
+    ensure_directories()
+
+    # event_loop_lag_seconds in /metrics
+    loop_monitor = None
+    if Config.EVENT_LOOP_MONITOR_INTERVAL > 0:
+        loop_monitor = asyncio.create_task(monitor_event_loop())
+
+    # Bounded thread pool for sync tools and other blocking work
+    install_offload_executor(asyncio.get_running_loop())
+
+    # Pooled HTTP / OpenAI clients shared by the agent and all tools
+    await start_clients()
+
+    # Sessions, search cache and job status shared between workers
+    # (STATE_BACKEND); created now so a bad setting fails at startup
+    from src.services.state_store import get_state_store, close_state_store
+    get_state_store()
+
+    # Background workers for image jobs
+    from src.services.jobs import get_job_manager
+    job_manager = get_job_manager()
+    job_manager.register(
+        "image_generate",
+        _lazy_handler("src.tools.image_generator", "run_generate_job"),
+        Config.JOB_CONCURRENCY_IMAGE_GENERATE
+    )
+    job_manager.register(
+        "image_edit",
+        _lazy_handler("src.tools.image_editor", "run_edit_job"),
+        Config.JOB_CONCURRENCY_IMAGE_EDIT
+    )
+    await job_manager.start()
+
+    # Drop expired sessions even when no request comes in
+    from src.agents.session_pool import get_session_pool
+    session_pool = get_session_pool()
+    await session_pool.start()
+
+    # Quota / TTL cleanup of uploads and outputs
+    from src.services.storage import get_storage_manager
+    storage_manager = get_storage_manager()
+    if Config.STORAGE_GC_ENABLED:
+        await storage_manager.start()
     
-    # Initialize the agent (pre-warm)
-    print("🤖 Pre-warming AI agent...")
-    from src.agents.master_agent import get_master_agent
-    get_master_agent()
+    # Build the shared model client and tools once (pre-warm);
+    # per-session agents are created on demand from the session pool.
+    # Done in the background so the server takes requests right away.
+    prewarm = None
+    if Config.PREWARM_AGENT:
+        print("🤖 Pre-warming AI agent in the background...")
+        prewarm = asyncio.create_task(run_blocking(_prewarm))
+
+    # The BPE file may be read from disk or downloaded; keep it off the loop
+    tokenizer = asyncio.create_task(run_blocking(_load_tokenizer))
     
     yield  # Server is running
     
     # ===== SHUTDOWN =====
     print("\n🛑 Shutting down Sarvo AI...")
+    if prewarm is not None:
+        await asyncio.gather(prewarm, return_exceptions=True)
+    await asyncio.gather(tokenizer, return_exceptions=True)
+    if loop_monitor is not None:
+        loop_monitor.cancel()
+        await asyncio.gather(loop_monitor, return_exceptions=True)
+    await session_pool.stop()
+    await storage_manager.stop()
+    await job_manager.stop()
+    close_state_store()
+    await close_clients()
+    shutdown_offload_executor()
     print("👋 Goodbye!\n")
 
 
@@ -67,9 +159,17 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Request latency for /metrics (and a span per request when tracing is on)
+app.add_middleware(MetricsMiddleware)
+
 
 
 app.include_router(chat_router)
+app.include_router(jobs_router)
+app.include_router(stats_router)
+app.include_router(images_router)
+app.include_router(outputs_router)
+app.include_router(upload_router)
 
 
 
@@ -104,6 +204,7 @@ async def get_info():
         "capabilities": [
             "chat",
             "image_generation",
+            "batch_image_generation",
             "image_editing", 
             "web_search"
         ],
@@ -113,7 +214,8 @@ async def get_info():
         },
         "endpoints": {
             "chat": "POST /api/chat",
-            "upload": "POST /api/upload",
+            "upload": "POST /upload",
+            "metrics": "GET /metrics",
             "history": "GET /api/history",
             "clear": "POST /api/clear",
             "files": "GET /api/files"
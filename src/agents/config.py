@@ -12,6 +12,129 @@ class Config:
     UPLOAD_DIR: str = os.getenv("UPLOAD_DIR", "uploads")
     OUTPUT_DIR: str = os.getenv("OUTPUT_DIR", "outputs")
     MAX_FILE_SIZE_MB: int = int(os.getenv("MAX_FILE_SIZE_MB", "50"))
+    DOWNLOAD_TIMEOUT_SECONDS: float = float(os.getenv("DOWNLOAD_TIMEOUT_SECONDS", "30"))
+
+    # Shared HTTP / OpenAI client pools
+    OPENAI_BASE_URL: str = os.getenv("OPENAI_BASE_URL", "")
+    OPENAI_TIMEOUT_SECONDS: float = float(os.getenv("OPENAI_TIMEOUT_SECONDS", "180"))
+    HTTP_TIMEOUT_SECONDS: float = float(os.getenv("HTTP_TIMEOUT_SECONDS", "30"))
+    HTTP_MAX_CONNECTIONS: int = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+    HTTP_MAX_KEEPALIVE: int = int(os.getenv("HTTP_MAX_KEEPALIVE", "20"))
+    HTTP_KEEPALIVE_SECONDS: float = float(os.getenv("HTTP_KEEPALIVE_SECONDS", "60"))
+    HTTP2_ENABLED: bool = os.getenv("HTTP2_ENABLED", "True").lower() == "true"
+
+    # Background jobs: when enabled, image tools return a job id right away
+    # and the image is produced by a worker (poll GET /jobs/{id})
+    IMAGE_JOBS_ENABLED: bool = os.getenv("IMAGE_JOBS_ENABLED", "False").lower() == "true"
+    JOB_DB_PATH: str = os.getenv("JOB_DB_PATH", os.path.join("data", "jobs.sqlite3"))
+    JOB_CONCURRENCY_IMAGE_GENERATE: int = int(os.getenv("JOB_CONCURRENCY_IMAGE_GENERATE", "4"))
+    JOB_CONCURRENCY_IMAGE_EDIT: int = int(os.getenv("JOB_CONCURRENCY_IMAGE_EDIT", "2"))
+    JOB_RETENTION_HOURS: float = float(os.getenv("JOB_RETENTION_HOURS", "24"))
+    JOB_WEBHOOK_URL: str = os.getenv("JOB_WEBHOOK_URL", "")
+    # A running job is owned by its worker for this long, renewed while it
+    # runs; jobs whose lease ran out (worker died) are taken over by others
+    JOB_LEASE_SECONDS: float = float(os.getenv("JOB_LEASE_SECONDS", "60"))
+
+    # Batch image generation (POST /images/batch, generate_images tool)
+    IMAGE_BATCH_MAX_ITEMS: int = int(os.getenv("IMAGE_BATCH_MAX_ITEMS", "8"))
+    IMAGE_BATCH_MAX_VARIANTS: int = int(os.getenv("IMAGE_BATCH_MAX_VARIANTS", "4"))
+    IMAGE_BATCH_CONCURRENCY: int = int(os.getenv("IMAGE_BATCH_CONCURRENCY", "4"))
+
+    # websearch result cache
+    SEARCH_CACHE_TTL_SECONDS: float = float(os.getenv("SEARCH_CACHE_TTL_SECONDS", "600"))
+    SEARCH_CACHE_STALE_SECONDS: float = float(os.getenv("SEARCH_CACHE_STALE_SECONDS", "3600"))
+    SEARCH_CACHE_MAX_ENTRIES: int = int(os.getenv("SEARCH_CACHE_MAX_ENTRIES", "1000"))
+    # JSON search endpoint to use instead of DuckDuckGo (GET ?q=&region=&max_results=
+    # returning [{"title", "href", "body"}, ...]), e.g. the benchmark stub
+    SEARCH_API_URL: str = os.getenv("SEARCH_API_URL", "")
+
+    # Opt-in cache of direct answers (turns with no tool call), keyed on the
+    # system prompt, model, normalized message and the last few messages
+    RESPONSE_CACHE_ENABLED: bool = os.getenv("RESPONSE_CACHE_ENABLED", "False").lower() == "true"
+    RESPONSE_CACHE_TTL_SECONDS: float = float(os.getenv("RESPONSE_CACHE_TTL_SECONDS", "3600"))
+    RESPONSE_CACHE_MAX_ENTRIES: int = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "1000"))
+    RESPONSE_CACHE_CONTEXT_MESSAGES: int = int(os.getenv("RESPONSE_CACHE_CONTEXT_MESSAGES", "2"))
+
+    # Upstream rate limits (requests per minute) and circuit breaker
+    RATE_LIMIT_CHAT_RPM: float = float(os.getenv("RATE_LIMIT_CHAT_RPM", "500"))
+    RATE_LIMIT_IMAGE_RPM: float = float(os.getenv("RATE_LIMIT_IMAGE_RPM", "50"))
+    RATE_LIMIT_SEARCH_RPM: float = float(os.getenv("RATE_LIMIT_SEARCH_RPM", "30"))
+    RATE_LIMIT_MAX_WAIT_SECONDS: float = float(os.getenv("RATE_LIMIT_MAX_WAIT_SECONDS", "20"))
+    CIRCUIT_FAILURE_THRESHOLD: int = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "5"))
+    CIRCUIT_RESET_SECONDS: float = float(os.getenv("CIRCUIT_RESET_SECONDS", "30"))
+
+    # Local intent router: unambiguous requests skip the LLM planning turn
+    INTENT_ROUTER_ENABLED: bool = os.getenv("INTENT_ROUTER_ENABLED", "False").lower() == "true"
+    INTENT_ROUTER_MIN_CONFIDENCE: float = float(os.getenv("INTENT_ROUTER_MIN_CONFIDENCE", "0.85"))
+    INTENT_ROUTER_RULES_PATH: str = os.getenv("INTENT_ROUTER_RULES_PATH", "")
+    INTENT_ROUTER_MODEL_PATH: str = os.getenv("INTENT_ROUTER_MODEL_PATH", "")
+
+    # Load the agent stack in the background at startup instead of on the first chat
+    PREWARM_AGENT: bool = os.getenv("PREWARM_AGENT", "True").lower() == "true"
+
+    # Thread pool for blocking work that can't run on the event loop
+    OFFLOAD_MAX_WORKERS: int = int(os.getenv("OFFLOAD_MAX_WORKERS", "32"))
+
+    # Per-session agent pool
+    MAX_SESSIONS: int = int(os.getenv("MAX_SESSIONS", "500"))
+    SESSION_TTL_SECONDS: int = int(os.getenv("SESSION_TTL_SECONDS", "1800"))
+    SESSION_MEMORY_CAP_MB: int = int(os.getenv("SESSION_MEMORY_CAP_MB", "256"))
+    # How often idle sessions are swept out when no request triggers it
+    SESSION_SWEEP_INTERVAL_SECONDS: float = float(os.getenv("SESSION_SWEEP_INTERVAL_SECONDS", "60"))
+
+    # State shared between worker processes (sessions, current images,
+    # search cache, job status): "memory" for a single worker, "sqlite"
+    # for `--workers N` on one host, "redis" for several hosts
+    STATE_BACKEND: str = os.getenv("STATE_BACKEND", "memory")
+    STATE_DB_PATH: str = os.getenv("STATE_DB_PATH", os.path.join("data", "state.sqlite3"))
+    STATE_REDIS_URL: str = os.getenv("STATE_REDIS_URL", "redis://localhost:6379/0")
+    STATE_KEY_PREFIX: str = os.getenv("STATE_KEY_PREFIX", "sarvo:")
+
+    # Conversation windowing: prompt history is kept under this many tokens,
+    # older turns are folded into a rolling summary written by SUMMARY_MODEL
+    HISTORY_TOKEN_BUDGET: int = int(os.getenv("HISTORY_TOKEN_BUDGET", "6000"))
+    HISTORY_MIN_RECENT_MESSAGES: int = int(os.getenv("HISTORY_MIN_RECENT_MESSAGES", "4"))
+    HISTORY_SUMMARY_MODEL: str = os.getenv("HISTORY_SUMMARY_MODEL", "gpt-4o-mini")
+    HISTORY_SUMMARY_MAX_TOKENS: int = int(os.getenv("HISTORY_SUMMARY_MAX_TOKENS", "400"))
+    # A summary another worker started is left to it for this long before it is redone
+    HISTORY_SUMMARY_LEASE_SECONDS: float = float(os.getenv("HISTORY_SUMMARY_LEASE_SECONDS", "120"))
+    HISTORY_MAX_ENTRIES: int = int(os.getenv("HISTORY_MAX_ENTRIES", "200"))
+
+    # generate_image result cache (index lives in OUTPUT_DIR)
+    IMAGE_CACHE_ENABLED: bool = os.getenv("IMAGE_CACHE_ENABLED", "True").lower() == "true"
+    IMAGE_CACHE_MAX_MB: int = int(os.getenv("IMAGE_CACHE_MAX_MB", "1024"))
+    IMAGE_CACHE_TTL_HOURS: float = float(os.getenv("IMAGE_CACHE_TTL_HOURS", "168"))
+    # Opt-in: reuse a cached image when the prompt only differs in casing,
+    # punctuation, whitespace or the order of comma-separated phrases
+    # (Jaccard similarity of words and in-phrase word pairs)
+    IMAGE_NEAR_DUP_ENABLED: bool = os.getenv("IMAGE_NEAR_DUP_ENABLED", "False").lower() == "true"
+    IMAGE_NEAR_DUP_THRESHOLD: float = float(os.getenv("IMAGE_NEAR_DUP_THRESHOLD", "0.9"))
+
+    # /outputs serving: thumbnail and preview variants plus HTTP caching
+    OUTPUT_THUMBNAIL_SIZE: int = int(os.getenv("OUTPUT_THUMBNAIL_SIZE", "256"))
+    OUTPUT_PREVIEW_SIZE: int = int(os.getenv("OUTPUT_PREVIEW_SIZE", "1024"))
+    OUTPUT_PREVIEW_FORMAT: str = os.getenv("OUTPUT_PREVIEW_FORMAT", "webp")  # or "avif"
+    OUTPUT_PREVIEW_QUALITY: int = int(os.getenv("OUTPUT_PREVIEW_QUALITY", "80"))
+    OUTPUT_CACHE_MAX_AGE: int = int(os.getenv("OUTPUT_CACHE_MAX_AGE", "86400"))
+
+    # Logging, /metrics and tracing
+    LOG_LEVEL: str = os.getenv("LOG_LEVEL", "INFO")  # DEBUG, INFO, WARNING, ERROR or OFF
+    LOG_FORMAT: str = os.getenv("LOG_FORMAT", "text")  # or "json"
+    OTEL_ENABLED: bool = os.getenv("OTEL_ENABLED", "False").lower() == "true"
+    OTEL_EXPORTER: str = os.getenv("OTEL_EXPORTER", "otlp")  # or "console"
+    # Event loop lag sampling period for /metrics; 0 turns it off
+    EVENT_LOOP_MONITOR_INTERVAL: float = float(os.getenv("EVENT_LOOP_MONITOR_INTERVAL", "0.5"))
+
+    # Selective edits: masks cached by (image hash, geometry)
+    MASK_CACHE_MAX_ENTRIES: int = int(os.getenv("MASK_CACHE_MAX_ENTRIES", "256"))
+
+    # uploads/ and outputs/ lifecycle: least recently used files beyond the
+    # quota, and files not accessed within the TTL, are deleted
+    STORAGE_GC_ENABLED: bool = os.getenv("STORAGE_GC_ENABLED", "True").lower() == "true"
+    STORAGE_DB_PATH: str = os.getenv("STORAGE_DB_PATH", os.path.join("data", "storage.sqlite3"))
+    STORAGE_QUOTA_MB: int = int(os.getenv("STORAGE_QUOTA_MB", "2048"))
+    STORAGE_TTL_HOURS: float = float(os.getenv("STORAGE_TTL_HOURS", "72"))
+    STORAGE_GC_INTERVAL_SECONDS: float = float(os.getenv("STORAGE_GC_INTERVAL_SECONDS", "600"))
 
     HOST: str = os.getenv("HOST", "0.0.0.0")
     PORT: int = int(os.getenv("PORT", "8000"))
@@ -40,6 +163,10 @@ MASTER_AGENT_PROMPT = """You are Sarvo AI, a helpful and friendly AI assistant w
 - User says: "generate", "create", "make", "draw", "design" + image/picture/photo
 - Examples: "Generate an image of a cat", "Create a logo for my company"
 
+### Use generate_images when:
+- User wants several images at once: multiple styles, versions or variants
+- Examples: "Show this sneaker in 3 styles", "Give me 4 logo options"
+
 ### Use edit_image when:
 - User says: "edit", "modify", "change", "update", "fix" + mentions an image
 - User sent an image and wants changes
@@ -61,6 +188,7 @@ MASTER_AGENT_PROMPT = """You are Sarvo AI, a helpful and friendly AI assistant w
 - If generating an image, describe what you're creating
 - If searching, summarize the key findings
 - Always explain what you're doing
+- Images and background jobs from tools are attached to your answer automatically; don't repeat [IMAGE_PATH:...] or [JOB_ID:...] markers
 
 Remember: You decide which tool to use based on what the user needs!"""
 
@@ -87,6 +215,12 @@ def validate_config():
     return True
 
 
+def ensure_directories():
+    """
+    Create UPLOAD_DIR and OUTPUT_DIR.
 
-os.makedirs(Config.UPLOAD_DIR, exist_ok=True)
-os.makedirs(Config.OUTPUT_DIR, exist_ok=True)
+    Called at server startup and when an agent is created, rather than
+    on import, so importing the config has no side effects.
+    """
+    os.makedirs(Config.UPLOAD_DIR, exist_ok=True)
+    os.makedirs(Config.OUTPUT_DIR, exist_ok=True)
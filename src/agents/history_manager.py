@@ -0,0 +1,369 @@
+import json
+import time
+import asyncio
+import logging
+import threading
+from typing import Any, Awaitable, Callable, List, Optional
+from strands.agent.conversation_manager import ConversationManager
+from strands.types.content import Message
+from strands.types.exceptions import ContextWindowOverflowException
+from src.agents.config import Config
+from src.services.clients import get_clients
+from src.services.rate_limiter import get_guard
+
+log = logging.getLogger(__name__)
+
+SUMMARY_PREFIX = "[Conversation summary so far]"
+
+SUMMARY_SYSTEM_PROMPT = """You maintain a running summary of a chat between a user and Sarvo AI.
+Merge the previous summary with the new turns into one short summary.
+- Keep facts, decisions, user preferences and any image paths or URLs that were produced
+- Note which tools were used and what they returned
+- Drop greetings and filler
+- Write in the third person, as bullet points"""
+
+# Per-message overhead the chat API adds on top of the content tokens
+_MESSAGE_OVERHEAD_TOKENS = 4
+# Flat estimate for non-text blocks (images, documents)
+_BINARY_BLOCK_TOKENS = 85
+
+_encoding = None
+_encoding_failed = False
+
+
+def load_encoding():
+    """
+    Resolve the tiktoken encoding for the chat model. The first call may
+    read or download the BPE file, so the server runs it in the offload
+    pool at startup rather than on the event loop.
+    """
+    global _encoding, _encoding_failed
+
+    if _encoding is not None or _encoding_failed:
+        return
+
+    try:
+        import tiktoken
+        try:
+            _encoding = tiktoken.encoding_for_model(Config.CHAT_MODEL)
+        except KeyError:
+            _encoding = tiktoken.get_encoding("o200k_base")
+    except Exception as e:
+        log.warning("⚠️  tiktoken unavailable, estimating tokens: %s", e)
+        _encoding_failed = True
+
+
+def count_tokens(text: str) -> int:
+    """
+    Count tokens with tiktoken, or estimate ~4 chars/token if the
+    encoding can't be loaded (e.g. no network to fetch the BPE file).
+
+    On the event loop the encoding is never loaded here; until
+    load_encoding() has finished, the estimate is used.
+    """
+    if not text:
+        return 0
+
+    if _encoding is None and not _encoding_failed:
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            load_encoding()
+
+    if _encoding is None:
+        return max(1, len(text) // 4)
+
+    return len(_encoding.encode(text, disallowed_special=()))
+
+
+def _block_text(block: dict) -> str:
+    if "text" in block:
+        return block["text"]
+    if "toolUse" in block:
+        tool_use = block["toolUse"]
+        return f"{tool_use.get('name')}({json.dumps(tool_use.get('input'), default=str)})"
+    if "toolResult" in block:
+        parts = []
+        for item in block["toolResult"].get("content", []):
+            if "text" in item:
+                parts.append(item["text"])
+            elif "json" in item:
+                parts.append(json.dumps(item["json"], default=str))
+        return "\n".join(parts)
+    return ""
+
+
+def _is_turn_start(message: Message) -> bool:
+    """A user message that is not a tool result starts a new turn."""
+    return message["role"] == "user" and not any("toolResult" in block for block in message["content"])
+
+
+class HistoryManager(ConversationManager):
+    """
+    Token-budgeted conversation manager for MasterAgent.
+
+    After every turn the Strands message list is trimmed to the most
+    recent whole turns that fit in `token_budget`. Older turns are
+    folded into a rolling summary that is rewritten in the background
+    by a small model and sent as the first message of the prompt, so
+    the per-turn prompt size stays bounded however long the session
+    runs.
+
+    The state records which folded turns a summary is running for, so
+    a worker that restores the session from shared state leaves them to
+    the worker that started it (for up to `summary_lease` seconds).
+    `on_summary(start, count, summary)` is awaited when a summary is
+    ready, to publish it for other workers.
+    """
+
+    def __init__(
+        self,
+        token_budget: int = Config.HISTORY_TOKEN_BUDGET,
+        min_recent_messages: int = Config.HISTORY_MIN_RECENT_MESSAGES,
+        summary_model: str = Config.HISTORY_SUMMARY_MODEL,
+        summary_max_tokens: int = Config.HISTORY_SUMMARY_MAX_TOKENS,
+        summary_lease: float = Config.HISTORY_SUMMARY_LEASE_SECONDS
+    ):
+        super().__init__()
+        self.token_budget = token_budget
+        self.min_recent_messages = min_recent_messages
+        self.summary_model = summary_model
+        self.summary_max_tokens = summary_max_tokens
+        self.summary_lease = summary_lease
+        self.on_summary: Optional[Callable[[int, int, str], Awaitable[None]]] = None
+
+        self._summary = ""
+        self._pending: List[Message] = []
+        self._summarizing: Optional[asyncio.Task] = None
+        # Folded messages [.. through) are covered by a summary started at `since` (wall clock)
+        self._summarizing_through = 0
+        self._summarizing_since = 0.0
+        self._lock = threading.Lock()
+
+        # id(message) -> (message, tokens); holding the message keeps the id valid
+        self._token_cache: dict = {}
+        self._removed_tokens = 0
+
+        self.last_turn = {"prompt_tokens": 0, "tokens_saved": 0}
+        self.total_tokens_saved = 0
+
+    # ----- token accounting -----
+
+    def message_tokens(self, message: Message) -> int:
+        cached = self._token_cache.get(id(message))
+        if cached is not None and cached[0] is message:
+            return cached[1]
+
+        tokens = _MESSAGE_OVERHEAD_TOKENS
+        for block in message["content"]:
+            text = _block_text(block)
+            tokens += count_tokens(text) if text else _BINARY_BLOCK_TOKENS
+
+        self._token_cache[id(message)] = (message, tokens)
+        return tokens
+
+    def _prune_token_cache(self, messages: List[Message]):
+        live = {id(m) for m in messages}
+        self._token_cache = {k: v for k, v in self._token_cache.items() if k in live}
+
+    # ----- summary message -----
+
+    def _summary_message(self) -> Optional[Message]:
+        with self._lock:
+            summary = self._summary
+            pending = list(self._pending)
+
+        if not summary and not pending:
+            return None
+
+        text = f"{SUMMARY_PREFIX}\n{summary}" if summary else SUMMARY_PREFIX
+
+        # Turns folded after the last summary run: keep the user requests
+        # verbatim (truncated) until the background summary catches up
+        requests = [_block_text(m["content"][0])[:200] for m in pending if _is_turn_start(m) and m["content"]]
+        if requests:
+            text += "\nMore recent earlier requests:\n" + "\n".join(f"- {r}" for r in requests[-10:])
+
+        return {"role": "user", "content": [{"text": text}]}
+
+    @staticmethod
+    def _has_summary(messages: List[Message]) -> bool:
+        if not messages or messages[0]["role"] != "user" or not messages[0]["content"]:
+            return False
+        return messages[0]["content"][0].get("text", "").startswith(SUMMARY_PREFIX)
+
+    def refresh_summary(self, agent: Any):
+        """Swap in the latest background summary before the next turn."""
+        if self._has_summary(agent.messages):
+            message = self._summary_message()
+            if message is not None:
+                agent.messages[0] = message
+
+    # ----- ConversationManager -----
+
+    def apply_management(self, agent: Any, **kwargs: Any) -> None:
+        untrimmed = self._fold(agent, self.token_budget)
+
+        prompt_tokens = sum(self.message_tokens(m) for m in agent.messages)
+        saved = max(0, untrimmed - prompt_tokens)
+
+        self.last_turn = {"prompt_tokens": prompt_tokens, "tokens_saved": saved}
+        self.total_tokens_saved += saved
+        self._prune_token_cache(agent.messages)
+
+        # Pending turns restored from another worker, or a failed summary
+        self._schedule_summary()
+
+    def reduce_context(self, agent: Any, e: Optional[Exception] = None, **kwargs: Any) -> None:
+        before = len(agent.messages)
+        self._fold(agent, self.token_budget // 2)
+
+        if len(agent.messages) >= before:
+            raise ContextWindowOverflowException("Unable to trim conversation context!") from e
+
+    def get_state(self) -> dict:
+        with self._lock:
+            return {
+                "summary": self._summary,
+                "pending": list(self._pending),
+                "removed_tokens": self._removed_tokens,
+                "summarizing_through": self._summarizing_through,
+                "summarizing_since": self._summarizing_since,
+                **super().get_state()
+            }
+
+    def restore_from_session(self, state: dict) -> Optional[List[Message]]:
+        super().restore_from_session(state)
+        with self._lock:
+            self._summary = state.get("summary", "")
+            self._pending = list(state.get("pending", []))
+            self._summarizing_through = state.get("summarizing_through", 0)
+            self._summarizing_since = state.get("summarizing_since", 0.0)
+        self._removed_tokens = state.get("removed_tokens", 0)
+
+        # Pending turns are summarized after the next turn, unless the
+        # worker that folded them is still on it (see _schedule_summary)
+        message = self._summary_message()
+        return [message] if message else None
+
+    # ----- windowing -----
+
+    def _fold(self, agent: Any, budget: int) -> int:
+        """
+        Fold the oldest whole turns into the summary until the messages
+        fit in `budget`. Returns the prompt size the untrimmed history
+        would have had.
+        """
+        messages = agent.messages
+        offset = 1 if self._has_summary(messages) else 0
+        counts = [self.message_tokens(m) for m in messages]
+        summary_tokens = counts[0] if offset else 0
+
+        untrimmed = sum(counts[offset:]) + self._removed_tokens
+
+        if sum(counts) <= budget:
+            return untrimmed
+
+        # Walk forward to the first turn boundary that brings us under
+        # budget, always keeping `min_recent_messages` and whole tool pairs
+        last_allowed = len(messages) - self.min_recent_messages
+        tail_tokens = sum(counts[offset:])
+        cut = None
+        for i in range(offset, len(messages)):
+            if i > last_allowed:
+                break
+            if i > offset and _is_turn_start(messages[i]):
+                cut = i
+                if tail_tokens + summary_tokens <= budget:
+                    break
+            tail_tokens -= counts[i]
+
+        if cut is None:
+            return untrimmed
+
+        folded = messages[offset:cut]
+        self._removed_tokens += sum(counts[offset:cut])
+        self.removed_message_count += len(folded)
+
+        with self._lock:
+            self._pending.extend(folded)
+
+        summary = self._summary_message()
+        agent.messages[:] = [summary] + messages[cut:]
+
+        log.info("🗜️  Folded %d messages into the conversation summary", len(folded))
+        self._schedule_summary()
+
+        # The cut was sized with the old summary; the new one also lists
+        # the folded requests, so recount and fold again if it went over
+        if sum(self.message_tokens(m) for m in agent.messages) > budget:
+            self._fold(agent, budget)
+
+        return untrimmed
+
+    # ----- background summarization -----
+
+    def _schedule_summary(self):
+        """Start summarizing the pending turns on the running loop, if nobody is."""
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return  # picked up by the next apply_management()
+
+        with self._lock:
+            if self._summarizing is not None and not self._summarizing.done():
+                return
+            if not self._pending:
+                return
+
+            # Another worker started a summary of these turns and may still publish it
+            folded = self.removed_message_count
+            if self._summarizing_through >= folded and time.time() - self._summarizing_since < self.summary_lease:
+                return
+
+            batch = list(self._pending)
+            start = folded - len(batch)
+            previous = self._summary
+            self._summarizing_through = folded
+            self._summarizing_since = time.time()
+            self._summarizing = loop.create_task(self._summarize(start, previous, batch))
+
+    async def _summarize(self, start: int, previous: str, batch: List[Message]):
+        try:
+            transcript = "\n".join(
+                f"{m['role']}: {_block_text(block)[:1000]}"
+                for m in batch
+                for block in m["content"]
+                if _block_text(block)
+            )
+
+            async with get_guard("openai", self.summary_model).slot():
+                response = await get_clients().openai.chat.completions.create(
+                    model=self.summary_model,
+                    max_tokens=self.summary_max_tokens,
+                    messages=[
+                        {"role": "system", "content": SUMMARY_SYSTEM_PROMPT},
+                        {"role": "user", "content": f"Previous summary:\n{previous or '(none)'}\n\nNew turns:\n{transcript}"}
+                    ]
+                )
+            summary = (response.choices[0].message.content or "").strip() or previous
+
+            with self._lock:
+                self._summary = summary
+                self._pending = self._pending[len(batch):]
+                self._summarizing_since = 0.0
+
+        except Exception as e:
+            log.error("❌ Conversation summary failed: %s", e)
+            with self._lock:
+                self._summarizing_since = 0.0  # retried after the next turn
+            return
+
+        if self.on_summary is not None:
+            try:
+                await self.on_summary(start, len(batch), summary)
+            except Exception as e:
+                log.warning("⚠️  Publishing conversation summary failed: %s", e)
+
+        # Turns folded while we were summarizing get picked up next
+        self._schedule_summary()
@@ -1,19 +1,12 @@
-from openai import OpenAI
 import base64
-import os
-from dotenv import load_dotenv
 from strands import tool
+from src.services.clients import get_clients
 
-load_dotenv()
-
-api_key = os.getenv("OPENAI_API_KEY")
-
-client = OpenAI(api_key=api_key) 
 #"Generate an image of gray tabby cat hugging an otter with an orange scarf"
 
 @tool
 async def image_generation_agent(input: str):
-    response = client.responses.create(
+    response = await get_clients().openai.responses.create(
         model="gpt-5",
         input=input,
         tools=[{"type": "image_generation"}],
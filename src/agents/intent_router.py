@@ -0,0 +1,196 @@
+import re
+import json
+import logging
+from typing import List, Optional
+from src.agents.config import Config
+
+log = logging.getLogger(__name__)
+
+# Each rule maps a message pattern to a tool. Named groups in the pattern
+# become the tool's arguments; without one the whole message is used.
+#
+# mode "reply":   the tool's output is the answer, no LLM call at all
+# mode "context": the tool runs up front and its output is handed to the
+#                 agent, which answers in one LLM call instead of
+#                 plan -> tool -> answer
+#
+# Rules below MIN_CONFIDENCE never route on their own, but still count
+# when deciding whether a message is ambiguous.
+DEFAULT_RULES = [
+    {
+        "tool": "generate_image",
+        "pattern": r"^(?:please\s+)?(?:can you\s+)?(?:generate|create|make|draw|design|paint|render)\s+(?:me\s+)?"
+                   r"(?:an?\s+)?(?:image|picture|photo|illustration|drawing|painting)\s+(?:of|showing)\s+(?P<prompt>.+)$",
+        "confidence": 0.95,
+        "mode": "reply"
+    },
+    {
+        "tool": "edit_image",
+        "pattern": r"^(?:please\s+)?(?:edit|modify|change|update|fix)\s+(?:this|the|my)\s+(?:image|picture|photo)"
+                   r"\s*(?:to|so that|by|:)?\s+(?P<edit_instructions>.+)$",
+        "confidence": 0.9,
+        "mode": "reply",
+        "needs_image": True
+    },
+    {
+        "tool": "websearch",
+        "pattern": r"^(?:please\s+)?(?:search(?:\s+the\s+web|\s+online)?(?:\s+for)?|look\s+up|google)\s+(?P<keywords>.+)$",
+        "confidence": 0.95,
+        "mode": "context"
+    },
+    {
+        "tool": "websearch",
+        "pattern": r"\b(?:latest|today'?s|current|breaking)\s+(?:news|headlines|updates?)\b",
+        "confidence": 0.7,
+        "mode": "context"
+    }
+]
+
+# Argument and mode used when the classifier model picks a tool
+TOOL_DEFAULTS = {
+    "generate_image": ("prompt", "reply"),
+    "edit_image": ("edit_instructions", "reply"),
+    "websearch": ("keywords", "context")
+}
+
+# Requests that chain several steps always go to the agent
+_COMPOUND_RE = re.compile(r"\b(?:and then|then also|after that|as well as)\b|\?.+\?", re.IGNORECASE)
+
+
+class IntentRouter:
+    """
+    Local intent classifier in front of the master agent.
+
+    A table of regex rules is checked first; an optional on-box text
+    classifier (a scikit-learn style pipeline saved with joblib, with
+    predict_proba and classes_) is consulted when no rule is confident.
+    classify() returns an intent only when exactly one tool matches
+    with at least `min_confidence`; anything else goes to the agent.
+    """
+
+    def __init__(
+        self,
+        rules: Optional[List[dict]] = None,
+        model_path: str = Config.INTENT_ROUTER_MODEL_PATH,
+        min_confidence: float = Config.INTENT_ROUTER_MIN_CONFIDENCE
+    ):
+        self.rules = [
+            {**rule, "regex": re.compile(rule["pattern"], re.IGNORECASE | re.DOTALL)}
+            for rule in (rules if rules is not None else DEFAULT_RULES)
+        ]
+        self.min_confidence = min_confidence
+        self.model = _load_model(model_path) if model_path else None
+
+        self.routed = {}
+        self.fallbacks = 0
+
+    def classify(self, text: str, image_url: Optional[str] = None) -> Optional[dict]:
+        """
+        Return {"tool", "args", "mode", "confidence", "source"} for a
+        message the router is sure about, otherwise None.
+        """
+        text = text.strip()
+        intent = None
+
+        if text and not _COMPOUND_RE.search(text):
+            intent = self._match_rules(text, image_url)
+            if intent is None and self.model is not None:
+                intent = self._predict(text, image_url)
+
+        if intent is None:
+            self.fallbacks += 1
+        else:
+            self.routed[intent["tool"]] = self.routed.get(intent["tool"], 0) + 1
+
+        return intent
+
+    def _match_rules(self, text: str, image_url: Optional[str]) -> Optional[dict]:
+        matches = []
+        for rule in self.rules:
+            match = rule["regex"].search(text)
+            if match:
+                matches.append((rule, match))
+
+        if not matches or len({rule["tool"] for rule, _ in matches}) > 1:
+            return None
+
+        rule, match = max(matches, key=lambda m: m[0]["confidence"])
+        if rule["confidence"] < self.min_confidence:
+            return None
+
+        args = {k: v.strip() for k, v in match.groupdict().items() if v and v.strip()}
+        if not args:
+            args = {TOOL_DEFAULTS[rule["tool"]][0]: text}
+
+        return self._intent(rule["tool"], args, rule.get("mode", "reply"), rule["confidence"], "rules", image_url)
+
+    def _predict(self, text: str, image_url: Optional[str]) -> Optional[dict]:
+        try:
+            probabilities = self.model.predict_proba([text])[0]
+        except Exception as e:
+            log.warning("⚠️  Intent model failed: %s", e)
+            return None
+
+        best = max(range(len(probabilities)), key=lambda i: probabilities[i])
+        tool, confidence = str(self.model.classes_[best]), float(probabilities[best])
+
+        if tool not in TOOL_DEFAULTS or confidence < self.min_confidence:
+            return None
+
+        arg, mode = TOOL_DEFAULTS[tool]
+        return self._intent(tool, {arg: text}, mode, confidence, "model", image_url)
+
+    @staticmethod
+    def _intent(tool: str, args: dict, mode: str, confidence: float, source: str, image_url: Optional[str]):
+        if tool == "edit_image":
+            # Nothing to edit yet: let the agent ask for an image
+            if not image_url:
+                return None
+            args = {**args, "image_url": image_url}
+
+        return {"tool": tool, "args": args, "mode": mode, "confidence": round(confidence, 3), "source": source}
+
+    def stats(self) -> dict:
+        total = sum(self.routed.values()) + self.fallbacks
+        return {
+            "enabled": Config.INTENT_ROUTER_ENABLED,
+            "routed": dict(self.routed),
+            "fallbacks": self.fallbacks,
+            "fast_path_ratio": round(sum(self.routed.values()) / total, 4) if total else 0.0,
+            "model_loaded": self.model is not None
+        }
+
+
+def _load_model(path: str):
+    try:
+        import joblib
+    except ImportError:
+        log.warning("⚠️  joblib is not installed; intent model disabled")
+        return None
+
+    try:
+        return joblib.load(path)
+    except Exception as e:
+        log.warning("⚠️  Could not load intent model %s: %s", path, e)
+        return None
+
+
+def _load_rules(path: str) -> Optional[List[dict]]:
+    """Read a JSON list of rules (same shape as DEFAULT_RULES), if configured."""
+    if not path:
+        return None
+
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+_intent_router: Optional[IntentRouter] = None
+
+
+def get_intent_router() -> IntentRouter:
+    global _intent_router
+
+    if _intent_router is None:
+        _intent_router = IntentRouter(rules=_load_rules(Config.INTENT_ROUTER_RULES_PATH))
+
+    return _intent_router
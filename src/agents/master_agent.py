@@ -1,126 +1,568 @@
-import os
 import re
+import json
+import time
+import uuid
+import asyncio
+import logging
 from typing import Optional
 from strands import Agent
+from strands.hooks import AfterToolCallEvent, BeforeToolCallEvent, HookProvider, HookRegistry
 from strands.models.openai import OpenAIModel
-from src.agents.config import Config, MASTER_AGENT_PROMPT
+from src.agents.config import Config, MASTER_AGENT_PROMPT, ensure_directories
+from src.agents.history_manager import HistoryManager
+from src.agents.intent_router import get_intent_router
+from src.agents.response_cache import get_response_cache
 from src.tools.websearch_tool import websearch
-from src.tools.image_generator import generate_image
+from src.tools.image_generator import generate_image, generate_images
 from src.tools.image_editor import edit_image
+from src.services.offload import run_blocking, run_sync
+from src.services.clients import get_clients
+from src.services.rate_limiter import get_guard
+from src.services.storage import current_session_id
+from src.services.artifacts import merge_artifacts, parse_markers, start_collecting
+from src.services.state_store import get_state_store
+from src.agents.session_pool import session_key, session_image_key
+from src.services.telemetry import (
+    AGENT_TURN_SECONDS, LLM_TURN_SECONDS, new_turn, record_llm_request, record_tool, span
+)
 
+log = logging.getLogger(__name__)
+
+
+# Shared across every session: the tool list and the model client.
+# Each session only owns its conversation state.
+AGENT_TOOLS = [websearch, generate_image, generate_images, edit_image]
+TOOLS_BY_NAME = {t.tool_name: t for t in AGENT_TOOLS}
+
+
+class GuardedOpenAIModel(OpenAIModel):
+    """
+    OpenAIModel whose requests go through the shared upstream guard.
+
+    Also records each request's latency and token usage for /metrics.
+    """
+
+    async def stream(self, *args, **kwargs):
+        model_id = self.config["model_id"]
+
+        async with get_guard("openai", model_id).slot():
+            started = time.perf_counter()
+            usage = None
+            try:
+                async for event in super().stream(*args, **kwargs):
+                    if "metadata" in event:
+                        usage = event["metadata"].get("usage")
+                    yield event
+            finally:
+                record_llm_request(model_id, time.perf_counter() - started, usage)
 
-class MasterAgent:
+
+class ToolMetrics(HookProvider):
+    """Times every tool call the agent makes, for /metrics."""
 
     def __init__(self):
-        print("Initializing Sarvo AI Master Agent")
+        self._started = {}
+
+    def register_hooks(self, registry: HookRegistry, **kwargs):
+        registry.add_callback(BeforeToolCallEvent, self._before)
+        registry.add_callback(AfterToolCallEvent, self._after)
+
+    def _before(self, event: BeforeToolCallEvent):
+        self._started[event.tool_use["toolUseId"]] = time.perf_counter()
+
+    def _after(self, event: AfterToolCallEvent):
+        started = self._started.pop(event.tool_use["toolUseId"], None)
+        if started is None:
+            return
+
+        result = event.result or {}
+        output = " ".join(block.get("text", "") for block in result.get("content", []))
+        status = "error" if event.exception else result.get("status", "success")
+        record_tool(event.tool_use["name"], time.perf_counter() - started, status, output)
+
+
+TOOL_METRICS = ToolMetrics()
 
-        self.model = OpenAIModel(
-            client_args = {"api_key": Config.OPENAI_API_KEY},
+
+_shared_model: Optional[OpenAIModel] = None
+
+
+def get_shared_model() -> OpenAIModel:
+    global _shared_model
+
+    client_args = get_clients().model_client_args()
+
+    if _shared_model is None:
+        _shared_model = GuardedOpenAIModel(
+            client_args = client_args,
             model_id = Config.CHAT_MODEL,
         )
+    elif _shared_model.client_args.get("http_client") is not client_args["http_client"]:
+        # The client registry was rebuilt; point the model at the new pool
+        _shared_model.client_args = client_args
+
+    return _shared_model
+
+
+# Complete image markers, as emitted by the tools or echoed by the model
+_STREAM_MARKER_RE = re.compile(r'\[(?:IMAGE_PATH|JOB_ID):[^\]]+\]|!\[[^\]]*\]\(sandbox:/outputs/[^)]*\)')
+
+
+class MarkerStreamFilter:
+    """
+    Removes image markers from streamed text.
+
+    A marker can be split across several deltas, so any tail that could
+    still turn into `[IMAGE_PATH:...]`, `[JOB_ID:...]` or
+    `![...](sandbox:/outputs/...)`
+    is held back until it is either complete (and dropped) or clearly
+    plain text. At most MAX_HOLD characters are ever held.
+    """
+
+    MAX_HOLD = 512
+
+    def __init__(self):
+        self._buffer = ""
+
+    def feed(self, text: str) -> str:
+        self._buffer = _STREAM_MARKER_RE.sub("", self._buffer + text)
+
+        hold = self._hold_from(self._buffer)
+        out, self._buffer = self._buffer[:hold], self._buffer[hold:]
+        return out
+
+    def flush(self) -> str:
+        out, self._buffer = self._buffer, ""
+        return out
+
+    def _hold_from(self, buffer: str) -> int:
+        start = max(0, len(buffer) - self.MAX_HOLD)
+
+        for i in range(start, len(buffer)):
+            tail = buffer[i:]
+            if buffer[i] == "[" and (
+                self._could_be(tail, "[IMAGE_PATH:", "]") or self._could_be(tail, "[JOB_ID:", "]")
+            ):
+                return i
+            if buffer[i] == "!" and self._could_be(tail, "![", ")"):
+                return i
+
+        return len(buffer)
+
+    @staticmethod
+    def _could_be(tail: str, prefix: str, end: str) -> bool:
+        if len(tail) <= len(prefix):
+            return prefix.startswith(tail)
+        return tail.startswith(prefix) and end not in tail
+
+
+class MasterAgent:
+
+    def __init__(self, session_id: str = "default"):
+        ensure_directories()
+
+        self.session_id = session_id
+
+        self.model = get_shared_model()
+
+        self.history = HistoryManager()
+        self.history.on_summary = self._publish_summary
 
         self.agent = Agent(
             model = self.model,
             system_prompt = MASTER_AGENT_PROMPT,
-            tools = [websearch, generate_image, edit_image]
-        
+            tools = AGENT_TOOLS,
+            conversation_manager = self.history,
+            hooks = [TOOL_METRICS],
+            # Strands' default handler prints every token and tool call to
+            # stdout; turns are streamed through astream() and logged instead
+            callback_handler = None
         )
 
         self._history = []
 
         self._curreent_image_url = None
 
-        print("Master Agent Initialized successfully")
+        # One turn at a time per session; Strands agents are not re-entrant
+        self._lock = asyncio.Lock()
+
+        self.last_used = time.monotonic()
+
+        self.approx_bytes = 0
+
+        # Token of the shared-state snapshot this agent matches, if any
+        self._state_version: Optional[str] = None
+
+        log.debug("Master agent created", extra={"session_id": session_id})
+
+    @property
+    def busy(self) -> bool:
+        return self._lock.locked()
+
+    def touch(self):
+        self.last_used = time.monotonic()
+
+    @property
+    def current_image_url(self) -> Optional[str]:
+        return self._curreent_image_url
 
     def set_current_image(self, image_url: str):
         self._curreent_image_url = image_url
-        print(f"Current Image set to :{image_url}")
+        log.debug("Current image set", extra={"session_id": self.session_id, "image_url": image_url})
 
-    def process(self, user_input: str, image_url: Optional[str] = None) ->dict:
-        try:
-            full_input = user_input
+    def _build_input(self, user_input: str, image_url: Optional[str] = None) -> str:
+        full_input = user_input
 
-            if image_url:
-                self._curreent_image_url = image_url
-                full_input = f"{user_input}\n\n[User has provided an image : {image_url}]"
-            elif self._curreent_image_url:
-                edit_keywords = ["edit", "modify", "change", "update", "fix", "add", "remove"]
-                if any(kw in user_input.lower() for kw in edit_keywords):
-                    full_input = f"{user_input}\n\n[Priviously uploaded image : {self._curreent_image_url}]"
-            
-            print(f"User Input : {user_input}")
+        if image_url:
+            self._curreent_image_url = image_url
+            full_input = f"{user_input}\n\n[User has provided an image : {image_url}]"
+        elif self._curreent_image_url:
+            edit_keywords = ["edit", "modify", "change", "update", "fix", "add", "remove"]
+            if any(kw in user_input.lower() for kw in edit_keywords):
+                full_input = f"{user_input}\n\n[Priviously uploaded image : {self._curreent_image_url}]"
 
-            response = self.agent(full_input)
+        return full_input
 
-            response_text = str(response)
+    def _record_turn(self, user_input: str, result: dict):
+        self._history.append({
+            "role":"User",
+            "content": user_input
+        })
 
-            print(f"Agent Response: {response_text}")
+        self._history.append({
+            "role":"Assistant",
+            "content": result["content"]
+        })
 
-            result = self._parse_response(response_text)
+        del self._history[:-Config.HISTORY_MAX_ENTRIES]
 
-            
-            self._history.append({
-                "role":"User",
-                "content": user_input
-            })
+        self.approx_bytes = self._estimate_size()
 
-            self._history.append({
-                "role":"User",
-                "content": result["content"]
-            })
+    def _estimate_size(self) -> int:
+        """Rough in-memory footprint of this session's conversation, in bytes."""
+        return len(json.dumps(self.agent.messages, default=str)) + len(json.dumps(self._history))
+
+    # ----- shared state -----
+
+    def export_state(self) -> dict:
+        """The session's conversation as JSON-friendly data."""
+        return {
+            "messages": self.agent.messages,
+            "conversation": self.history.get_state(),
+            "history": self._history,
+            "current_image_url": self._curreent_image_url
+        }
+
+    def restore_state(self, state: dict):
+        """Replace this agent's conversation with one from export_state()."""
+        self.agent.messages[:] = state["messages"]
+        self.history.restore_from_session(state["conversation"])
+        self._history = state["history"]
+        self._curreent_image_url = state["current_image_url"]
+        self.approx_bytes = self._estimate_size()
+
+    def _load_state(self):
+        """Pick up turns another worker ran for this session. Blocking."""
+        state = get_state_store().get(session_key(self.session_id))
+        if state is None or state["version"] == self._state_version:
+            return
 
-            return result
+        self.restore_state(state)
+        self._state_version = state["version"]
+        log.debug("Session restored from shared state", extra={"session_id": self.session_id})
+
+    def _save_state(self):
+        """Publish the conversation so any worker can take the next turn. Blocking."""
+        store = get_state_store()
+        version = uuid.uuid4().hex
+
+        store.set(
+            session_key(self.session_id),
+            {"version": version, **self.export_state()},
+            ttl=Config.SESSION_TTL_SECONDS
+        )
+        if self._curreent_image_url:
+            store.set(session_image_key(self.session_id), self._curreent_image_url, ttl=Config.SESSION_TTL_SECONDS)
+
+        self._state_version = version
+
+    async def _publish_summary(self, start: int, count: int, summary: str):
+        """Write a finished background summary into the shared session state."""
+        if get_state_store().shared:
+            await run_blocking(self._merge_summary, start, count, summary)
+
+    def _merge_summary(self, start: int, count: int, summary: str):
+        """
+        Fold the summary of folded messages [start, start + count) into the
+        stored conversation, unless another worker has moved it on since
+        (summarized those messages itself or restarted it). Blocking.
+        """
+        store = get_state_store()
+        state = store.get(session_key(self.session_id))
+        if state is None:
+            return
+
+        conversation = state["conversation"]
+        pending = conversation.get("pending", [])
+        if conversation.get("removed_message_count", 0) - len(pending) != start or len(pending) < count:
+            return
+
+        conversation["summary"] = summary
+        conversation["pending"] = pending[count:]
+        conversation["summarizing_since"] = 0.0
+
+        ours = state["version"] == self._state_version
+        state["version"] = uuid.uuid4().hex
+        store.set(session_key(self.session_id), state, ttl=Config.SESSION_TTL_SECONDS)
+        if ours:
+            self._state_version = state["version"]
+
+    async def aprocess(self, user_input: str, image_url: Optional[str] = None) -> dict:
+        """
+        Process one chat turn without blocking the event loop.
+
+        Uses the Strands agent's async invocation, so the LLM round trip
+        and any async tools run on the loop while sync tools are pushed
+        to the offload pool.
+        """
+        result = None
+        async for event, data in self.astream(user_input, image_url):
+            if event == "final":
+                result = data
+        return result
+
+    async def astream(self, user_input: str, image_url: Optional[str] = None):
+        """
+        Process one chat turn and yield (event, data) pairs as it runs.
+
+        Events:
+            delta:      {"text": ...} streamed text, image markers removed
+            tool_start: {"id", "name", "input"} before a tool runs
+            tool_end:   {"id", "name", "status"} after a tool returns
+            error:      {"message": ...} if the turn failed
+            final:      the parsed response, same shape as process()
+        """
+        # Files written by tools during this turn are owned by the session
+        current_session_id.set(self.session_id)
+        # Images and jobs the tools produce during this turn
+        artifacts = start_collecting()
+        # The model wrapper adds its time and token usage to this
+        turn = new_turn()
+        started = time.perf_counter()
+
+        try:
+            async with self._lock:
+                self.touch()
+
+                # With several workers the previous turn may have run elsewhere
+                shared = get_state_store().shared
+                if shared:
+                    await run_blocking(self._load_state)
+
+                async for event, data in self._run_turn(user_input, image_url, turn, artifacts):
+                    if event == "final" and shared:
+                        await self._publish_state()
+                    yield event, data
         except Exception as e:
+            turn["path"] = "error"
             error_msg = f"Sorry, I encountered an error: {str(e)}"
-            print(f"❌ Error: {error_msg}")
-            return {
+            log.error("❌ Turn failed: %s", e, exc_info=True, extra={"session_id": self.session_id})
+            yield "error", {"message": error_msg}
+            yield "final", {
                 "type": "text",
                 "content": error_msg,
                 "image_url": None
             }
-        
-    def _parse_response(self, response_text: str)-> dict:
-        image_match = re.search(r'\[IMAGE_PATH:([^\]]+)\]', response_text)
-        
+        finally:
+            self._record_metrics(turn, time.perf_counter() - started)
 
-        if image_match:
-            image_path = image_match.group(1)
+    async def _publish_state(self):
+        try:
+            await run_blocking(self._save_state)
+        except Exception as e:
+            # The user still gets the answer; only a follow-up on another worker misses it
+            log.error("❌ Could not save session state: %s", e, extra={"session_id": self.session_id})
 
-            clean_text = re.sub(r'\[IMAGE_PATH:[^\]]+\]', '', response_text).strip()
-            
-            filename = os.path.basename(image_path)
+    def _record_metrics(self, turn: dict, seconds: float):
+        path = turn.get("path", "llm")
+        AGENT_TURN_SECONDS.observe(seconds, path=path)
+        if turn["llm_seconds"]:
+            LLM_TURN_SECONDS.observe(turn["llm_seconds"], model=Config.CHAT_MODEL)
 
-            return{
-                "type":"image",
-                "content":clean_text or "Here is your image",
-                "image_url": f"/outputs/{filename}"
-            }
-        
-        markdown_match = re.search(r'sandbox:/outputs/([a-zA-Z0-9_\-\.]+)', response_text)
-        if markdown_match:
-            filename = markdown_match.group(1)
+        log.info("✅ Turn finished", extra={
+            "session_id": self.session_id,
+            "path": path,
+            "duration_ms": round(seconds * 1000),
+            "llm_ms": round(turn["llm_seconds"] * 1000),
+            "input_tokens": turn["input_tokens"],
+            "output_tokens": turn["output_tokens"],
+            **(self.history.last_turn if path == "llm" else {})
+        })
+
+    async def _run_turn(self, user_input: str, image_url: Optional[str], turn: dict, artifacts: list):
+        full_input = self._build_input(user_input, image_url)
+
+        log.debug("User input: %s", user_input, extra={"session_id": self.session_id})
+
+        intent = None
+        if Config.INTENT_ROUTER_ENABLED:
+            intent = get_intent_router().classify(user_input, self._curreent_image_url)
+
+        if intent is not None:
+            # Unambiguous request: run the tool ourselves instead of
+            # waiting for the model to plan the call
+            log.info("⚡ Fast path: %s", intent["tool"], extra={
+                "session_id": self.session_id, "source": intent["source"], "confidence": intent["confidence"]
+            })
+            turn["path"] = "fastpath"
+
+            tool_use_id = f"fastpath_{uuid.uuid4().hex[:12]}"
+            yield "tool_start", {"id": tool_use_id, "name": intent["tool"], "input": intent["args"]}
+            tool_started = time.perf_counter()
+            with span("tool.fastpath", tool=intent["tool"]):
+                tool_output = str(await TOOLS_BY_NAME[intent["tool"]](**intent["args"]))
+            record_tool(intent["tool"], time.perf_counter() - tool_started, output=tool_output)
+            yield "tool_end", {"id": tool_use_id, "name": intent["tool"], "status": "success"}
 
-            # Remove markdown image block
-            clean_text = re.sub(r'!\[.*?\]\(sandbox:/outputs/.*?\)', '', response_text).strip()
+            if intent["mode"] == "reply":
+                text_filter = MarkerStreamFilter()
+                text = text_filter.feed(tool_output) + text_filter.flush()
+                if text:
+                    yield "delta", {"text": text}
 
+                log.debug("Agent response (fast path): %s", tool_output, extra={"session_id": self.session_id})
+                self._append_exchange(full_input, tool_output)
+
+                result = self._parse_response(tool_output, artifacts)
+                self._record_turn(user_input, result)
+
+                yield "final", result
+                return
+
+            full_input = (
+                f"{full_input}\n\n[{intent['tool']} has already been run for this message. "
+                f"Answer from its output:]\n{tool_output}"
+            )
+
+        self.history.refresh_summary(self.agent)
+
+        # Plain questions (no image in play, no fast-path tool output) can
+        # be answered from the response cache
+        cache_key = None
+        if Config.RESPONSE_CACHE_ENABLED and full_input == user_input:
+            cache = get_response_cache()
+            cache_key = cache.key(
+                MASTER_AGENT_PROMPT, list(TOOLS_BY_NAME), self.model.get_config()["model_id"],
+                user_input, self.agent.messages
+            )
+            cached = await cache.get(cache_key)
+            if cached is not None:
+                turn["path"] = "cache"
+                yield "delta", {"text": cached}
+
+                log.debug("Agent response (cache): %s", cached, extra={"session_id": self.session_id})
+                self._append_exchange(full_input, cached)
+
+                result = self._parse_response(cached)
+                self._record_turn(user_input, result)
+
+                yield "final", result
+                return
+
+        text_filter = MarkerStreamFilter()
+        tool_names = {}
+        response = None
+
+        async for event in self.agent.stream_async(full_input):
+            if "data" in event:
+                text = text_filter.feed(event["data"])
+                if text:
+                    yield "delta", {"text": text}
+
+            elif "message" in event:
+                text = text_filter.flush()
+                if text:
+                    yield "delta", {"text": text}
+
+                for block in event["message"]["content"]:
+                    if "toolUse" in block:
+                        tool_use = block["toolUse"]
+                        tool_names[tool_use["toolUseId"]] = tool_use["name"]
+                        yield "tool_start", {
+                            "id": tool_use["toolUseId"],
+                            "name": tool_use["name"],
+                            "input": tool_use.get("input")
+                        }
+                    elif "toolResult" in block:
+                        tool_result = block["toolResult"]
+                        yield "tool_end", {
+                            "id": tool_result["toolUseId"],
+                            "name": tool_names.get(tool_result["toolUseId"]),
+                            "status": tool_result.get("status")
+                        }
+
+            elif "result" in event:
+                response = event["result"]
+
+        text = text_filter.flush()
+        if text:
+            yield "delta", {"text": text}
+
+        response_text = str(response)
+
+        log.debug("Agent response: %s", response_text, extra={"session_id": self.session_id})
+
+        result = self._parse_response(response_text, artifacts)
+
+        # Only self-contained answers: no tool ran, no image or job came back
+        if (cache_key is not None and not tool_names and response.stop_reason == "end_turn"
+                and result["type"] == "text" and not result["job_id"] and response_text.strip()):
+            await get_response_cache().put(cache_key, response_text)
+
+        self._record_turn(user_input, result)
+
+        yield "final", result
+
+    def _append_exchange(self, user_text: str, assistant_text: str):
+        """Add a turn the agent didn't run to its conversation, so follow-ups can refer to it."""
+        self.agent.messages.append({"role": "user", "content": [{"text": user_text}]})
+        self.agent.messages.append({"role": "assistant", "content": [{"text": assistant_text}]})
+
+    def process(self, user_input: str, image_url: Optional[str] = None) ->dict:
+        """Blocking wrapper around aprocess for scripts and the REPL."""
+        return run_sync(lambda: self.aprocess(user_input, image_url))
+        
+    def _parse_response(self, response_text: str, artifacts: list = ())-> dict:
+        """
+        Build the turn result from the reply text and the artifacts the
+        tools recorded. Text markers ([IMAGE_PATH:...], [JOB_ID:...],
+        sandbox links) are still honoured, in a single pass, for replies
+        that carry them.
+        """
+        text, image_paths, job_ids = parse_markers(response_text)
+        images, job_ids = merge_artifacts(list(artifacts), image_paths, job_ids)
+
+        if images:
             return {
                 "type": "image",
-                "content": clean_text or "Here is your image",
-                "image_url": f"/outputs/{filename}"
-            }        
-    
-        return{
+                "content": text or "Here is your image",
+                "image_url": images[0]["image_url"],
+                "images": images,
+                "job_id": job_ids[0] if job_ids else None,
+                "job_ids": job_ids
+            }
+
+        return {
             "type": "text",
-            "content": response_text,
-            "image_url": None
+            "content": text,
+            "image_url": None,
+            "images": [],
+            "job_id": job_ids[0] if job_ids else None,
+            "job_ids": job_ids
         }
     
-_master_agent_instance = None
-
-def get_master_agent()->MasterAgent:
-    global _master_agent_instance
-
-    if _master_agent_instance is None:
-        _master_agent_instance = MasterAgent()
+def get_master_agent(session_id: Optional[str] = None)->MasterAgent:
+    """Return the agent for a session, creating it on first use."""
+    from src.agents.session_pool import get_session_pool
 
-    return _master_agent_instance
\ No newline at end of file
+    return get_session_pool().get(session_id or "default")
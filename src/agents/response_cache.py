@@ -0,0 +1,95 @@
+import re
+import hashlib
+import logging
+from typing import List, Optional
+from strands.types.content import Message
+from src.agents.config import Config
+from src.agents.history_manager import _block_text
+from src.services.ttl_cache import AsyncTTLCache
+
+log = logging.getLogger(__name__)
+
+# Trailing punctuation doesn't change the question
+_TRAILING_PUNCTUATION_RE = re.compile(r"[\s?!.]+$")
+
+
+def normalize_message(text: str) -> str:
+    """Lowercase, collapse whitespace and drop trailing ?!. so trivial variants share an entry."""
+    return _TRAILING_PUNCTUATION_RE.sub("", " ".join(text.lower().split()))
+
+
+def _digest(*parts: str) -> str:
+    hasher = hashlib.sha256()
+    for part in parts:
+        hasher.update(part.encode())
+        hasher.update(b"\0")
+    return hasher.hexdigest()
+
+
+class ResponseCache:
+    """
+    Cache of the agent's direct answers, for repeated FAQ-style messages
+    ("What is machine learning?") that would otherwise pay for a full
+    model call every time.
+
+    Only turns that made no tool call and produced plain text are
+    stored. Entries are keyed on a hash of the system prompt and tool
+    names, the model id, the normalized message and the text of the
+    last `context_messages` messages, so a change to MASTER_AGENT_PROMPT
+    or CHAT_MODEL simply stops matching old entries, and a follow-up
+    only hits when the conversation leading up to it is the same.
+    Entries expire after `ttl` seconds; at most `max_entries` are kept.
+    """
+
+    def __init__(
+        self,
+        ttl: float = Config.RESPONSE_CACHE_TTL_SECONDS,
+        max_entries: int = Config.RESPONSE_CACHE_MAX_ENTRIES,
+        context_messages: int = Config.RESPONSE_CACHE_CONTEXT_MESSAGES
+    ):
+        self.context_messages = context_messages
+        self.stored = 0
+        self._cache = AsyncTTLCache(ttl=ttl, max_entries=max_entries, shared_namespace="responses")
+
+    def key(self, system_prompt: str, tool_names: List[str], model_id: str, message: str, history: List[Message]) -> tuple:
+        """Cache key for answering `message` after `history` (the agent's messages so far)."""
+        recent = history[-self.context_messages:] if self.context_messages > 0 else []
+        context = [
+            f"{m['role']}: {_block_text(block)}"
+            for m in recent
+            for block in m["content"]
+        ]
+
+        return (
+            _digest(system_prompt, *sorted(tool_names)),
+            model_id,
+            normalize_message(message),
+            _digest(*context)
+        )
+
+    async def get(self, key: tuple) -> Optional[str]:
+        return await self._cache.lookup(key)
+
+    async def put(self, key: tuple, response_text: str):
+        await self._cache.store(key, response_text)
+        self.stored += 1
+
+    def stats(self, per_key: int = 0) -> dict:
+        """Hit/miss totals. Per-key counters are off by default: keys hold user messages."""
+        return {
+            "enabled": Config.RESPONSE_CACHE_ENABLED,
+            "stored": self.stored,
+            **self._cache.stats(per_key=per_key)
+        }
+
+
+_response_cache: Optional[ResponseCache] = None
+
+
+def get_response_cache() -> ResponseCache:
+    global _response_cache
+
+    if _response_cache is None:
+        _response_cache = ResponseCache()
+
+    return _response_cache
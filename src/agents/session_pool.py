@@ -0,0 +1,217 @@
+import time
+import asyncio
+import logging
+import threading
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Optional, Set, Tuple
+from src.agents.config import Config
+from src.services.state_store import get_state_store
+
+if TYPE_CHECKING:
+    from src.agents.master_agent import MasterAgent
+
+log = logging.getLogger(__name__)
+
+_SESSION_PREFIX = "session:"
+_SESSION_IMAGE_PREFIX = "session_image:"
+
+
+def session_key(session_id: str) -> str:
+    """State store key of a session's conversation."""
+    return _SESSION_PREFIX + session_id
+
+
+def session_image_key(session_id: str) -> str:
+    """State store key of the image a session is working on."""
+    return _SESSION_IMAGE_PREFIX + session_id
+
+
+class SessionPool:
+    """
+    Keeps one MasterAgent per chat session.
+
+    Sessions are kept in LRU order. Idle sessions are dropped when they
+    pass the TTL, when there are more than `max_sessions`, or when the
+    combined conversation size goes over `memory_cap_bytes`. A session
+    that is in the middle of a turn is never evicted.
+
+    With a shared STATE_BACKEND the pool is only a cache: every turn
+    starts from the conversation in the state store, so a session can
+    move between worker processes (and survive eviction) without
+    sticky sessions. Two turns of one session running at the same time
+    on different workers are not merged; the last one to finish wins.
+    """
+
+    def __init__(
+        self,
+        max_sessions: int = Config.MAX_SESSIONS,
+        ttl_seconds: float = Config.SESSION_TTL_SECONDS,
+        memory_cap_bytes: int = Config.SESSION_MEMORY_CAP_MB * 1024 * 1024
+    ):
+        self.max_sessions = max_sessions
+        self.ttl_seconds = ttl_seconds
+        self.memory_cap_bytes = memory_cap_bytes
+
+        self._sessions: "OrderedDict[str, MasterAgent]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self.evicted = 0
+
+    def get(self, session_id: str) -> "MasterAgent":
+        """Return the session's agent, creating it if needed. Blocking on a miss."""
+        with self._lock:
+            agent = self._sessions.get(session_id)
+            if agent is None:
+                agent = self._build(session_id)
+                self._sessions[session_id] = agent
+            return self._checkout(session_id, agent)
+
+    async def aget(self, session_id: str) -> "MasterAgent":
+        """
+        get() for the event loop: a new session's agent is built in the
+        offload pool, outside the lock. If two requests race to create
+        the same session, the first one stored wins.
+        """
+        with self._lock:
+            agent = self._sessions.get(session_id)
+            if agent is not None:
+                return self._checkout(session_id, agent)
+
+        from src.services.offload import run_blocking
+        built = await run_blocking(self._build, session_id)
+
+        with self._lock:
+            agent = self._sessions.setdefault(session_id, built)
+            return self._checkout(session_id, agent)
+
+    @staticmethod
+    def _build(session_id: str) -> "MasterAgent":
+        # Imported on first use: the agent stack (Strands, OpenAI, tools)
+        # is the slowest part of the app to load
+        from src.agents.master_agent import MasterAgent
+
+        return MasterAgent(session_id=session_id)
+
+    def _checkout(self, session_id: str, agent: "MasterAgent") -> "MasterAgent":
+        """Mark the session as used and apply the limits. Call with the lock held."""
+        self._sessions.move_to_end(session_id)
+        agent.touch()
+        self._enforce_limits(keep=session_id)
+        return agent
+
+    def peek(self, session_id: str) -> Optional["MasterAgent"]:
+        """Return the session's agent without creating or touching it."""
+        with self._lock:
+            return self._sessions.get(session_id)
+
+    def drop(self, session_id: str) -> bool:
+        """Forget a session here and in the shared state. Blocking with a shared backend."""
+        with self._lock:
+            dropped = self._sessions.pop(session_id, None) is not None
+
+        store = get_state_store()
+        if store.shared:
+            dropped = store.delete(session_key(session_id)) or dropped
+            store.delete(session_image_key(session_id))
+
+        return dropped
+
+    def evict_expired(self) -> int:
+        """Apply the TTL and caps now; return how many sessions were dropped."""
+        with self._lock:
+            before = len(self._sessions)
+            self._enforce_limits()
+            return before - len(self._sessions)
+
+    async def start(self, interval: float = Config.SESSION_SWEEP_INTERVAL_SECONDS):
+        """Sweep expired sessions every `interval` seconds, so idle workers free them too."""
+        if self._task is None and interval > 0:
+            self._task = asyncio.create_task(self._sweep(interval))
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _sweep(self, interval: float):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                evicted = self.evict_expired()
+                if evicted:
+                    log.info("🧹 Swept %d expired sessions", evicted)
+            except Exception as e:
+                log.warning("⚠️  Session sweep failed: %s", e)
+
+    def _enforce_limits(self, keep: Optional[str] = None):
+        now = time.monotonic()
+
+        # TTL first: anything idle for too long goes regardless of pressure
+        for session_id, agent in list(self._sessions.items()):
+            if session_id == keep or agent.busy:
+                continue
+            if now - agent.last_used > self.ttl_seconds:
+                self._evict(session_id)
+
+        # Then LRU until both the count and the memory cap are respected
+        total_bytes = sum(agent.approx_bytes for agent in self._sessions.values())
+
+        for session_id, agent in list(self._sessions.items()):
+            over_count = len(self._sessions) > self.max_sessions
+            over_memory = total_bytes > self.memory_cap_bytes
+            if not (over_count or over_memory):
+                break
+            if session_id == keep or agent.busy:
+                continue
+            total_bytes -= agent.approx_bytes
+            self._evict(session_id)
+
+    def _evict(self, session_id: str):
+        self._sessions.pop(session_id, None)
+        self.evicted += 1
+        log.info("🧹 Evicted idle session", extra={"session_id": session_id})
+
+    def references(self) -> Tuple[Set[str], Set[str]]:
+        """
+        Live session ids and the images those sessions are working on,
+        including sessions held by other workers. Blocking with a shared
+        backend.
+        """
+        with self._lock:
+            session_ids = set(self._sessions)
+            image_urls = {agent.current_image_url for agent in self._sessions.values() if agent.current_image_url}
+
+        store = get_state_store()
+        if store.shared:
+            session_ids.update(key[len(_SESSION_PREFIX):] for key in store.keys(_SESSION_PREFIX))
+            for key in store.keys(_SESSION_IMAGE_PREFIX):
+                image_url = store.get(key)
+                if image_url:
+                    image_urls.add(image_url)
+
+        return session_ids, image_urls
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "active_sessions": len(self._sessions),
+                "approx_bytes": sum(agent.approx_bytes for agent in self._sessions.values()),
+                "evicted": self.evicted,
+                "state_backend": get_state_store().name
+            }
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+
+_session_pool: Optional[SessionPool] = None
+
+
+def get_session_pool() -> SessionPool:
+    global _session_pool
+
+    if _session_pool is None:
+        _session_pool = SessionPool()
+
+    return _session_pool
@@ -1,28 +1,70 @@
 from fastapi import APIRouter, UploadFile, File, HTTPException, Query
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field
 from typing import Optional, List
-from src.agents.master_agent import get_master_agent
+import uuid
+from src.agents.session_pool import get_session_pool
+from src.services.output_store import OutputStore
+from src.services.offload import run_blocking
+from src.services.streaming import sse
 
 router = APIRouter()
 
 class ChatRequest(BaseModel):
     message: str
     image_url: Optional[str] = None
+    session_id: Optional[str] = Field(
+        default=None,
+        description="Conversation id. Omit to start a new session; reuse the returned id for follow-ups."
+    )
+
+
+class ImageArtifact(BaseModel):
+    image_url: str
+    thumbnail_url: Optional[str] = None
+    preview_url: Optional[str] = None
+    metadata: dict = Field(
+        default_factory=dict,
+        description="What the tool recorded about the image: prompt, size, source image, ..."
+    )
 
 
 class ChatResponse(BaseModel):
     type: str
     content: str
     image_url: Optional[str] = None
+    thumbnail_url: Optional[str] = Field(
+        default=None,
+        description="Small WebP/AVIF version of image_url, for chat lists."
+    )
+    preview_url: Optional[str] = Field(
+        default=None,
+        description="Compressed WebP/AVIF version of image_url; load this first."
+    )
+    images: List[ImageArtifact] = Field(
+        default_factory=list,
+        description="Every image produced this turn; image_url is the first one."
+    )
+    session_id: Optional[str] = None
+    job_id: Optional[str] = Field(
+        default=None,
+        description="Set when an image is being produced in the background; poll GET /jobs/{job_id}."
+    )
+    job_ids: List[str] = Field(
+        default_factory=list,
+        description="Every background job started this turn; job_id is the first one."
+    )
 
 @router.post("/chat", response_model=ChatResponse)
 async def chat(request: ChatRequest):
     try:
-        # Get the master agent
-        agent = get_master_agent()
+        session_id = request.session_id or uuid.uuid4().hex
+
+        # Get the master agent for this session
+        agent = await get_session_pool().aget(session_id)
         
         # Process the message
-        result = agent.process(
+        result = await agent.aprocess(
             user_input=request.message,
             image_url=request.image_url
         )
@@ -30,11 +72,68 @@ async def chat(request: ChatRequest):
         return ChatResponse(
             type=result["type"],
             content=result["content"],
-            image_url=result.get("image_url")
+            image_url=result.get("image_url"),
+            **OutputStore.variant_urls(result.get("image_url")),
+            images=result.get("images", []),
+            session_id=session_id,
+            job_id=result.get("job_id"),
+            job_ids=result.get("job_ids", [])
         )
         
     except Exception as e:
         raise HTTPException(
             status_code=500,
             detail=f"Chat processing failed: {str(e)}"
-        )
\ No newline at end of file
+        )
+
+
+@router.post("/chat/stream")
+async def chat_stream(request: ChatRequest):
+    """
+    Stream a chat turn as Server-Sent Events.
+
+    Events: `session` (the session id), `delta` (text chunks),
+    `tool_start` / `tool_end`, `error`, and a last `final` event
+    carrying the same payload as POST /chat.
+    """
+    session_id = request.session_id or uuid.uuid4().hex
+    agent = await get_session_pool().aget(session_id)
+
+    async def event_source():
+        yield sse("session", {"session_id": session_id})
+
+        async for event, data in agent.astream(
+            user_input=request.message,
+            image_url=request.image_url
+        ):
+            if event == "final":
+                data = ChatResponse(
+                    type=data["type"],
+                    content=data["content"],
+                    image_url=data.get("image_url"),
+                    **OutputStore.variant_urls(data.get("image_url")),
+                    images=data.get("images", []),
+                    session_id=session_id,
+                    job_id=data.get("job_id"),
+                    job_ids=data.get("job_ids", [])
+                ).model_dump()
+
+            yield sse(event, data)
+
+    return StreamingResponse(
+        event_source(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no"
+        }
+    )
+
+
+@router.delete("/chat/{session_id}")
+async def end_session(session_id: str):
+    """Forget a session's conversation and free its agent."""
+    if not await run_blocking(get_session_pool().drop, session_id):
+        raise HTTPException(status_code=404, detail="Session not found")
+
+    return {"session_id": session_id, "status": "deleted"}
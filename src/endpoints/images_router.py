@@ -0,0 +1,57 @@
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field
+from typing import List
+import uuid
+from src.services.streaming import sse
+
+router = APIRouter()
+
+
+class BatchImageRequest(BaseModel):
+    prompts: List[str] = Field(description="One prompt per image set.")
+    n: int = Field(default=1, description="Variants to generate for each prompt.")
+    size: str = "1024x1024"
+    quality: str = "high"
+
+
+@router.post("/images/batch")
+async def batch_images(request: BatchImageRequest):
+    """
+    Generate images for several prompts concurrently, streamed as
+    Server-Sent Events.
+
+    Events: `batch` (batch id and item count), one `item` per prompt as
+    it finishes (any order; see `index`), and a last `done` event with
+    the succeeded/failed counts. All images are written to OUTPUT_DIR.
+    """
+    from src.tools.image_generator import generate_batch, validate_batch
+
+    try:
+        prompts = validate_batch(request.prompts, request.n)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    batch_id = uuid.uuid4().hex
+
+    async def event_source():
+        yield sse("batch", {"batch_id": batch_id, "items": len(prompts), "n": request.n})
+
+        succeeded = failed = 0
+        async for item in generate_batch(prompts, request.n, request.size, request.quality):
+            if item["status"] == "succeeded":
+                succeeded += 1
+            else:
+                failed += 1
+            yield sse("item", item)
+
+        yield sse("done", {"batch_id": batch_id, "succeeded": succeeded, "failed": failed})
+
+    return StreamingResponse(
+        event_source(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no"
+        }
+    )
@@ -0,0 +1,49 @@
+from fastapi import APIRouter, HTTPException
+from pydantic import BaseModel
+from typing import Optional
+from src.services.jobs import get_job_manager
+from src.services.offload import run_blocking
+from src.services.output_store import OutputStore
+
+router = APIRouter()
+
+
+class JobStatus(BaseModel):
+    job_id: str
+    type: str
+    status: str
+    image_url: Optional[str] = None
+    thumbnail_url: Optional[str] = None
+    preview_url: Optional[str] = None
+    message: Optional[str] = None
+    error: Optional[str] = None
+    created_at: float
+    updated_at: float
+
+
+@router.get("/jobs/{job_id}", response_model=JobStatus)
+async def get_job(job_id: str):
+    """
+    Poll a background image job.
+
+    `status` is one of queued, running, succeeded or failed; once it
+    has succeeded, `image_url` points at the result.
+    """
+    job = await run_blocking(get_job_manager().get, job_id)
+
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    result = job["result"] or {}
+
+    return JobStatus(
+        job_id=job["job_id"],
+        type=job["type"],
+        status=job["status"],
+        image_url=result.get("image_url"),
+        **OutputStore.variant_urls(result.get("image_url")),
+        message=result.get("message"),
+        error=job["error"],
+        created_at=job["created_at"],
+        updated_at=job["updated_at"]
+    )
@@ -0,0 +1,54 @@
+import os
+from fastapi import APIRouter, HTTPException, Query, Request, Response
+from fastapi.responses import FileResponse
+from typing import Optional
+from src.agents.config import Config
+from src.services.output_store import MEDIA_TYPES, get_output_store
+from src.services.offload import run_blocking
+from src.services.storage import get_storage_manager
+
+router = APIRouter()
+
+
+@router.api_route("/outputs/{filename}", methods=["GET", "HEAD"])
+async def get_output(
+    filename: str,
+    request: Request,
+    variant: Optional[str] = Query(default=None, pattern="^(thumb|preview)$")
+):
+    """
+    Serve a generated or edited image, or one of its variants.
+
+    `?variant=thumb` and `?variant=preview` return small WebP/AVIF
+    versions for chat UIs. Responses carry an ETag and Cache-Control,
+    answer If-None-Match with 304, and support Range requests.
+    """
+    store = get_output_store()
+
+    if variant:
+        path = await run_blocking(store.ensure_variant, filename, variant)
+    else:
+        path = store.resolve(filename)
+
+    if path is None:
+        raise HTTPException(status_code=404, detail="Image not found")
+
+    get_storage_manager().touch(store.resolve(filename))
+
+    stat = await run_blocking(os.stat, path)
+    etag = f'"{stat.st_size:x}-{stat.st_mtime_ns:x}"'
+    headers = {
+        "ETag": etag,
+        "Cache-Control": f"public, max-age={Config.OUTPUT_CACHE_MAX_AGE}"
+    }
+
+    if_none_match = request.headers.get("if-none-match", "")
+    if etag in [tag.strip() for tag in if_none_match.split(",")] or if_none_match.strip() == "*":
+        return Response(status_code=304, headers=headers)
+
+    return FileResponse(
+        path,
+        headers=headers,
+        media_type=MEDIA_TYPES.get(os.path.splitext(path)[1].lower()),
+        stat_result=stat
+    )
@@ -0,0 +1,72 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+from src.tools.image_cache import get_image_cache
+from src.services.offload import run_blocking
+from src.services.rate_limiter import guard_stats
+from src.agents.intent_router import get_intent_router
+from src.services.storage import get_storage_manager
+from src.services.telemetry import render_metrics
+
+router = APIRouter()
+
+
+@router.get("/stats/cache")
+async def cache_stats():
+    """Hit/miss counters for the image, web search, mask and chat response caches."""
+    from src.tools.websearch_tool import search_cache
+    from src.tools.mask_engine import get_mask_cache
+    from src.agents.response_cache import get_response_cache
+
+    return {
+        "image_cache": await run_blocking(get_image_cache().stats),
+        "websearch_cache": search_cache.stats(),
+        "mask_cache": get_mask_cache().stats(),
+        "response_cache": get_response_cache().stats()
+    }
+
+
+@router.get("/stats/upstreams")
+async def upstream_stats():
+    """Current rate, throttle counts and circuit state per upstream."""
+    return guard_stats()
+
+
+@router.get("/stats/router")
+async def router_stats():
+    """How many messages the intent router answered without the LLM planner."""
+    return get_intent_router().stats()
+
+
+@router.get("/stats/storage")
+async def storage_stats():
+    """Tracked upload/output files, quota and garbage collection totals."""
+    return await run_blocking(get_storage_manager().stats)
+
+
+@router.get("/stats/edits")
+async def edit_stats():
+    """Edit upload sizes before and after normalization, and time spent on it."""
+    from src.tools.edit_normalizer import get_edit_normalizer
+
+    return get_edit_normalizer().stats()
+
+
+@router.get("/stats/state")
+async def state_stats():
+    """Shared state backend and the sessions this worker holds in memory."""
+    from src.agents.session_pool import get_session_pool
+    from src.services.state_store import get_state_store
+
+    return {
+        "state": await run_blocking(get_state_store().stats),
+        "sessions": get_session_pool().stats()
+    }
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Prometheus metrics: latencies, token usage, tool outcomes, caches, queues and sessions."""
+    return PlainTextResponse(
+        await run_blocking(render_metrics),
+        media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
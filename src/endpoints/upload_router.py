@@ -0,0 +1,51 @@
+import logging
+from fastapi import APIRouter, HTTPException, Query, Request
+from pydantic import BaseModel, Field
+from typing import Optional
+from src.services.offload import run_blocking
+from src.services.storage import get_storage_manager
+from src.services.uploads import UploadRejected, receive_upload
+
+log = logging.getLogger(__name__)
+
+router = APIRouter()
+
+
+class UploadResponse(BaseModel):
+    image_url: str = Field(description="Local path; pass it as image_url to /chat to edit this image.")
+    filename: Optional[str] = None
+    content_type: str
+    bytes: int
+    sha256: str
+    deduplicated: bool = Field(description="True when the same image was already uploaded.")
+
+
+@router.post("/upload", response_model=UploadResponse)
+async def upload_image(request: Request, session_id: Optional[str] = Query(default=None)):
+    """
+    Upload an image to edit.
+
+    Send multipart/form-data with a `file` field, or the raw image with
+    an image/* Content-Type. The body is streamed to disk; PNG, JPG and
+    WEBP (checked from the file's bytes) up to MAX_FILE_SIZE_MB are
+    accepted. Identical images are stored once.
+    """
+    try:
+        result = await receive_upload(request)
+    except UploadRejected as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+
+    await run_blocking(get_storage_manager().track, result["path"], session_id=session_id)
+
+    log.info("📤 Upload stored: %s", result["path"], extra={
+        "bytes": result["bytes"], "deduplicated": result["deduplicated"], "session_id": session_id
+    })
+
+    return UploadResponse(
+        image_url=result["path"],
+        filename=result["filename"],
+        content_type=result["content_type"],
+        bytes=result["bytes"],
+        sha256=result["sha256"],
+        deduplicated=result["deduplicated"]
+    )
@@ -0,0 +1,130 @@
+import os
+import re
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, List, Optional, Tuple
+from src.services.output_store import OutputStore
+
+# Artifacts (images, background jobs) produced while the current turn or
+# job runs. Tools append to it next to the text they return, so callers
+# read what was produced instead of scanning the text for markers.
+current_artifacts: ContextVar[Optional[List[dict]]] = ContextVar("current_artifacts", default=None)
+
+# Every text marker in one alternation, so a reply is scanned once:
+# [IMAGE_PATH:...], [JOB_ID:...], ![...](sandbox:/outputs/...) and a bare
+# sandbox:/outputs/... link (collected, but left in the text)
+_MARKER_RE = re.compile(
+    r"\[(?P<kind>IMAGE_PATH|JOB_ID):(?P<value>[^\]]+)\]"
+    r"|!\[[^\]]*\]\(sandbox:/outputs/(?P<markdown>[^)]*)\)"
+    r"|sandbox:/outputs/(?P<bare>[a-zA-Z0-9_\-\.]+)"
+)
+
+
+def start_collecting() -> List[dict]:
+    """
+    Collect artifacts for the rest of the current context and return the
+    (live) list. For async generators, where a `with` block can't be
+    reset safely across yields; each request runs in its own context.
+    """
+    artifacts: List[dict] = []
+    current_artifacts.set(artifacts)
+    return artifacts
+
+
+@contextmanager
+def collect_artifacts() -> Iterator[List[dict]]:
+    """Collect the artifacts produced inside the block."""
+    artifacts: List[dict] = []
+    token = current_artifacts.set(artifacts)
+    try:
+        yield artifacts
+    finally:
+        current_artifacts.reset(token)
+
+
+def image_artifact(path: str, **metadata) -> dict:
+    image_url = f"/outputs/{os.path.basename(path)}"
+    return {
+        "kind": "image",
+        "image_path": path,
+        "image_url": image_url,
+        **OutputStore.variant_urls(image_url),
+        "metadata": metadata
+    }
+
+
+def record_image(path: str, **metadata):
+    """Report an image saved to OUTPUT_DIR. No-op when nothing is collecting."""
+    artifacts = current_artifacts.get()
+    if artifacts is not None:
+        artifacts.append(image_artifact(path, **metadata))
+
+
+def record_job(job_id: str, job_type: str):
+    """Report a background job started for the current turn."""
+    artifacts = current_artifacts.get()
+    if artifacts is not None:
+        artifacts.append({"kind": "job", "job_id": job_id, "job_type": job_type})
+
+
+def parse_markers(text: str) -> Tuple[str, List[str], List[str]]:
+    """
+    Single-pass fallback for replies that carry text markers.
+
+    Returns the text with [IMAGE_PATH:...], [JOB_ID:...] and sandbox
+    markdown images removed, the image paths in order of appearance and
+    the job ids.
+    """
+    if "[" not in text and "sandbox:" not in text:
+        return text.strip(), [], []
+
+    images: List[str] = []
+    job_ids: List[str] = []
+    parts: List[str] = []
+    position = 0
+
+    for match in _MARKER_RE.finditer(text):
+        if match.group("bare") is not None:
+            images.append(match.group("bare"))
+            continue
+
+        if match.group("kind") == "JOB_ID":
+            job_ids.append(match.group("value"))
+        else:
+            images.append(match.group("value") or match.group("markdown"))
+
+        parts.append(text[position:match.start()])
+        position = match.end()
+
+    parts.append(text[position:])
+    return "".join(parts).strip(), images, job_ids
+
+
+def merge_artifacts(artifacts: List[dict], image_paths: List[str], job_ids: List[str]) -> Tuple[List[dict], List[str]]:
+    """
+    Images and job ids from the side channel plus any found only as
+    text markers, without duplicates. Side-channel entries come first
+    since they carry metadata.
+    """
+    images: List[dict] = []
+    seen_images = set()
+    jobs: List[str] = []
+
+    for artifact in artifacts:
+        if artifact["kind"] == "image" and artifact["image_url"] not in seen_images:
+            seen_images.add(artifact["image_url"])
+            images.append(artifact)
+        elif artifact["kind"] == "job" and artifact["job_id"] not in jobs:
+            jobs.append(artifact["job_id"])
+
+    for path in image_paths:
+        artifact = image_artifact(path)
+        if artifact["image_url"] not in seen_images:
+            seen_images.add(artifact["image_url"])
+            images.append(artifact)
+
+    for job_id in job_ids:
+        if job_id not in jobs:
+            jobs.append(job_id)
+
+    return images, jobs
@@ -0,0 +1,127 @@
+import asyncio
+import importlib.util
+from typing import TYPE_CHECKING, Optional
+import httpx
+from src.agents.config import Config
+
+if TYPE_CHECKING:
+    from openai import AsyncOpenAI
+
+
+class _SharedAsyncClient(httpx.AsyncClient):
+    """
+    AsyncClient whose aclose() is a no-op.
+
+    Strands' OpenAIModel wraps its client in `async with` on every
+    request, which would close a shared pool after the first call.
+    The registry closes it for real with force_close() at shutdown.
+    """
+
+    async def aclose(self) -> None:
+        pass
+
+    async def force_close(self) -> None:
+        await super().aclose()
+
+
+def _http2_enabled() -> bool:
+    # httpx needs the optional h2 package for HTTP/2
+    return Config.HTTP2_ENABLED and importlib.util.find_spec("h2") is not None
+
+
+class ClientRegistry:
+    """
+    Network clients shared by the agent and every tool.
+
+    Holds pooled keep-alive HTTP clients and the OpenAI clients built on
+    top of them, so TLS handshakes and connections are reused across
+    requests instead of being set up per call. The OpenAI SDK is only
+    imported when one of its clients is first used, which keeps server
+    startup fast.
+    """
+
+    def __init__(self):
+        http2 = _http2_enabled()
+        limits = httpx.Limits(
+            max_connections=Config.HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=Config.HTTP_MAX_KEEPALIVE,
+            keepalive_expiry=Config.HTTP_KEEPALIVE_SECONDS
+        )
+        http_timeout = httpx.Timeout(Config.HTTP_TIMEOUT_SECONDS, connect=5.0)
+        openai_timeout = httpx.Timeout(Config.OPENAI_TIMEOUT_SECONDS, connect=5.0)
+
+        # Generic HTTP (image downloads, webhooks)
+        self.http = httpx.AsyncClient(http2=http2, limits=limits, timeout=http_timeout, follow_redirects=True)
+
+        # OpenAI API (images, summaries, chat model)
+        self._openai_http = httpx.AsyncClient(http2=http2, limits=limits, timeout=openai_timeout)
+        self._model_http = _SharedAsyncClient(http2=http2, limits=limits, timeout=openai_timeout)
+
+        self._openai: Optional["AsyncOpenAI"] = None
+
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    @property
+    def openai(self) -> "AsyncOpenAI":
+        if self._openai is None:
+            from openai import AsyncOpenAI
+            self._openai = AsyncOpenAI(
+                api_key=Config.OPENAI_API_KEY, base_url=Config.OPENAI_BASE_URL or None, http_client=self._openai_http
+            )
+        return self._openai
+
+    def model_client_args(self) -> dict:
+        """client_args for Strands' OpenAIModel, reusing the shared pool."""
+        args = {"api_key": Config.OPENAI_API_KEY, "http_client": self._model_http}
+        if Config.OPENAI_BASE_URL:
+            args["base_url"] = Config.OPENAI_BASE_URL
+        return args
+
+    async def aclose(self):
+        await self.http.aclose()
+        await self._openai_http.aclose()
+        await self._model_http.force_close()
+
+
+_clients: Optional[ClientRegistry] = None
+
+
+def get_clients() -> ClientRegistry:
+    """
+    Return the shared client registry, creating it on first use.
+
+    Async clients belong to the event loop that first uses them. If
+    that loop has since been closed (e.g. a script that called
+    MasterAgent.process before), a fresh registry is built.
+    """
+    global _clients
+
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        loop = None
+
+    if _clients is not None and _clients._loop is not None and _clients._loop.is_closed():
+        _clients = None
+
+    if _clients is None:
+        _clients = ClientRegistry()
+
+    if _clients._loop is None and loop is not None:
+        _clients._loop = loop
+
+    return _clients
+
+
+async def start_clients() -> ClientRegistry:
+    """Create the registry on the server's loop. Called from main.lifespan."""
+    return get_clients()
+
+
+async def close_clients():
+    """Close every pooled connection. Called from main.lifespan."""
+    global _clients
+
+    if _clients is not None:
+        await _clients.aclose()
+        _clients = None
@@ -0,0 +1,397 @@
+import os
+import re
+import json
+import logging
+import time
+import uuid
+import socket
+import asyncio
+import sqlite3
+from contextlib import contextmanager
+from typing import Awaitable, Callable, Dict, List, Optional
+from src.agents.config import Config
+from src.services.offload import run_blocking
+from src.services.storage import current_session_id
+from src.services.state_store import SCOPE_CLUSTER, get_state_store
+
+log = logging.getLogger(__name__)
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_SUCCEEDED = "succeeded"
+JOB_FAILED = "failed"
+
+JobHandler = Callable[[dict], Awaitable[dict]]
+
+_IMAGE_PATH_RE = re.compile(r'\[IMAGE_PATH:([^\]]+)\]')
+
+
+def _job_key(job_id: str) -> str:
+    return f"job:{job_id}"
+
+
+class JobFailed(Exception):
+    """Raised by a handler when the work finished but did not succeed."""
+
+
+def image_job_result(message: str, artifacts: Optional[List[dict]] = None) -> dict:
+    """
+    Turn an image tool's reply into a job result.
+
+    The image comes from the artifacts the tool recorded (see
+    collect_artifacts), or from the reply's [IMAGE_PATH:...] marker.
+    The tools report failures as text rather than raising, so a reply
+    with neither counts as a failed job.
+    """
+    images = [artifact for artifact in artifacts or [] if artifact["kind"] == "image"]
+    if images:
+        image_path = images[0]["image_path"]
+    else:
+        match = _IMAGE_PATH_RE.search(message)
+        if not match:
+            raise JobFailed(message)
+        image_path = match.group(1)
+
+    return {
+        "image_path": image_path,
+        "image_url": f"/outputs/{os.path.basename(image_path)}",
+        "message": _IMAGE_PATH_RE.sub("", message).strip()
+    }
+
+
+class JobManager:
+    """
+    In-process background jobs for slow work such as image generation.
+
+    Each job type has its own asyncio queue and a fixed number of worker
+    tasks, which is that type's concurrency limit, so a burst of edits
+    can't starve generations. Job state lives in SQLite, so status
+    survives restarts and any worker process can answer GET /jobs/{id}.
+
+    Several worker processes can share JOB_DB_PATH. A running job is
+    leased to the process that claimed it (`owner`, `lease_until`) and
+    the lease is renewed while it runs. Queued jobs and running jobs
+    whose lease ran out (the owner died) are picked up on start; after
+    that, every third of a lease period, so are running jobs whose lease
+    ran out and queued jobs nobody claimed for a whole lease period
+    (e.g. handed back by a stopped process). Jobs another process is
+    still running are left alone. With a cluster-wide
+    STATE_BACKEND (Redis) every status change is also copied there, so
+    workers on other hosts can answer too.
+    """
+
+    def __init__(self, db_path: str = Config.JOB_DB_PATH, lease_seconds: float = Config.JOB_LEASE_SECONDS):
+        self.db_path = db_path
+        self.lease_seconds = lease_seconds
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._handlers: Dict[str, JobHandler] = {}
+        self._concurrency: Dict[str, int] = {}
+        self._queues: Dict[str, asyncio.Queue] = {}
+        self._workers: List[asyncio.Task] = []
+        self._lease_task: Optional[asyncio.Task] = None
+        # Ids waiting in our own queues, so the periodic pass doesn't add them twice
+        self._queued_ids: set = set()
+        self.running = False
+
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    type TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    params TEXT NOT NULL,
+                    result TEXT,
+                    error TEXT,
+                    session_id TEXT,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL,
+                    owner TEXT,
+                    lease_until REAL
+                )
+                """
+            )
+            # Databases created before leases
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(jobs)")}
+            if "owner" not in columns:
+                conn.execute("ALTER TABLE jobs ADD COLUMN owner TEXT")
+                conn.execute("ALTER TABLE jobs ADD COLUMN lease_until REAL")
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=10)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def register(self, job_type: str, handler: JobHandler, concurrency: int = 1):
+        self._handlers[job_type] = handler
+        self._concurrency[job_type] = max(1, concurrency)
+
+    # ----- lifecycle -----
+
+    async def start(self):
+        """Start the workers and queue jobs nobody is running."""
+        if self.running:
+            return
+
+        for job_type, concurrency in self._concurrency.items():
+            queue = asyncio.Queue()
+            self._queues[job_type] = queue
+            for _ in range(concurrency):
+                self._workers.append(asyncio.create_task(self._worker(job_type, queue)))
+
+        self.running = True
+
+        self._enqueue(await run_blocking(self._recover))
+        self._lease_task = asyncio.create_task(self._maintain_leases())
+
+        log.info("🧵 Job workers started: %s", self._concurrency)
+
+    async def stop(self):
+        if self._lease_task is not None:
+            self._lease_task.cancel()
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, *filter(None, [self._lease_task]), return_exceptions=True)
+
+        # Hand our unfinished jobs back right away instead of when the lease runs out
+        await run_blocking(self._execute,
+            "UPDATE jobs SET status = ?, owner = NULL, lease_until = NULL WHERE status = ? AND owner = ?",
+            (JOB_QUEUED, JOB_RUNNING, self.worker_id)
+        )
+
+        self._workers = []
+        self._queues = {}
+        self._queued_ids = set()
+        self._lease_task = None
+        self.running = False
+
+    def _enqueue(self, jobs: list):
+        for job_id, job_type in jobs:
+            if job_type in self._queues and job_id not in self._queued_ids:
+                self._queued_ids.add(job_id)
+                self._queues[job_type].put_nowait(job_id)
+
+    def _recover(self) -> list:
+        """
+        Re-queue running jobs whose lease ran out and return the queued
+        jobs, oldest first. Other processes may queue the same ids;
+        _claim lets only one of them run each job.
+        """
+        cutoff = time.time() - Config.JOB_RETENTION_HOURS * 3600
+
+        with self._connect() as conn:
+            conn.execute(
+                "DELETE FROM jobs WHERE status IN (?, ?) AND updated_at < ?",
+                (JOB_SUCCEEDED, JOB_FAILED, cutoff)
+            )
+            self._release_expired(conn)
+            return conn.execute(
+                "SELECT id, type FROM jobs WHERE status = ? ORDER BY created_at",
+                (JOB_QUEUED,)
+            ).fetchall()
+
+    def _release_expired(self, conn: sqlite3.Connection) -> list:
+        """Put running jobs with an expired (or no) lease back in the queue; return them."""
+        now = time.time()
+        expired = "status = ? AND (lease_until IS NULL OR lease_until < ?)"
+
+        jobs = conn.execute(f"SELECT id, type FROM jobs WHERE {expired}", (JOB_RUNNING, now)).fetchall()
+        if jobs:
+            conn.execute(
+                f"UPDATE jobs SET status = ?, owner = NULL, lease_until = NULL WHERE {expired}",
+                (JOB_QUEUED, JOB_RUNNING, now)
+            )
+            log.warning("♻️  Re-queued %d jobs whose worker stopped renewing its lease", len(jobs))
+        return jobs
+
+    async def _maintain_leases(self):
+        """Renew the leases of jobs we run and take over jobs whose owner died."""
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            try:
+                self._enqueue(await run_blocking(self._renew_leases))
+            except Exception as e:
+                log.warning("⚠️  Job lease upkeep failed: %s", e)
+
+    def _renew_leases(self) -> list:
+        """Renew our leases; return jobs to queue (expired leases, long-unclaimed queued jobs)."""
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET lease_until = ? WHERE status = ? AND owner = ?",
+                (now + self.lease_seconds, JOB_RUNNING, self.worker_id)
+            )
+            released = self._release_expired(conn)
+            stale = conn.execute(
+                "SELECT id, type FROM jobs WHERE status = ? AND updated_at < ? ORDER BY created_at",
+                (JOB_QUEUED, now - self.lease_seconds)
+            ).fetchall()
+            return released + stale
+
+    # ----- submit / query -----
+
+    async def submit(self, job_type: str, params: dict, session_id: Optional[str] = None) -> str:
+        if job_type not in self._queues:
+            raise ValueError(f"No workers for job type: {job_type}")
+
+        job_id = uuid.uuid4().hex
+        now = time.time()
+
+        await run_blocking(self._execute,
+            "INSERT INTO jobs (id, type, status, params, session_id, created_at, updated_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (job_id, job_type, JOB_QUEUED, json.dumps(params), session_id, now, now)
+        )
+        self._enqueue([(job_id, job_type)])
+        await self._publish(job_id)
+
+        log.info("📥 Queued %s job", job_type, extra={"job_id": job_id, "session_id": session_id})
+        return job_id
+
+    def get(self, job_id: str) -> Optional[dict]:
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT id, type, status, result, error, session_id, created_at, updated_at "
+                "FROM jobs WHERE id = ?",
+                (job_id,)
+            ).fetchone()
+
+        if row is None:
+            # Submitted on another host
+            store = get_state_store()
+            return store.get(_job_key(job_id)) if store.scope == SCOPE_CLUSTER else None
+
+        job_id, job_type, status, result, error, session_id, created_at, updated_at = row
+        return {
+            "job_id": job_id,
+            "type": job_type,
+            "status": status,
+            "result": json.loads(result) if result else None,
+            "error": error,
+            "session_id": session_id,
+            "created_at": created_at,
+            "updated_at": updated_at
+        }
+
+    def queue_depth(self) -> Dict[str, int]:
+        return {job_type: queue.qsize() for job_type, queue in self._queues.items()}
+
+    def _execute(self, sql: str, args: tuple):
+        with self._connect() as conn:
+            conn.execute(sql, args)
+
+    async def _publish(self, job_id: str):
+        """Copy the job's status to a cluster-wide state store, if there is one."""
+        store = get_state_store()
+        if store.scope != SCOPE_CLUSTER:
+            return
+
+        def publish():
+            job = self.get(job_id)
+            if job is not None:
+                store.set(_job_key(job_id), job, ttl=Config.JOB_RETENTION_HOURS * 3600)
+
+        try:
+            await run_blocking(publish)
+        except Exception as e:
+            log.warning("⚠️  Could not publish job status: %s", e, extra={"job_id": job_id})
+
+    # ----- workers -----
+
+    async def _worker(self, job_type: str, queue: asyncio.Queue):
+        handler = self._handlers[job_type]
+
+        while True:
+            job_id = await queue.get()
+            self._queued_ids.discard(job_id)
+            try:
+                await self._run(job_id, handler)
+            except Exception as e:
+                # e.g. "database is locked"; keep the worker, fail the job if we can
+                log.exception("❌ Job worker error: %s", e, extra={"job_id": job_id})
+                await self._fail_unexpected(job_id, e)
+            finally:
+                queue.task_done()
+
+    async def _fail_unexpected(self, job_id: str, error: Exception):
+        try:
+            await run_blocking(self._execute,
+                "UPDATE jobs SET status = ?, error = ?, updated_at = ? WHERE id = ? AND status = ? AND owner = ?",
+                (JOB_FAILED, f"Internal error: {error}", time.time(), job_id, JOB_RUNNING, self.worker_id)
+            )
+            await self._publish(job_id)
+        except Exception as e:
+            log.warning("⚠️  Could not mark job failed: %s", e, extra={"job_id": job_id})
+
+    async def _run(self, job_id: str, handler: JobHandler):
+        row = await run_blocking(self._claim, job_id)
+        if row is None:
+            return
+
+        params, session_id = row
+        await self._publish(job_id)
+        # Files the handler writes belong to the session that asked for them
+        current_session_id.set(session_id)
+
+        try:
+            result = await handler(json.loads(params))
+            await run_blocking(self._execute,
+                "UPDATE jobs SET status = ?, result = ?, updated_at = ? WHERE id = ?",
+                (JOB_SUCCEEDED, json.dumps(result), time.time(), job_id)
+            )
+            log.info("✅ Job succeeded", extra={"job_id": job_id})
+        except asyncio.CancelledError:
+            # Shutting down: stop() hands it back to the queue
+            raise
+        except Exception as e:
+            await run_blocking(self._execute,
+                "UPDATE jobs SET status = ?, error = ?, updated_at = ? WHERE id = ?",
+                (JOB_FAILED, str(e), time.time(), job_id)
+            )
+            log.error("❌ Job failed: %s", e, extra={"job_id": job_id})
+
+        await self._publish(job_id)
+        await self._notify(job_id)
+
+    def _claim(self, job_id: str) -> Optional[tuple]:
+        """Lease a queued job to this process and return its (params JSON, session id)."""
+        now = time.time()
+        with self._connect() as conn:
+            updated = conn.execute(
+                "UPDATE jobs SET status = ?, owner = ?, lease_until = ?, updated_at = ? WHERE id = ? AND status = ?",
+                (JOB_RUNNING, self.worker_id, now + self.lease_seconds, now, job_id, JOB_QUEUED)
+            ).rowcount
+            if not updated:
+                return None
+            return conn.execute("SELECT params, session_id FROM jobs WHERE id = ?", (job_id,)).fetchone()
+
+    async def _notify(self, job_id: str):
+        """POST the finished job to JOB_WEBHOOK_URL, if one is configured."""
+        if not Config.JOB_WEBHOOK_URL:
+            return
+
+        from src.services.clients import get_clients
+
+        try:
+            job = await run_blocking(self.get, job_id)
+            await get_clients().http.post(Config.JOB_WEBHOOK_URL, json=job)
+        except Exception as e:
+            log.warning("⚠️  Job webhook failed: %s", e, extra={"job_id": job_id})
+
+
+_job_manager: Optional[JobManager] = None
+
+
+def get_job_manager() -> JobManager:
+    global _job_manager
+
+    if _job_manager is None:
+        _job_manager = JobManager()
+
+    return _job_manager
@@ -0,0 +1,73 @@
+import asyncio
+import contextvars
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Optional, TypeVar
+from src.agents.config import Config
+
+T = TypeVar("T")
+
+_executor: Optional[ThreadPoolExecutor] = None
+
+
+def get_offload_executor() -> ThreadPoolExecutor:
+    """
+    Return the bounded thread pool used for blocking work.
+
+    Everything that still has to run synchronously (PIL, file writes,
+    the DuckDuckGo client, sync Strands tools) goes through this pool
+    so a burst of slow calls can never spawn an unbounded number of
+    threads or block the event loop.
+    """
+    global _executor
+
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=Config.OFFLOAD_MAX_WORKERS,
+            thread_name_prefix="sarvo-offload"
+        )
+
+    return _executor
+
+
+def install_offload_executor(loop: asyncio.AbstractEventLoop) -> None:
+    """
+    Make the offload pool the loop's default executor.
+
+    Strands runs synchronous @tool functions with asyncio.to_thread,
+    which uses the default executor, so this bounds those as well.
+    """
+    loop.set_default_executor(get_offload_executor())
+
+
+def shutdown_offload_executor() -> None:
+    """Stop the offload pool. Called from the app shutdown hook."""
+    global _executor
+
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+async def run_blocking(func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """
+    Run a blocking callable in the offload pool and await its result.
+
+    Context variables are copied into the worker thread, the same way
+    asyncio.to_thread does it.
+    """
+    loop = asyncio.get_running_loop()
+    ctx = contextvars.copy_context()
+    call = functools.partial(ctx.run, func, *args, **kwargs)
+    return await loop.run_in_executor(get_offload_executor(), call)
+
+
+def run_sync(coro_factory: Callable[[], Awaitable[T]]) -> T:
+    """
+    Run a coroutine to completion from synchronous code.
+
+    The coroutine gets its own event loop in a helper thread, so this
+    also works when the caller is already inside a running loop.
+    """
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        return pool.submit(lambda: asyncio.run(coro_factory())).result()
@@ -0,0 +1,147 @@
+import os
+import logging
+import threading
+from concurrent.futures import Future
+from typing import Dict, Optional
+from src.agents.config import Config
+from src.services.offload import get_offload_executor
+
+log = logging.getLogger(__name__)
+
+# Derived files live next to the originals, out of the way of listings
+VARIANTS_DIR = ".variants"
+
+# kind -> longest side in pixels
+VARIANT_SIZES = {
+    "thumb": Config.OUTPUT_THUMBNAIL_SIZE,
+    "preview": Config.OUTPUT_PREVIEW_SIZE
+}
+
+IMAGE_EXTENSIONS = {".png", ".jpg", ".jpeg", ".webp", ".avif"}
+
+MEDIA_TYPES = {
+    ".png": "image/png",
+    ".jpg": "image/jpeg",
+    ".jpeg": "image/jpeg",
+    ".webp": "image/webp",
+    ".avif": "image/avif"
+}
+
+
+class OutputStore:
+    """
+    Originals in OUTPUT_DIR plus smaller variants for display.
+
+    Every image written by a tool is registered with add(), which makes
+    a thumbnail and a compressed preview (WebP, or AVIF if configured)
+    in the offload pool. If a variant is requested before that has
+    finished, ensure_variant() builds it on the spot.
+    """
+
+    def __init__(self, root: str = Config.OUTPUT_DIR):
+        self.root = root
+        self.variants_dir = os.path.join(root, VARIANTS_DIR)
+        self.extension = "." + Config.OUTPUT_PREVIEW_FORMAT.lower()
+
+        self._pending: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+
+    def resolve(self, filename: str) -> Optional[str]:
+        """Path of an original image in OUTPUT_DIR, or None if it isn't one."""
+        if filename != os.path.basename(filename) or filename.startswith("."):
+            return None
+        if os.path.splitext(filename)[1].lower() not in IMAGE_EXTENSIONS:
+            return None
+
+        path = os.path.join(self.root, filename)
+        return path if os.path.isfile(path) else None
+
+    def variant_path(self, filename: str, kind: str) -> str:
+        stem = os.path.splitext(filename)[0]
+        return os.path.join(self.variants_dir, f"{stem}.{kind}{self.extension}")
+
+    def add(self, filepath: str):
+        """Start building the variants of a newly written original."""
+        filename = os.path.basename(filepath)
+
+        with self._lock:
+            if filename in self._pending:
+                return
+            future = get_offload_executor().submit(self._make_variants, filename)
+            self._pending[filename] = future
+
+        future.add_done_callback(lambda _: self._forget(filename))
+
+    def _forget(self, filename: str):
+        with self._lock:
+            self._pending.pop(filename, None)
+
+    def ensure_variant(self, filename: str, kind: str) -> Optional[str]:
+        """Return the variant's path, building it now if needed. Blocking."""
+        if kind not in VARIANT_SIZES or self.resolve(filename) is None:
+            return None
+
+        path = self.variant_path(filename, kind)
+        if os.path.isfile(path):
+            return path
+
+        # Build it here rather than wait on the queued job: waiting on the
+        # pool from inside the pool could deadlock it. Temp-file writes
+        # keep a duplicate build harmless.
+        self._make_variants(filename)
+
+        return path if os.path.isfile(path) else None
+
+    def _make_variants(self, filename: str):
+        from PIL import Image
+
+        source = os.path.join(self.root, filename)
+        os.makedirs(self.variants_dir, exist_ok=True)
+
+        try:
+            with Image.open(source) as img:
+                img.load()
+
+                for kind, size in VARIANT_SIZES.items():
+                    path = self.variant_path(filename, kind)
+                    if os.path.isfile(path):
+                        continue
+
+                    variant = img.copy()
+                    variant.thumbnail((size, size), Image.Resampling.LANCZOS)
+                    if variant.mode not in ("RGB", "RGBA"):
+                        variant = variant.convert("RGBA")
+
+                    # Write under a temp name so readers never see half a file
+                    tmp_path = f"{path}.{threading.get_ident()}.tmp"
+                    variant.save(
+                        tmp_path,
+                        format=Config.OUTPUT_PREVIEW_FORMAT.upper(),
+                        quality=Config.OUTPUT_PREVIEW_QUALITY
+                    )
+                    os.replace(tmp_path, path)
+        except Exception as e:
+            log.warning("⚠️  Could not build variants for %s: %s", filename, e)
+
+    @staticmethod
+    def variant_urls(image_url: Optional[str]) -> Dict[str, Optional[str]]:
+        """thumbnail_url / preview_url for an /outputs/... image URL."""
+        if not image_url or not image_url.startswith("/outputs/"):
+            return {"thumbnail_url": None, "preview_url": None}
+
+        return {
+            "thumbnail_url": f"{image_url}?variant=thumb",
+            "preview_url": f"{image_url}?variant=preview"
+        }
+
+
+_output_store: Optional[OutputStore] = None
+
+
+def get_output_store() -> OutputStore:
+    global _output_store
+
+    if _output_store is None:
+        _output_store = OutputStore()
+
+    return _output_store
@@ -0,0 +1,269 @@
+import time
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from typing import Dict, Optional
+from src.agents.config import Config
+
+log = logging.getLogger(__name__)
+
+THROTTLED = "throttled"
+FAILURE = "failure"
+OK = "ok"
+
+
+class UpstreamUnavailable(Exception):
+    """An upstream call was refused locally before it was made."""
+
+
+class RateLimitTimeout(UpstreamUnavailable):
+    """No request slot would free up within the allowed wait."""
+
+
+class CircuitOpenError(UpstreamUnavailable):
+    """The upstream has been failing; calls fail fast until it recovers."""
+
+
+def classify_error(exc: BaseException) -> str:
+    """
+    Sort an upstream error into throttled / failure / ok.
+
+    "ok" means the upstream answered properly and the request itself
+    was at fault (bad prompt, content policy, ...), which says nothing
+    about the upstream's health. The exception chain is checked too,
+    since Strands re-raises OpenAI errors as its own types.
+    """
+    import openai
+    from ddgs.exceptions import DDGSException, RatelimitException, TimeoutException
+    from strands.types.exceptions import ModelThrottledException, ContextWindowOverflowException
+
+    seen = exc
+    while seen is not None:
+        if isinstance(seen, (openai.RateLimitError, ModelThrottledException, RatelimitException)):
+            return THROTTLED
+        seen = seen.__cause__
+
+    if isinstance(exc, ContextWindowOverflowException):
+        return OK
+    if isinstance(exc, (openai.APIConnectionError, openai.InternalServerError, TimeoutException, DDGSException)):
+        return FAILURE
+    if isinstance(exc, openai.APIStatusError):
+        return FAILURE if exc.status_code >= 500 else OK
+
+    return FAILURE
+
+
+def _retry_after(exc: BaseException) -> Optional[float]:
+    seen = exc
+    while seen is not None:
+        response = getattr(seen, "response", None)
+        value = getattr(response, "headers", {}).get("retry-after") if response is not None else None
+        if value:
+            try:
+                return float(value)
+            except ValueError:
+                return None
+        seen = seen.__cause__
+    return None
+
+
+class AdaptiveTokenBucket:
+    """
+    Token bucket whose rate backs off when the upstream throttles us.
+
+    Callers reserve a token up front and sleep until it is theirs, so
+    waiting callers are served in order. A caller that would have to
+    wait longer than `max_wait` gets RateLimitTimeout straight away
+    instead of piling up. Each 429 halves the rate (down to 10%) and
+    pauses the bucket for Retry-After; each success adds back 5%.
+    """
+
+    def __init__(self, rate_per_minute: float, burst: int, max_wait: float):
+        self.max_rate = rate_per_minute / 60.0
+        self.min_rate = self.max_rate * 0.1
+        self.rate = self.max_rate
+        self.capacity = max(1, burst)
+        self.max_wait = max_wait
+
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+
+        self.throttled = 0
+        self.rejected = 0
+
+    def _refill(self, now: float):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self):
+        now = time.monotonic()
+        self._refill(now)
+
+        # Reserve our token; a negative balance is the queue of waiters
+        self._tokens -= 1
+        wait = max(self._paused_until - now, 0.0, -self._tokens / self.rate)
+
+        if wait > self.max_wait:
+            self._tokens += 1
+            self.rejected += 1
+            raise RateLimitTimeout(f"No request slot within {self.max_wait:.0f}s (would wait {wait:.1f}s)")
+
+        if wait > 0:
+            try:
+                await asyncio.sleep(wait)
+            except asyncio.CancelledError:
+                # Gave up waiting; hand the reserved token back
+                self._tokens += 1
+                raise
+
+    def on_success(self):
+        self.rate = min(self.max_rate, self.rate + self.max_rate * 0.05)
+
+    def on_throttled(self, retry_after: Optional[float] = None):
+        self._refill(time.monotonic())
+        self.rate = max(self.min_rate, self.rate * 0.5)
+        self.throttled += 1
+
+        pause = retry_after if retry_after is not None else 1.0 / self.rate
+        self._paused_until = max(self._paused_until, time.monotonic() + pause)
+
+
+class CircuitBreaker:
+    """
+    Closed -> open after `failure_threshold` failures in a row. While
+    open every call fails fast; after `reset_timeout` one probe call is
+    let through (half-open) and its outcome closes or re-opens it.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+
+        self.state = self.CLOSED
+        self.failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+
+        self.rejected = 0
+
+    def before_call(self):
+        if self.state == self.CLOSED:
+            return
+
+        if self.state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+            self.state = self.HALF_OPEN
+            self._probe_in_flight = False
+
+        if self.state == self.HALF_OPEN and not self._probe_in_flight:
+            self._probe_in_flight = True
+            return
+
+        self.rejected += 1
+        retry_in = max(0.0, self.reset_timeout - (time.monotonic() - self._opened_at))
+        raise CircuitOpenError(f"Upstream is unavailable, retry in {retry_in:.0f}s")
+
+    def record_success(self):
+        self.state = self.CLOSED
+        self.failures = 0
+        self._probe_in_flight = False
+
+    def release_probe(self):
+        """The probe ended without an outcome (cancelled); let the next call probe."""
+        self._probe_in_flight = False
+
+    def record_failure(self):
+        self.failures += 1
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            if self.state != self.OPEN:
+                log.warning("⚠️  Circuit opened after %d failures", self.failures)
+            self.state = self.OPEN
+            self._opened_at = time.monotonic()
+            self._probe_in_flight = False
+
+
+class UpstreamGuard:
+    """Rate limiter and circuit breaker for one provider/model."""
+
+    def __init__(self, name: str, rate_per_minute: float):
+        self.name = name
+        self.bucket = AdaptiveTokenBucket(
+            rate_per_minute,
+            burst=max(1, int(rate_per_minute // 6)),
+            max_wait=Config.RATE_LIMIT_MAX_WAIT_SECONDS
+        )
+        self.breaker = CircuitBreaker(Config.CIRCUIT_FAILURE_THRESHOLD, Config.CIRCUIT_RESET_SECONDS)
+
+    @asynccontextmanager
+    async def slot(self):
+        """Wrap exactly one upstream call."""
+        self.breaker.before_call()
+        try:
+            await self.bucket.acquire()
+        except BaseException:
+            # We never called upstream (timed out or cancelled); give a half-open probe back
+            self.breaker.release_probe()
+            raise
+
+        try:
+            yield
+        except Exception as e:
+            kind = classify_error(e)
+            if kind == THROTTLED:
+                self.bucket.on_throttled(_retry_after(e))
+                self.breaker.record_failure()
+            elif kind == FAILURE:
+                self.breaker.record_failure()
+            else:
+                self.breaker.record_success()
+            raise
+        except BaseException:
+            # Cancelled or closed mid-call (client went away): neither a
+            # success nor a failure, but a half-open probe must not stay taken
+            self.breaker.release_probe()
+            raise
+        else:
+            self.bucket.on_success()
+            self.breaker.record_success()
+
+    def stats(self) -> dict:
+        return {
+            "rate_per_minute": round(self.bucket.rate * 60, 2),
+            "max_rate_per_minute": round(self.bucket.max_rate * 60, 2),
+            "throttled": self.bucket.throttled,
+            "rejected_wait": self.bucket.rejected,
+            "circuit": self.breaker.state,
+            "consecutive_failures": self.breaker.failures,
+            "rejected_open": self.breaker.rejected
+        }
+
+
+_guards: Dict[str, UpstreamGuard] = {}
+
+
+def _limit_for(provider: str, model: str) -> float:
+    if provider == "duckduckgo":
+        return Config.RATE_LIMIT_SEARCH_RPM
+    if model == Config.IMAGE_MODEL:
+        return Config.RATE_LIMIT_IMAGE_RPM
+    return Config.RATE_LIMIT_CHAT_RPM
+
+
+def get_guard(provider: str, model: str) -> UpstreamGuard:
+    """Return the shared guard for a provider and model, e.g. ("openai", "gpt-4o")."""
+    name = f"{provider}:{model}"
+
+    guard = _guards.get(name)
+    if guard is None:
+        guard = UpstreamGuard(name, _limit_for(provider, model))
+        _guards[name] = guard
+
+    return guard
+
+
+def guard_stats() -> dict:
+    return {name: guard.stats() for name, guard in _guards.items()}
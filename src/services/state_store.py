@@ -0,0 +1,268 @@
+import os
+import json
+import time
+import logging
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional, Tuple
+from src.agents.config import Config
+
+log = logging.getLogger(__name__)
+
+# How far state is shared: within one process, between the worker
+# processes on one host, or between hosts
+SCOPE_PROCESS = "process"
+SCOPE_HOST = "host"
+SCOPE_CLUSTER = "cluster"
+
+# Expired rows are deleted every this many writes (SQLite backend)
+_PURGE_EVERY = 200
+
+
+class StateStore:
+    """
+    Key/value store for state that every worker has to see: session
+    conversations, current-image pointers, tool-result caches and job
+    status.
+
+    Values are anything JSON can encode; keys may expire after `ttl`
+    seconds. Methods block, so call them through run_blocking from
+    async code.
+    """
+
+    name = "base"
+    scope = SCOPE_PROCESS
+
+    @property
+    def shared(self) -> bool:
+        """True when other processes read and write the same state."""
+        return self.scope != SCOPE_PROCESS
+
+    def get(self, key: str) -> Any:
+        raise NotImplementedError
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        raise NotImplementedError
+
+    def delete(self, key: str) -> bool:
+        raise NotImplementedError
+
+    def keys(self, prefix: str) -> List[str]:
+        """Live keys starting with `prefix`."""
+        raise NotImplementedError
+
+    def stats(self) -> dict:
+        return {"backend": self.name, "scope": self.scope}
+
+    def close(self):
+        pass
+
+
+class MemoryStateStore(StateStore):
+    """
+    Process-local store, the default for a single worker.
+
+    Values are kept JSON-encoded so callers get a copy, as they would
+    from the shared backends.
+    """
+
+    name = "memory"
+    scope = SCOPE_PROCESS
+
+    def __init__(self):
+        # key -> (expires_at or None, JSON)
+        self._entries: Dict[str, Tuple[Optional[float], str]] = {}
+        self._lock = threading.Lock()
+
+    def _live(self, key: str) -> Optional[str]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at is not None and expires_at <= time.time():
+            del self._entries[key]
+            return None
+        return value
+
+    def get(self, key: str) -> Any:
+        with self._lock:
+            value = self._live(key)
+        return json.loads(value) if value is not None else None
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        encoded = json.dumps(value)
+        with self._lock:
+            self._entries[key] = (time.time() + ttl if ttl else None, encoded)
+
+    def delete(self, key: str) -> bool:
+        with self._lock:
+            return self._entries.pop(key, None) is not None
+
+    def keys(self, prefix: str) -> List[str]:
+        with self._lock:
+            return [key for key in list(self._entries) if key.startswith(prefix) and self._live(key) is not None]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {**super().stats(), "keys": len(self._entries)}
+
+
+class SQLiteStateStore(StateStore):
+    """
+    State in a SQLite file (WAL mode), shared by every worker process
+    on the host: `uvicorn main:app --workers N` without sticky sessions.
+    Also a local stand-in for the Redis store in development and tests.
+    """
+
+    name = "sqlite"
+    scope = SCOPE_HOST
+
+    def __init__(self, db_path: str = Config.STATE_DB_PATH):
+        self.db_path = db_path
+        self._writes = 0
+
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS state (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL,
+                    expires_at REAL
+                )
+                """
+            )
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=10)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def get(self, key: str) -> Any:
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT value FROM state WHERE key = ? AND (expires_at IS NULL OR expires_at > ?)",
+                (key, time.time())
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        encoded = json.dumps(value)
+        now = time.time()
+
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO state (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, encoded, now + ttl if ttl else None)
+            )
+
+            self._writes += 1
+            if self._writes % _PURGE_EVERY == 0:
+                conn.execute("DELETE FROM state WHERE expires_at <= ?", (now,))
+
+    def delete(self, key: str) -> bool:
+        with self._connect() as conn:
+            return conn.execute("DELETE FROM state WHERE key = ?", (key,)).rowcount > 0
+
+    def keys(self, prefix: str) -> List[str]:
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT key FROM state WHERE substr(key, 1, ?) = ? AND (expires_at IS NULL OR expires_at > ?)",
+                (len(prefix), prefix, time.time())
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def stats(self) -> dict:
+        with self._connect() as conn:
+            keys = conn.execute(
+                "SELECT COUNT(*) FROM state WHERE expires_at IS NULL OR expires_at > ?",
+                (time.time(),)
+            ).fetchone()[0]
+        return {**super().stats(), "keys": keys, "path": self.db_path}
+
+
+class RedisStateStore(StateStore):
+    """
+    State in Redis, or any server speaking its protocol (Valkey,
+    KeyDB, ...), shared by workers on every host.
+
+    Needs the optional `redis` package.
+    """
+
+    name = "redis"
+    scope = SCOPE_CLUSTER
+
+    def __init__(self, url: str = Config.STATE_REDIS_URL, key_prefix: str = Config.STATE_KEY_PREFIX):
+        try:
+            import redis
+        except ImportError as e:
+            raise RuntimeError("STATE_BACKEND=redis needs the redis package (pip install redis)") from e
+
+        self.url = url
+        self.key_prefix = key_prefix
+        # The client keeps its own thread-safe connection pool
+        self._client = redis.Redis.from_url(url, socket_timeout=5, socket_connect_timeout=5)
+
+    def get(self, key: str) -> Any:
+        value = self._client.get(self.key_prefix + key)
+        return json.loads(value) if value is not None else None
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        self._client.set(
+            self.key_prefix + key,
+            json.dumps(value),
+            px=max(1, int(ttl * 1000)) if ttl else None
+        )
+
+    def delete(self, key: str) -> bool:
+        return self._client.delete(self.key_prefix + key) > 0
+
+    def keys(self, prefix: str) -> List[str]:
+        start = len(self.key_prefix)
+        return [
+            key.decode()[start:]
+            for key in self._client.scan_iter(match=f"{self.key_prefix}{prefix}*", count=500)
+        ]
+
+    def stats(self) -> dict:
+        return {**super().stats(), "url": self.url, "key_prefix": self.key_prefix}
+
+    def close(self):
+        self._client.close()
+
+
+_BACKENDS = {
+    "memory": MemoryStateStore,
+    "sqlite": SQLiteStateStore,
+    "redis": RedisStateStore
+}
+
+_state_store: Optional[StateStore] = None
+
+
+def get_state_store() -> StateStore:
+    """The STATE_BACKEND store, created on first use."""
+    global _state_store
+
+    if _state_store is None:
+        backend = Config.STATE_BACKEND.lower()
+        if backend not in _BACKENDS:
+            raise ValueError(f"Unknown STATE_BACKEND: {Config.STATE_BACKEND} (expected one of {', '.join(_BACKENDS)})")
+        _state_store = _BACKENDS[backend]()
+        log.info("🗃️  State backend: %s", backend)
+
+    return _state_store
+
+
+def close_state_store():
+    global _state_store
+
+    if _state_store is not None:
+        _state_store.close()
+        _state_store = None
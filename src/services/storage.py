@@ -0,0 +1,265 @@
+import os
+import time
+import asyncio
+import logging
+import sqlite3
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Optional, Set, Tuple
+from src.agents.config import Config
+from src.services.offload import run_blocking
+
+log = logging.getLogger(__name__)
+
+# Session the current request/turn belongs to; files written while it is
+# set are recorded as owned by that session
+current_session_id: ContextVar[Optional[str]] = ContextVar("current_session_id", default=None)
+
+_MANAGED_EXTENSIONS = {".png", ".jpg", ".jpeg", ".webp", ".avif"}
+
+
+class StorageManager:
+    """
+    Lifecycle of the files in UPLOAD_DIR and OUTPUT_DIR.
+
+    Every file is recorded in a small SQLite index with its size, owning
+    session and last access. A background task periodically removes
+    files that have not been accessed for STORAGE_TTL_HOURS, then the
+    least recently used ones until the total is under STORAGE_QUOTA_MB.
+    Files owned by or shown in a live session, and files the image
+    cache still points at, are never removed. Files that appear on disk
+    without being tracked (older outputs, manual copies) are picked up
+    by the scan that starts every run.
+    """
+
+    def __init__(
+        self,
+        db_path: str = Config.STORAGE_DB_PATH,
+        quota_bytes: int = Config.STORAGE_QUOTA_MB * 1024 * 1024,
+        ttl_seconds: float = Config.STORAGE_TTL_HOURS * 3600,
+        roots: Optional[list] = None
+    ):
+        self.db_path = db_path
+        self.quota_bytes = quota_bytes
+        self.ttl_seconds = ttl_seconds
+        self.roots = roots or [Config.UPLOAD_DIR, Config.OUTPUT_DIR]
+
+        # Reads only bump an in-memory timestamp; collect() writes them out
+        self._accessed: Dict[str, float] = {}
+        self._accessed_lock = threading.Lock()
+
+        self._task: Optional[asyncio.Task] = None
+        self.removed = 0
+        self.freed_bytes = 0
+        self.last_run: Optional[float] = None
+
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS files (
+                    path TEXT PRIMARY KEY,
+                    bytes INTEGER NOT NULL,
+                    session_id TEXT,
+                    created_at REAL NOT NULL,
+                    last_access REAL NOT NULL
+                )
+                """
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS files_last_access ON files (last_access)")
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=10)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    # ----- recording -----
+
+    def track(self, *paths: str, session_id: Optional[str] = None):
+        """Record newly written files. Blocking; call through run_blocking from async code."""
+        session_id = session_id or current_session_id.get()
+        now = time.time()
+
+        rows = []
+        for path in paths:
+            try:
+                size = os.path.getsize(path)
+            except OSError:
+                continue
+            rows.append((os.path.realpath(path), size, session_id, now, now))
+
+        with self._connect() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO files (path, bytes, session_id, created_at, last_access) "
+                "VALUES (?, ?, ?, ?, ?)",
+                rows
+            )
+
+    def touch(self, path: str):
+        """Note that a file was read. Cheap; safe to call on the event loop."""
+        with self._accessed_lock:
+            self._accessed[os.path.realpath(path)] = time.time()
+
+    # ----- collection -----
+
+    async def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._loop())
+            log.info("🗄️  Storage GC every %ss (quota %s MB, TTL %sh)",
+                     Config.STORAGE_GC_INTERVAL_SECONDS, Config.STORAGE_QUOTA_MB, Config.STORAGE_TTL_HOURS)
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _loop(self):
+        while True:
+            try:
+                await run_blocking(self.collect)
+            except Exception as e:
+                log.warning("⚠️  Storage GC failed: %s", e)
+            await asyncio.sleep(Config.STORAGE_GC_INTERVAL_SECONDS)
+
+    def collect(self) -> int:
+        """Run one scan + TTL + quota pass and return how many files were removed."""
+        now = time.time()
+        pinned, live_sessions = self._pinned()
+
+        with self._accessed_lock:
+            accessed, self._accessed = self._accessed, {}
+
+        with self._connect() as conn:
+            self._scan(conn)
+            conn.executemany(
+                "UPDATE files SET last_access = MAX(last_access, ?) WHERE path = ?",
+                [(ts, path) for path, ts in accessed.items()]
+            )
+
+            candidates = [
+                (path, size, last_access)
+                for path, size, session_id, last_access in conn.execute(
+                    "SELECT path, bytes, session_id, last_access FROM files ORDER BY last_access ASC"
+                )
+                if path not in pinned and session_id not in live_sessions
+            ]
+            total = conn.execute("SELECT COALESCE(SUM(bytes), 0) FROM files").fetchone()[0]
+
+            doomed = []
+            for path, size, last_access in candidates:
+                expired = now - last_access > self.ttl_seconds
+                if not expired and total <= self.quota_bytes:
+                    break
+                doomed.append((path, size))
+                total -= size
+
+            for path, size in doomed:
+                self._remove_file(path)
+                conn.execute("DELETE FROM files WHERE path = ?", (path,))
+                self.freed_bytes += size
+
+        self.removed += len(doomed)
+        self.last_run = now
+
+        if doomed:
+            log.info("🧹 Storage GC removed %d files (%d KB)", len(doomed), sum(s for _, s in doomed) // 1024)
+
+        return len(doomed)
+
+    def _scan(self, conn: sqlite3.Connection):
+        """Index untracked files and forget rows whose file is gone."""
+        known = {row[0] for row in conn.execute("SELECT path FROM files")}
+        on_disk = set()
+
+        for root in self.roots:
+            if not os.path.isdir(root):
+                continue
+            for entry in os.scandir(root):
+                if not entry.is_file() or entry.name.startswith("."):
+                    continue
+                if os.path.splitext(entry.name)[1].lower() not in _MANAGED_EXTENSIONS:
+                    continue
+
+                path = os.path.realpath(entry.path)
+                on_disk.add(path)
+                if path not in known:
+                    stat = entry.stat()
+                    conn.execute(
+                        "INSERT OR IGNORE INTO files (path, bytes, session_id, created_at, last_access) "
+                        "VALUES (?, ?, NULL, ?, ?)",
+                        (path, stat.st_size, stat.st_mtime, max(stat.st_atime, stat.st_mtime))
+                    )
+
+        conn.executemany("DELETE FROM files WHERE path = ?", [(path,) for path in known - on_disk])
+
+    @staticmethod
+    def _pinned() -> Tuple[Set[str], Set[str]]:
+        """
+        Paths the image cache or a live session's current image point at,
+        and the ids of the live sessions (whose own files are kept too).
+        """
+        from src.tools.image_cache import get_image_cache
+        from src.tools.image_editor import resolve_local_image
+        from src.agents.session_pool import get_session_pool
+
+        pinned = {os.path.realpath(path) for path in get_image_cache().paths()}
+
+        session_ids, image_urls = get_session_pool().references()
+        for image_url in image_urls:
+            local_path = resolve_local_image(image_url)
+            if local_path:
+                pinned.add(local_path)
+
+        return pinned, session_ids
+
+    @staticmethod
+    def _remove_file(path: str):
+        """Delete a file and, for outputs, its display variants."""
+        from src.services.output_store import VARIANT_SIZES, get_output_store
+
+        store = get_output_store()
+        filename = os.path.basename(path)
+        paths = [path]
+        if os.path.dirname(path) == os.path.realpath(store.root):
+            paths += [store.variant_path(filename, kind) for kind in VARIANT_SIZES]
+
+        for doomed in paths:
+            try:
+                os.remove(doomed)
+            except FileNotFoundError:
+                pass
+
+    def stats(self) -> dict:
+        with self._connect() as conn:
+            files, total = conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(bytes), 0) FROM files"
+            ).fetchone()
+
+        return {
+            "files": files,
+            "bytes": total,
+            "quota_bytes": self.quota_bytes,
+            "ttl_hours": self.ttl_seconds / 3600,
+            "removed": self.removed,
+            "freed_bytes": self.freed_bytes,
+            "last_run": self.last_run
+        }
+
+
+_storage_manager: Optional[StorageManager] = None
+
+
+def get_storage_manager() -> StorageManager:
+    global _storage_manager
+
+    if _storage_manager is None:
+        _storage_manager = StorageManager()
+
+    return _storage_manager
@@ -0,0 +1,412 @@
+import re
+import json
+import time
+import asyncio
+import logging
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Optional, Tuple
+from src.agents.config import Config
+
+log = logging.getLogger(__name__)
+
+
+# ==================== LOGGING ====================
+
+# Attributes every LogRecord has; anything else came in through `extra=`
+_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "taskName"}
+
+
+class StructuredFormatter(logging.Formatter):
+    """
+    One line per record. Fields passed with `extra={...}` are appended
+    as key=value pairs, or the whole record is one JSON object when
+    LOG_FORMAT=json.
+    """
+
+    def __init__(self, as_json: bool = False):
+        super().__init__()
+        self.as_json = as_json
+
+    def format(self, record: logging.LogRecord) -> str:
+        fields = {k: v for k, v in record.__dict__.items() if k not in _RECORD_ATTRS}
+        message = record.getMessage()
+
+        if self.as_json:
+            entry = {"ts": record.created, "level": record.levelname, "logger": record.name, "message": message, **fields}
+            if record.exc_info:
+                entry["exception"] = self.formatException(record.exc_info)
+            return json.dumps(entry, default=str, ensure_ascii=False)
+
+        line = f"{self.formatTime(record)} {record.levelname:<7} {record.name}: {message}"
+        if fields:
+            line += " | " + " ".join(f"{k}={v}" for k, v in fields.items())
+        if record.exc_info:
+            line += "\n" + self.formatException(record.exc_info)
+        return line
+
+
+def configure_logging():
+    """
+    Send the app's loggers (everything under `src`) to stderr.
+
+    LOG_LEVEL=WARNING keeps only problems; LOG_LEVEL=OFF silences them.
+    Disabled levels cost one integer comparison per call.
+    """
+    level = Config.LOG_LEVEL.upper()
+    logger = logging.getLogger("src")
+    logger.setLevel(logging.CRITICAL + 1 if level == "OFF" else getattr(logging, level, logging.INFO))
+    logger.propagate = False
+
+    if not logger.handlers:
+        handler = logging.StreamHandler()
+        handler.setFormatter(StructuredFormatter(as_json=Config.LOG_FORMAT.lower() == "json"))
+        logger.addHandler(handler)
+
+
+# ==================== METRICS ====================
+
+_REGISTRY: list = []
+
+# Seconds; wide enough for both HTTP handlers and image generations
+DEFAULT_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...]) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{n}="{_escape(v)}"' for n, v in zip(names, values)) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    """
+    Base for the Prometheus metric types.
+
+    Values are kept per label combination. A metric built with
+    `collect=` reads its values from that callback at scrape time
+    instead: it returns either a number or {label tuple: number}.
+    """
+
+    kind = ""
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labels: Tuple[str, ...] = (),
+        collect: Optional[Callable[[], object]] = None
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.collect = collect
+
+        self._values: Dict[tuple, float] = {}
+        self._lock = threading.Lock()
+
+        _REGISTRY.append(self)
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(str(labels.get(name, "")) for name in self.labels)
+
+    def _samples(self):
+        if self.collect is None:
+            with self._lock:
+                return list(self._values.items())
+
+        values = self.collect()
+        if isinstance(values, dict):
+            return [(tuple(str(v) for v in (k if isinstance(k, tuple) else (k,))), v) for k, v in values.items()]
+        return [((), values)]
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for key, value in self._samples():
+            lines.append(f"{self.name}{_format_labels(self.labels, key)} {_format_value(value)}")
+        return lines
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labels: Tuple[str, ...] = (), buckets: tuple = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # [count per bucket..., sum, count]
+                state = self._values[key] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[i] += 1
+                    break
+            state[-2] += value
+            state[-1] += 1
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        names = self.labels + ("le",)
+
+        with self._lock:
+            items = [(key, list(state)) for key, state in self._values.items()]
+
+        for key, state in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, state):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_format_labels(names, key + (_format_value(bound),))} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labels, key)} {_format_value(state[-2])}")
+            lines.append(f"{self.name}_count{_format_labels(self.labels, key)} {state[-1]}")
+        return lines
+
+
+def render_metrics() -> str:
+    """All metrics in the Prometheus text format. Blocking (collectors may hit SQLite)."""
+    lines = []
+    for metric in _REGISTRY:
+        try:
+            lines.extend(metric.render())
+        except Exception as e:
+            log.warning("Metric %s could not be collected: %s", metric.name, e)
+    return "\n".join(lines) + "\n"
+
+
+# ----- scrape-time collectors -----
+
+def _cache_stats() -> Dict[str, dict]:
+    from src.tools.image_cache import get_image_cache
+    from src.tools.websearch_tool import search_cache
+    from src.tools.mask_engine import get_mask_cache
+    from src.agents.response_cache import get_response_cache
+
+    return {
+        "image": get_image_cache().stats(),
+        "websearch": search_cache.stats(per_key=0),
+        "mask": get_mask_cache().stats(),
+        "response": get_response_cache().stats()
+    }
+
+
+def _cache_hit_ratio() -> dict:
+    return {name: stats["hit_ratio"] for name, stats in _cache_stats().items()}
+
+
+def _cache_lookups() -> dict:
+    lookups = {}
+    for name, stats in _cache_stats().items():
+        lookups[(name, "hit")] = stats["hits"] + stats.get("coalesced", 0) + stats.get("shared", 0)
+        lookups[(name, "miss")] = stats["misses"]
+    return lookups
+
+
+def _job_queue_depth() -> dict:
+    from src.services.jobs import get_job_manager
+    return get_job_manager().queue_depth()
+
+
+def _active_sessions() -> int:
+    from src.agents.session_pool import get_session_pool
+    return len(get_session_pool())
+
+
+# ----- the metrics themselves -----
+
+HTTP_REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds", "HTTP request latency, until the response body is sent.",
+    ("method", "route", "status")
+)
+AGENT_TURN_SECONDS = Histogram(
+    "agent_turn_duration_seconds", "Chat turn latency; path is llm, fastpath, cache or error.", ("path",)
+)
+LLM_TURN_SECONDS = Histogram(
+    "llm_turn_seconds", "Time spent waiting on the chat model within one turn.", ("model",)
+)
+LLM_REQUEST_SECONDS = Histogram(
+    "llm_request_duration_seconds", "Latency of single chat model requests.", ("model",)
+)
+LLM_TOKENS = Counter(
+    "llm_tokens_total", "Tokens used by the chat model.", ("model", "kind")
+)
+TOOL_SECONDS = Histogram(
+    "tool_duration_seconds", "Tool execution time.", ("tool",)
+)
+TOOL_CALLS = Counter(
+    "tool_calls_total", "Tool calls by outcome.", ("tool", "status")
+)
+CACHE_HIT_RATIO = Gauge(
+    "cache_hit_ratio", "Hit ratio since start per cache.", ("cache",), collect=_cache_hit_ratio
+)
+CACHE_LOOKUPS = Counter(
+    "cache_lookups_total", "Cache lookups by result.", ("cache", "result"), collect=_cache_lookups
+)
+JOB_QUEUE_DEPTH = Gauge(
+    "job_queue_depth", "Background jobs waiting for a worker.", ("type",), collect=_job_queue_depth
+)
+ACTIVE_SESSIONS = Gauge(
+    "active_sessions", "Sessions held in the agent pool.", collect=_active_sessions
+)
+EVENT_LOOP_LAG_SECONDS = Histogram(
+    "event_loop_lag_seconds", "How late a periodic timer fired; high values mean blocking work on the event loop.",
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+)
+
+
+# Tools report most failures as text rather than raising
+_TOOL_FAILURE_RE = re.compile(r"^Error\b|\bfailed:|temporarily unavailable", re.IGNORECASE)
+
+
+def record_tool(tool: str, seconds: float, status: str = "success", output: str = ""):
+    if status == "success" and _TOOL_FAILURE_RE.search(output[:300]):
+        status = "error"
+
+    TOOL_SECONDS.observe(seconds, tool=tool)
+    TOOL_CALLS.inc(tool=tool, status=status)
+
+
+# Per-turn accumulator the model wrapper adds its time and tokens to
+current_turn: ContextVar[Optional[dict]] = ContextVar("current_turn", default=None)
+
+
+def new_turn() -> dict:
+    turn = {"llm_seconds": 0.0, "input_tokens": 0, "output_tokens": 0}
+    current_turn.set(turn)
+    return turn
+
+
+def record_llm_request(model: str, seconds: float, usage: Optional[dict]):
+    LLM_REQUEST_SECONDS.observe(seconds, model=model)
+    if usage:
+        LLM_TOKENS.inc(usage.get("inputTokens", 0), model=model, kind="input")
+        LLM_TOKENS.inc(usage.get("outputTokens", 0), model=model, kind="output")
+
+    turn = current_turn.get()
+    if turn is not None:
+        turn["llm_seconds"] += seconds
+        if usage:
+            turn["input_tokens"] += usage.get("inputTokens", 0)
+            turn["output_tokens"] += usage.get("outputTokens", 0)
+
+
+async def monitor_event_loop(interval: float = Config.EVENT_LOOP_MONITOR_INTERVAL):
+    """Sample event loop lag every `interval` seconds until cancelled."""
+    loop = asyncio.get_running_loop()
+
+    while True:
+        expected = loop.time() + interval
+        await asyncio.sleep(interval)
+        EVENT_LOOP_LAG_SECONDS.observe(max(0.0, loop.time() - expected))
+
+
+# ==================== TRACING ====================
+
+_tracer = None
+
+
+def setup_tracing():
+    """
+    Export OpenTelemetry spans when OTEL_ENABLED is set.
+
+    Uses the Strands telemetry setup, so the agent's own model and tool
+    spans are exported alongside ours. OTEL_EXPORTER is "otlp" (needs
+    opentelemetry-exporter-otlp; endpoint from OTEL_EXPORTER_OTLP_ENDPOINT)
+    or "console".
+    """
+    global _tracer
+
+    if not Config.OTEL_ENABLED or _tracer is not None:
+        return
+
+    try:
+        from opentelemetry import trace
+        from strands.telemetry import StrandsTelemetry
+    except ImportError:
+        log.warning("⚠️  opentelemetry is not installed; tracing disabled")
+        return
+
+    telemetry = StrandsTelemetry()
+    try:
+        if Config.OTEL_EXPORTER.lower() == "console":
+            telemetry.setup_console_exporter()
+        else:
+            telemetry.setup_otlp_exporter()
+    except ImportError:
+        log.warning("⚠️  opentelemetry-exporter-otlp is not installed; tracing disabled")
+        return
+
+    _tracer = trace.get_tracer("sarvo")
+    log.info("🔭 Tracing enabled (%s exporter)", Config.OTEL_EXPORTER)
+
+
+@contextmanager
+def span(name: str, **attributes):
+    """A span around the block when tracing is on; otherwise nothing."""
+    if _tracer is None:
+        yield None
+        return
+
+    with _tracer.start_as_current_span(name, attributes=attributes) as current:
+        yield current
+
+
+class MetricsMiddleware:
+    """ASGI middleware: request latency histogram plus a span per request."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        with span("http.request", method=scope["method"], path=scope["path"]):
+            try:
+                await self.app(scope, receive, send_wrapper)
+            finally:
+                route = scope.get("route")
+                HTTP_REQUEST_SECONDS.observe(
+                    time.perf_counter() - started,
+                    method=scope["method"],
+                    route=getattr(route, "path", "unmatched"),
+                    status=status["code"]
+                )
@@ -0,0 +1,249 @@
+import json
+import time
+import asyncio
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+from src.services.offload import run_blocking
+
+log = logging.getLogger(__name__)
+
+_MISSING = object()
+
+
+class _LeaderCancelled(Exception):
+    """The call other requests were waiting on was cancelled; they fetch themselves."""
+
+
+class AsyncTTLCache:
+    """
+    Async result cache with TTL, LRU eviction and request coalescing.
+
+    - Fresh entries (younger than `ttl`) are returned straight away.
+    - Concurrent misses for the same key share one upstream call. If
+      the caller running it is cancelled, the others retry instead of
+      being cancelled with it.
+    - Expired entries are kept for `stale_ttl` more seconds so they can
+      be served when the upstream call fails with one of the
+      `stale_on` exceptions (e.g. a rate limit).
+    - At most `max_entries` keys are kept, least recently used first out.
+    - With `shared_namespace` set and a shared STATE_BACKEND, local misses
+      are looked up in the state store and fetched values are written
+      there, so other workers don't repeat the upstream call. Keys must
+      then be JSON-encodable, and values JSON round-trippable.
+
+    Per-key and total hit/miss/coalesced/stale/shared counters are
+    available from stats().
+    """
+
+    def __init__(
+        self,
+        ttl: float,
+        max_entries: int,
+        stale_ttl: float = 0.0,
+        stale_on: Tuple[type, ...] = (),
+        shared_namespace: Optional[str] = None
+    ):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.stale_ttl = stale_ttl
+        self.stale_on = stale_on
+        self.shared_namespace = shared_namespace
+
+        # key -> (stored_at, value)
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+        self._key_stats: "OrderedDict[Hashable, Dict[str, int]]" = OrderedDict()
+        self.totals = {"hits": 0, "misses": 0, "coalesced": 0, "stale": 0, "shared": 0}
+        # stats() is also read from the offload pool (metrics scrapes)
+        self._stats_lock = threading.Lock()
+
+    def _count(self, key: Hashable, event: str):
+        with self._stats_lock:
+            self.totals[event] += 1
+
+            stats = self._key_stats.get(key)
+            if stats is None:
+                stats = {"hits": 0, "misses": 0, "coalesced": 0, "stale": 0, "shared": 0}
+                self._key_stats[key] = stats
+            else:
+                self._key_stats.move_to_end(key)
+            stats[event] += 1
+
+            # Keep per-key stats bounded like the entries themselves
+            while len(self._key_stats) > self.max_entries:
+                self._key_stats.popitem(last=False)
+
+    async def get_or_fetch(self, key: Hashable, fetch: Callable[[], Awaitable[Any]]) -> Any:
+        now = time.monotonic()
+        entry = self._entries.get(key)
+
+        if entry is not None and now - entry[0] <= self.ttl:
+            self._entries.move_to_end(key)
+            self._count(key, "hits")
+            return entry[1]
+
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            self._count(key, "coalesced")
+            try:
+                return await asyncio.shield(inflight)
+            except _LeaderCancelled:
+                # Its caller went away, not ours: the first retry leads the next call
+                return await self.get_or_fetch(key, fetch)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        shared = self._shared_store()
+
+        try:
+            value = await self._shared_get(shared, key) if shared is not None else _MISSING
+            from_shared = value is not _MISSING
+            if from_shared:
+                self._count(key, "shared")
+            else:
+                self._count(key, "misses")
+                value = await fetch()
+        except self.stale_on as e:
+            stale = self._stale_value(key)
+            if stale is None:
+                future.set_exception(e)
+                raise
+            self._count(key, "stale")
+            future.set_result(stale[0])
+            return stale[0]
+        except asyncio.CancelledError:
+            future.set_exception(_LeaderCancelled())
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            self._inflight.pop(key, None)
+            # Nobody else awaited it; don't log "exception never retrieved"
+            if future.done() and not future.cancelled() and future.exception() is not None:
+                future.exception()
+
+        future.set_result(value)
+
+        if not from_shared:
+            self.set(key, value)
+            if shared is not None:
+                await self._shared_set(shared, key, value)
+
+        return value
+
+    async def lookup(self, key: Hashable) -> Any:
+        """
+        Fresh value for `key` (local, then shared) or None, counted as a
+        hit or miss. For callers that can't wrap the upstream call in
+        get_or_fetch(); pair with store().
+        """
+        entry = self._entries.get(key)
+        if entry is not None and time.monotonic() - entry[0] <= self.ttl:
+            self._entries.move_to_end(key)
+            self._count(key, "hits")
+            return entry[1]
+
+        shared = self._shared_store()
+        if shared is not None:
+            value = await self._shared_get(shared, key)
+            if value is not _MISSING:
+                self._count(key, "shared")
+                return value
+
+        self._count(key, "misses")
+        return None
+
+    async def store(self, key: Hashable, value: Any):
+        """set(), plus the shared store when there is one."""
+        self.set(key, value)
+
+        shared = self._shared_store()
+        if shared is not None:
+            await self._shared_set(shared, key, value)
+
+    def _shared_store(self):
+        if self.shared_namespace is None:
+            return None
+
+        from src.services.state_store import get_state_store
+
+        store = get_state_store()
+        return store if store.shared else None
+
+    def _shared_key(self, key: Hashable) -> str:
+        digest = hashlib.sha256(json.dumps(key, default=str).encode()).hexdigest()[:32]
+        return f"cache:{self.shared_namespace}:{digest}"
+
+    async def _shared_get(self, shared, key: Hashable) -> Any:
+        """A fresh value another worker stored, or _MISSING. Stale ones are kept locally."""
+        try:
+            entry = await run_blocking(shared.get, self._shared_key(key))
+        except Exception as e:
+            log.warning("⚠️  Shared cache lookup failed: %s", e)
+            return _MISSING
+
+        if entry is None:
+            return _MISSING
+
+        # Keep the writer's age so TTL and staleness line up across workers
+        age = max(0.0, time.time() - entry["stored_at"])
+        self._entries[key] = (time.monotonic() - age, entry["value"])
+        self._entries.move_to_end(key)
+        self._evict()
+
+        return entry["value"] if age <= self.ttl else _MISSING
+
+    async def _shared_set(self, shared, key: Hashable, value: Any):
+        try:
+            await run_blocking(
+                shared.set,
+                self._shared_key(key),
+                {"stored_at": time.time(), "value": value},
+                self.ttl + self.stale_ttl
+            )
+        except Exception as e:
+            log.warning("⚠️  Shared cache write failed: %s", e)
+
+    def _stale_value(self, key: Hashable) -> Optional[Tuple[Any]]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if time.monotonic() - entry[0] > self.ttl + self.stale_ttl:
+            return None
+        return (entry[1],)
+
+    def set(self, key: Hashable, value: Any):
+        self._entries[key] = (time.monotonic(), value)
+        self._entries.move_to_end(key)
+        self._evict()
+
+    def _evict(self):
+        now = time.monotonic()
+        horizon = self.ttl + self.stale_ttl
+
+        # Drop anything too old to be served even as stale
+        for key in [k for k, (stored_at, _) in self._entries.items() if now - stored_at > horizon]:
+            del self._entries[key]
+
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def stats(self, per_key: int = 20) -> dict:
+        """Totals plus counters for the `per_key` most recently used keys."""
+        with self._stats_lock:
+            totals = dict(self.totals)
+            recent = [(key, dict(stats)) for key, stats in list(self._key_stats.items())[-per_key:]] if per_key > 0 else []
+
+        lookups = totals["hits"] + totals["misses"] + totals["coalesced"] + totals["shared"]
+
+        return {
+            **totals,
+            "entries": len(self._entries),
+            "inflight": len(self._inflight),
+            "hit_ratio": round((totals["hits"] + totals["coalesced"] + totals["shared"]) / lookups, 4) if lookups else 0.0,
+            "keys": [{"key": list(key) if isinstance(key, tuple) else key, **stats} for key, stats in reversed(recent)]
+        }
@@ -0,0 +1,221 @@
+import os
+import uuid
+import hashlib
+from typing import Optional
+from python_multipart.multipart import MultipartParser, parse_options_header
+from src.agents.config import Config
+from src.services.offload import run_blocking
+
+# Buffered before each disk write, so large uploads cost few thread hops
+WRITE_BUFFER_BYTES = 1024 * 1024
+
+# Enough of the header to tell the supported formats apart
+SNIFF_BYTES = 12
+
+
+class UploadRejected(Exception):
+    """The upload broke a limit; `status_code` is the HTTP status to answer with."""
+
+    def __init__(self, message: str, status_code: int = 400):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def sniff_image_type(header: bytes) -> Optional[tuple]:
+    """Return (mime type, extension) from an image's magic bytes, or None."""
+    if header.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "image/png", "png"
+    if header.startswith(b"\xff\xd8\xff"):
+        return "image/jpeg", "jpg"
+    if header[:4] == b"RIFF" and header[8:12] == b"WEBP":
+        return "image/webp", "webp"
+    return None
+
+
+class UploadWriter:
+    """
+    Writes one uploaded file to UPLOAD_DIR as it arrives.
+
+    The size limit is enforced and the type sniffed from the first
+    bytes while the body is still streaming, so a bad upload is refused
+    before it is fully read. The content is hashed along the way and
+    stored as <sha256>.<ext>: uploading the same image again keeps the
+    existing file and skips the write.
+    """
+
+    def __init__(self, upload_dir: str = Config.UPLOAD_DIR, max_bytes: int = Config.MAX_FILE_SIZE_MB * 1024 * 1024):
+        self.upload_dir = upload_dir
+        self.max_bytes = max_bytes
+
+        self.size = 0
+        self.kind: Optional[tuple] = None
+        self._hash = hashlib.sha256()
+        self._header = b""
+        self._pending = bytearray()
+        self._tmp_path = os.path.join(upload_dir, f".upload-{uuid.uuid4().hex}.part")
+        self._file = None
+
+    def feed(self, data: bytes):
+        """Take the next chunk. Sync and cheap; call flush() to write it out."""
+        self.size += len(data)
+        if self.size > self.max_bytes:
+            raise UploadRejected(f"File is larger than {Config.MAX_FILE_SIZE_MB} MB", 413)
+
+        if self.kind is None:
+            self._header += data[:SNIFF_BYTES]
+            if len(self._header) >= SNIFF_BYTES:
+                self._check_type()
+
+        self._hash.update(data)
+        self._pending += data
+
+    def _check_type(self):
+        self.kind = sniff_image_type(self._header)
+        if self.kind is None or self.kind[0] not in Config.ALLOWED_IMAGE_TYPES:
+            raise UploadRejected("Unsupported image type. Please upload PNG, JPG or WEBP.", 415)
+
+    async def flush(self, force: bool = False):
+        if len(self._pending) < WRITE_BUFFER_BYTES and not (force and self._pending):
+            return
+
+        data, self._pending = bytes(self._pending), bytearray()
+        await run_blocking(self._write, data)
+
+    def _write(self, data: bytes):
+        if self._file is None:
+            os.makedirs(self.upload_dir, exist_ok=True)
+            self._file = open(self._tmp_path, "wb")
+        self._file.write(data)
+
+    async def finish(self) -> dict:
+        if self.size == 0:
+            raise UploadRejected("No file received")
+        if self.kind is None:
+            self._check_type()
+
+        await self.flush(force=True)
+        return await run_blocking(self._commit)
+
+    def _commit(self) -> dict:
+        self._file.close()
+        self._file = None
+
+        sha256 = self._hash.hexdigest()
+        path = os.path.join(self.upload_dir, f"{sha256}.{self.kind[1]}")
+
+        deduplicated = os.path.isfile(path)
+        if deduplicated:
+            os.remove(self._tmp_path)
+        else:
+            os.replace(self._tmp_path, path)
+
+        return {
+            "path": path,
+            "content_type": self.kind[0],
+            "bytes": self.size,
+            "sha256": sha256,
+            "deduplicated": deduplicated
+        }
+
+    def abort(self):
+        """Drop the partial file after a failure. Blocking."""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        try:
+            os.remove(self._tmp_path)
+        except FileNotFoundError:
+            pass
+
+
+async def receive_upload(request) -> dict:
+    """
+    Stream an upload from a Starlette request into UPLOAD_DIR.
+
+    Takes either multipart/form-data (the first file part is used) or a
+    raw image body (Content-Type: image/...). Raises UploadRejected.
+    """
+    max_bytes = Config.MAX_FILE_SIZE_MB * 1024 * 1024
+    length = request.headers.get("content-length")
+    # Allow some room for the multipart framing around the file
+    if length and length.isdigit() and int(length) > max_bytes + 64 * 1024:
+        raise UploadRejected(f"File is larger than {Config.MAX_FILE_SIZE_MB} MB", 413)
+
+    content_type, options = parse_options_header(request.headers.get("content-type", ""))
+    writer = UploadWriter(max_bytes=max_bytes)
+
+    try:
+        if content_type == b"multipart/form-data":
+            filename = await _receive_multipart(request, options.get(b"boundary"), writer)
+        elif content_type.startswith(b"image/"):
+            filename = None
+            async for chunk in request.stream():
+                writer.feed(chunk)
+                await writer.flush()
+        else:
+            raise UploadRejected("Send multipart/form-data with a 'file' field, or a raw image body", 415)
+
+        result = await writer.finish()
+    except BaseException:
+        await run_blocking(writer.abort)
+        raise
+
+    result["filename"] = filename
+    return result
+
+
+async def _receive_multipart(request, boundary: Optional[bytes], writer: UploadWriter) -> Optional[str]:
+    if not boundary:
+        raise UploadRejected("Missing multipart boundary")
+
+    state = {"headers": {}, "field": b"", "value": b"", "is_file": False, "done": False, "filename": None}
+
+    def on_part_begin():
+        state["headers"] = {}
+
+    def on_header_field(data, start, end):
+        state["field"] += data[start:end]
+
+    def on_header_value(data, start, end):
+        state["value"] += data[start:end]
+
+    def on_header_end():
+        state["headers"][state["field"].lower()] = state["value"]
+        state["field"] = state["value"] = b""
+
+    def on_headers_finished():
+        _, disposition = parse_options_header(state["headers"].get(b"content-disposition", b""))
+        # Only the first file part is stored; other fields are ignored
+        state["is_file"] = b"filename" in disposition and not state["done"]
+        if state["is_file"]:
+            state["filename"] = os.path.basename(disposition[b"filename"].decode("utf-8", "replace"))
+
+    def on_part_data(data, start, end):
+        if state["is_file"]:
+            writer.feed(data[start:end])
+
+    def on_part_end():
+        if state["is_file"]:
+            state["done"] = True
+            state["is_file"] = False
+
+    parser = MultipartParser(boundary, {
+        "on_part_begin": on_part_begin,
+        "on_header_field": on_header_field,
+        "on_header_value": on_header_value,
+        "on_header_end": on_header_end,
+        "on_headers_finished": on_headers_finished,
+        "on_part_data": on_part_data,
+        "on_part_end": on_part_end
+    })
+
+    async for chunk in request.stream():
+        parser.write(chunk)
+        await writer.flush()
+
+    parser.finalize()
+
+    if not state["done"]:
+        raise UploadRejected("No file part in the upload")
+
+    return state["filename"]
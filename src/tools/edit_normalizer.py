@@ -0,0 +1,188 @@
+import io
+import math
+import time
+import logging
+import threading
+from typing import Optional, Tuple
+import numpy as np
+from PIL import Image, ImageOps
+
+log = logging.getLogger(__name__)
+
+# Output sizes the edit API supports, as (width, height)
+EDIT_TARGETS = [(1024, 1024), (1536, 1024), (1024, 1536)]
+
+# JPEGs are decoded at a reduced scale no smaller than this on either side
+DRAFT_MIN_SIDE = 1024
+
+# (raw pixel bytes up to, zlib level): small canvases get the tightest
+# compression, large ones a faster level whose output is only a little bigger
+COMPRESS_LEVELS = [
+    (1 * 1024 * 1024, 9),
+    (4 * 1024 * 1024, 6)
+]
+FAST_COMPRESS_LEVEL = 3
+
+
+def pick_target(width: int, height: int) -> Tuple[int, int]:
+    """The supported edit size whose aspect ratio is closest to width x height."""
+    ratio = width / height
+    return min(EDIT_TARGETS, key=lambda target: abs(math.log(target[0] / target[1] / ratio)))
+
+
+def compress_level(raw_bytes: int) -> int:
+    """PNG compression level for a canvas of raw_bytes uncompressed pixels."""
+    for limit, level in COMPRESS_LEVELS:
+        if raw_bytes <= limit:
+            return level
+    return FAST_COMPRESS_LEVEL
+
+
+def _flatten_alpha(img: Image.Image) -> Image.Image:
+    """RGB, or RGBA only if some pixel is actually transparent."""
+    if img.mode in ("RGBA", "LA", "PA") or (img.mode == "P" and "transparency" in img.info):
+        img = img.convert("RGBA")
+        if img.getchannel("A").getextrema()[0] < 255:
+            return img
+
+    return img if img.mode == "RGB" else img.convert("RGB")
+
+
+class EditNormalizer:
+    """
+    Shrinks source images before they are uploaded to the edit API.
+
+    Each image is rotated upright from its EXIF orientation, scaled down
+    to fit the supported edit size closest to its aspect ratio, and
+    edge-padded to exactly that ratio so the API does not stretch it.
+    The alpha channel is dropped when nothing is transparent, and the
+    PNG compression level is chosen from the canvas size. The padding
+    is cropped off the result again with crop_result().
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+
+        self.images = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.seconds = 0.0
+
+    def normalize(self, data: bytes, keep_original: bool = False) -> dict:
+        """
+        Blocking; run in the offload pool.
+
+        Args:
+            data: The source image file
+            keep_original: Also return the upright image at full
+                           resolution (needed to composite masked edits)
+
+        Returns:
+            dict with the PNG to upload ("png"), the API size string
+            ("size"), the canvas size, the content box within it, the
+            upright source size, and the byte/time figures
+        """
+        started = time.perf_counter()
+
+        img = Image.open(io.BytesIO(data))
+        if not keep_original and img.format == "JPEG":
+            img.draft("RGB", (DRAFT_MIN_SIDE, DRAFT_MIN_SIDE))
+
+        img = _flatten_alpha(ImageOps.exif_transpose(img))
+        width, height = img.size
+
+        target = pick_target(width, height)
+        scale = min(target[0] / width, target[1] / height, 1.0)
+        content = (max(1, round(width * scale)), max(1, round(height * scale)))
+        resized = img.resize(content, Image.Resampling.LANCZOS, reducing_gap=3.0) if content != img.size else img
+
+        # Smallest canvas with the target's exact ratio that holds the content
+        fit = max(content[0] / target[0], content[1] / target[1])
+        canvas = (max(content[0], round(target[0] * fit)), max(content[1], round(target[1] * fit)))
+        left = (canvas[0] - content[0]) // 2
+        top = (canvas[1] - content[1]) // 2
+
+        if canvas != content:
+            pixels = np.asarray(resized)
+            padding = [(top, canvas[1] - content[1] - top), (left, canvas[0] - content[0] - left), (0, 0)]
+            resized = Image.fromarray(np.pad(pixels, padding, mode="edge"))
+
+        raw_bytes = canvas[0] * canvas[1] * len(resized.getbands())
+        buffer = io.BytesIO()
+        resized.save(buffer, format="PNG", compress_level=compress_level(raw_bytes))
+        buffer.seek(0)
+
+        seconds = time.perf_counter() - started
+        bytes_out = buffer.getbuffer().nbytes
+
+        with self._lock:
+            self.images += 1
+            self.bytes_in += len(data)
+            self.bytes_out += bytes_out
+            self.seconds += seconds
+
+        log.info("🗜️  Edit upload normalized", extra={
+            "bytes_in": len(data),
+            "bytes_out": bytes_out,
+            "source": f"{width}x{height}",
+            "canvas": f"{canvas[0]}x{canvas[1]}",
+            "mode": resized.mode,
+            "ms": round(seconds * 1000)
+        })
+
+        return {
+            "png": buffer,
+            "size": f"{target[0]}x{target[1]}",
+            "canvas": canvas,
+            "box": (left, top, left + content[0], top + content[1]),
+            "source_size": (width, height),
+            "original": img if keep_original else None,
+            "bytes_in": len(data),
+            "bytes_out": bytes_out,
+            "seconds": seconds
+        }
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "images": self.images,
+                "bytes_in": self.bytes_in,
+                "bytes_out": self.bytes_out,
+                "saved_ratio": round(1 - self.bytes_out / self.bytes_in, 4) if self.bytes_in else 0.0,
+                "avg_ms": round(self.seconds / self.images * 1000, 1) if self.images else 0.0
+            }
+
+
+def fit_mask(mask: np.ndarray, normalized: dict) -> np.ndarray:
+    """Map a mask at the source size onto the padded canvas (padding = keep)."""
+    left, top, right, bottom = normalized["box"]
+    canvas_w, canvas_h = normalized["canvas"]
+
+    scaled = Image.fromarray(mask.astype(np.float32)).resize(
+        (right - left, bottom - top), Image.Resampling.BILINEAR
+    )
+    padding = [(top, canvas_h - bottom), (left, canvas_w - right)]
+    return np.pad(np.asarray(scaled, dtype=np.float32), padding)
+
+
+def crop_result(edited: Image.Image, normalized: dict) -> Image.Image:
+    """Cut the padding off an edit result (which may come back at another scale)."""
+    left, top, right, bottom = normalized["box"]
+    canvas_w, canvas_h = normalized["canvas"]
+    if (left, top, right, bottom) == (0, 0, canvas_w, canvas_h):
+        return edited
+
+    sx, sy = edited.width / canvas_w, edited.height / canvas_h
+    return edited.crop((round(left * sx), round(top * sy), round(right * sx), round(bottom * sy)))
+
+
+_edit_normalizer: Optional[EditNormalizer] = None
+
+
+def get_edit_normalizer() -> EditNormalizer:
+    global _edit_normalizer
+
+    if _edit_normalizer is None:
+        _edit_normalizer = EditNormalizer()
+
+    return _edit_normalizer
@@ -0,0 +1,296 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from contextlib import contextmanager
+from typing import Optional
+from src.agents.config import Config
+from src.tools.prompt_index import prompt_tokens, prompt_similarity, minhash, band_buckets
+
+
+class ImageCache:
+    """
+    Persistent cache for generate_image results.
+
+    Entries are keyed by a SHA-256 of the normalized request parameters
+    (prompt, size, quality, model). The image files themselves live in
+    Config.OUTPUT_DIR, so a hit can be served at its usual /outputs URL.
+    A small SQLite index next to them tracks size and last access, and
+    is used to evict entries by age and total size. Eviction only drops
+    index entries; deleting the files is left to the storage GC, which
+    knows which sessions still show them.
+
+    Every stored prompt is also indexed by MinHash/LSH over its
+    normalized words and word pairs, so find_similar can serve
+    near-identical prompts when that is enabled.
+    """
+
+    def __init__(
+        self,
+        directory: str = Config.OUTPUT_DIR,
+        max_bytes: int = Config.IMAGE_CACHE_MAX_MB * 1024 * 1024,
+        max_age_seconds: float = Config.IMAGE_CACHE_TTL_HOURS * 3600
+    ):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_age_seconds = max_age_seconds
+        self.db_path = os.path.join(directory, ".image_cache.sqlite3")
+
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+        self.near_hits = 0
+
+        self._lock = threading.Lock()
+
+        os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS images (
+                    key TEXT PRIMARY KEY,
+                    path TEXT NOT NULL,
+                    bytes INTEGER NOT NULL,
+                    params TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_access REAL NOT NULL
+                )
+                """
+            )
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS prompts (
+                    key TEXT PRIMARY KEY,
+                    param_key TEXT NOT NULL,
+                    prompt TEXT NOT NULL,
+                    tokens TEXT NOT NULL
+                )
+                """
+            )
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS prompt_bands (
+                    param_key TEXT NOT NULL,
+                    band INTEGER NOT NULL,
+                    bucket TEXT NOT NULL,
+                    key TEXT NOT NULL
+                )
+                """
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS prompt_bands_lookup ON prompt_bands (param_key, band, bucket)"
+            )
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=10)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    @staticmethod
+    def normalize_params(prompt: str, size: str, quality: str, model: str) -> dict:
+        return {
+            "prompt": " ".join(prompt.split()),
+            "size": size.strip().lower(),
+            "quality": quality.strip().lower(),
+            "model": model.strip().lower()
+        }
+
+    @classmethod
+    def make_key(cls, prompt: str, size: str, quality: str, model: str) -> str:
+        params = cls.normalize_params(prompt, size, quality, model)
+        payload = json.dumps(params, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def make_param_key(size: str, quality: str, model: str) -> str:
+        """Key for everything except the prompt; near matches must share it."""
+        params = ImageCache.normalize_params("", size, quality, model)
+        return hashlib.sha256(json.dumps(params, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the cached image path for `key`, or None on a miss."""
+        now = time.time()
+
+        with self._lock, self._connect() as conn:
+            row = conn.execute(
+                "SELECT path, created_at FROM images WHERE key = ?", (key,)
+            ).fetchone()
+
+            if row is not None:
+                path, created_at = row
+                if now - created_at <= self.max_age_seconds and os.path.exists(path):
+                    conn.execute("UPDATE images SET last_access = ? WHERE key = ?", (now, key))
+                    self.hits += 1
+                    return path
+
+                # Expired or the file was removed behind our back
+                conn.execute("DELETE FROM images WHERE key = ?", (key,))
+                self._unindex(conn, key)
+
+            self.misses += 1
+            return None
+
+    def put(self, key: str, path: str, params: dict):
+        """Index an image that has just been written to `path`."""
+        now = time.time()
+        size = os.path.getsize(path)
+
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO images (key, path, bytes, params, created_at, last_access) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, path, size, json.dumps(params, ensure_ascii=False), now, now)
+            )
+            self.stores += 1
+            self._index_prompt(conn, key, params)
+            self._evict(conn, now)
+
+    def _index_prompt(self, conn: sqlite3.Connection, key: str, params: dict):
+        param_key = self.make_param_key(params["size"], params["quality"], params["model"])
+        tokens = prompt_tokens(params["prompt"])
+
+        self._unindex(conn, key)
+        conn.execute(
+            "INSERT INTO prompts (key, param_key, prompt, tokens) VALUES (?, ?, ?, ?)",
+            (key, param_key, params["prompt"], json.dumps(tokens, ensure_ascii=False))
+        )
+        conn.executemany(
+            "INSERT INTO prompt_bands (param_key, band, bucket, key) VALUES (?, ?, ?, ?)",
+            [(param_key, band, bucket, key) for band, bucket in enumerate(band_buckets(minhash(tokens)))]
+        )
+
+    @staticmethod
+    def _unindex(conn: sqlite3.Connection, key: str):
+        conn.execute("DELETE FROM prompts WHERE key = ?", (key,))
+        conn.execute("DELETE FROM prompt_bands WHERE key = ?", (key,))
+
+    def find_similar(
+        self,
+        prompt: str,
+        size: str,
+        quality: str,
+        model: str,
+        threshold: float = Config.IMAGE_NEAR_DUP_THRESHOLD
+    ) -> Optional[dict]:
+        """
+        Look for a cached image whose prompt is nearly the same.
+
+        Candidates come from the LSH buckets and are confirmed with
+        prompt_similarity: word order matters within a phrase, but not
+        punctuation or the order of comma-separated phrases.
+
+        Returns:
+            {"path", "prompt", "similarity"} for the best match at or
+            above `threshold`, otherwise None.
+        """
+        params = self.normalize_params(prompt, size, quality, model)
+        param_key = self.make_param_key(params["size"], params["quality"], params["model"])
+        tokens = prompt_tokens(params["prompt"])
+        buckets = band_buckets(minhash(tokens))
+        now = time.time()
+
+        with self._lock, self._connect() as conn:
+            where = " OR ".join(["(band = ? AND bucket = ?)"] * len(buckets))
+            args = [v for band, bucket in enumerate(buckets) for v in (band, bucket)]
+            rows = conn.execute(
+                f"""
+                SELECT DISTINCT p.key, p.prompt, i.path, i.created_at
+                FROM prompt_bands b
+                JOIN prompts p ON p.key = b.key
+                JOIN images i ON i.key = b.key
+                WHERE b.param_key = ? AND ({where})
+                """,
+                [param_key] + args
+            ).fetchall()
+
+            best = None
+            for key, cached_prompt, path, created_at in rows:
+                if now - created_at > self.max_age_seconds or not os.path.exists(path):
+                    continue
+                similarity = prompt_similarity(params["prompt"], cached_prompt)
+                if similarity >= threshold and (best is None or similarity > best[0]):
+                    best = (similarity, key, cached_prompt, path)
+
+            if best is None:
+                return None
+
+            similarity, key, cached_prompt, path = best
+            conn.execute("UPDATE images SET last_access = ? WHERE key = ?", (now, key))
+            self.near_hits += 1
+
+            return {"path": path, "prompt": cached_prompt, "similarity": round(similarity, 3)}
+
+    def evict(self) -> int:
+        with self._lock, self._connect() as conn:
+            return self._evict(conn, time.time())
+
+    def _evict(self, conn: sqlite3.Connection, now: float) -> int:
+        doomed = conn.execute(
+            "SELECT key, path FROM images WHERE created_at < ?",
+            (now - self.max_age_seconds,)
+        ).fetchall()
+
+        total = conn.execute("SELECT COALESCE(SUM(bytes), 0) FROM images").fetchone()[0]
+        if total > self.max_bytes:
+            expired = {key for key, _ in doomed}
+            for key, path, size in conn.execute(
+                "SELECT key, path, bytes FROM images ORDER BY last_access ASC"
+            ):
+                if total <= self.max_bytes:
+                    break
+                total -= size
+                if key not in expired:
+                    doomed.append((key, path))
+
+        # Only the index entries: the files may still be shown by live
+        # sessions. Once unindexed they are no longer pinned, and the
+        # storage GC removes them when nothing references them.
+        for key, _ in doomed:
+            conn.execute("DELETE FROM images WHERE key = ?", (key,))
+            self._unindex(conn, key)
+
+        self.evictions += len(doomed)
+        return len(doomed)
+
+    def paths(self) -> set:
+        """All image paths currently referenced by the cache."""
+        with self._connect() as conn:
+            return {row[0] for row in conn.execute("SELECT path FROM images")}
+
+    def stats(self) -> dict:
+        with self._connect() as conn:
+            entries, total = conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(bytes), 0) FROM images"
+            ).fetchone()
+
+        lookups = self.hits + self.misses
+        return {
+            "entries": entries,
+            "bytes": total,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "near_hits": self.near_hits,
+            "stores": self.stores,
+            "evictions": self.evictions
+        }
+
+
+_image_cache: Optional[ImageCache] = None
+
+
+def get_image_cache() -> ImageCache:
+    global _image_cache
+
+    if _image_cache is None:
+        _image_cache = ImageCache()
+
+    return _image_cache
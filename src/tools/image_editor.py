@@ -1,22 +1,45 @@
 import os
 import base64
+import hashlib
+import logging
 import uuid
-import requests
 from datetime import datetime
 from strands import tool
-from openai import OpenAI
 from PIL import Image
 import io
+import httpx
+from typing import List, Optional
+from urllib.parse import urlparse
 from src.agents.config import Config
+from src.services.clients import get_clients
+from src.services.offload import run_blocking
+from src.services.jobs import get_job_manager, image_job_result
+from src.services.artifacts import collect_artifacts, record_image, record_job
+from src.services.rate_limiter import UpstreamUnavailable, get_guard
+from src.services.output_store import get_output_store
+from src.services.storage import get_storage_manager, current_session_id
+from src.tools.edit_normalizer import crop_result, fit_mask, get_edit_normalizer
+from src.tools.mask_engine import (
+    build_mask, composite, feather as feather_mask, get_mask_cache,
+    load_mask_file, to_api_mask, to_selection_image
+)
+
+log = logging.getLogger(__name__)
+
+def _write_image(image_base64: str, filepath: str):
+    """Decode and save an image. Runs in the offload pool."""
+    with open(filepath, "wb") as f:
+        f.write(base64.b64decode(image_base64))
 
-# Initialize OpenAI client
-client = OpenAI(api_key=Config.OPENAI_API_KEY)
 
 @tool
-def edit_image(
+async def edit_image(
     image_url: str,
     edit_instructions: str,
-    mask_path: str = None
+    mask_path: str = None,
+    regions: Optional[List[dict]] = None,
+    feather: int = 0,
+    invert: bool = False
 ) -> str:
     """
     Edit an EXISTING image based on text instructions.
@@ -44,6 +67,16 @@ def edit_image(
                   - White areas = will be edited
                   - Black areas = will be preserved
                   - If not provided, AI auto-detects what to change
+
+        regions: Optional areas to edit, in image pixels, instead of a mask file.
+                 Only these areas change; the rest of the image is kept exactly.
+                 - {"type": "rect", "x": 10, "y": 20, "width": 200, "height": 100}
+                 - {"type": "ellipse", "x": 10, "y": 20, "width": 200, "height": 100}
+                 - {"type": "polygon", "points": [[10, 10], [200, 40], [90, 180]]}
+
+        feather: Soften the mask edges by this many pixels (default 0).
+
+        invert: Edit everything EXCEPT the regions/mask (default False).
     
     Returns:
         Success: Path to the edited image file
@@ -54,32 +87,72 @@ def edit_image(
         edit_image("uploads/room.png", "Change the wall color to blue")
         edit_image("uploads/logo.png", "Make the background transparent")
     """
+    if Config.IMAGE_JOBS_ENABLED and get_job_manager().running:
+        job_id = await get_job_manager().submit(
+            "image_edit",
+            {
+                "image_url": image_url,
+                "edit_instructions": edit_instructions,
+                "mask_path": mask_path,
+                "regions": regions,
+                "feather": feather,
+                "invert": invert
+            },
+            session_id=current_session_id.get()
+        )
+        record_job(job_id, "image_edit")
+        return (
+            f"Image edit started in the background (job {job_id}). "
+            f"The edited image will be ready shortly. [JOB_ID:{job_id}]"
+        )
+
+    return await apply_edit(image_url, edit_instructions, mask_path, regions, feather, invert)
+
+
+async def apply_edit(
+    image_url: str,
+    edit_instructions: str,
+    mask_path: str = None,
+    regions: Optional[List[dict]] = None,
+    feather: int = 0,
+    invert: bool = False
+) -> str:
+    """
+    Edit an image and save the result to OUTPUT_DIR.
+
+    This is the work behind the edit_image tool, shared by the inline
+    tool call and the background job worker. With a mask (regions or
+    mask_path) the mask is sent to the API and the result is blended
+    back into the original at full resolution, so only the masked area
+    changes.
+    """
     try:
-        print(f"✏️ Editing image: {image_url}")
-        print(f"   Instructions: {edit_instructions[:50]}...")
+        log.info("✏️ Editing image: %s", image_url, extra={"instructions": edit_instructions[:50]})
         
         # Validate image exists
         if not image_url:
             return "Error: Image URL not provided."
 
         # ✅ FIX: Download image URL into bytes
-        image_file = download_image_from_url(image_url)
-        
-        # Read and prepare the image
-        
-        
+        source = await _aload_source(image_url)
+
+        # Normalized edit PNG plus, if a selection was given, the mask for it
+        prepared = await run_blocking(_prepare_edit, source, mask_path, regions, feather, invert)
+
         # Build the edit request
         edit_params = {
             "model": Config.IMAGE_MODEL,
-            "image": ("image.png", image_file, "image/png"),
+            "image": ("image.png", prepared["image"], "image/png"),
             "prompt": edit_instructions,
             "n": 1,
-            "size": "1024x1024",
-         
+            "size": prepared["size"],
         }
+        if prepared["api_mask"] is not None:
+            edit_params["mask"] = ("mask.png", prepared["api_mask"], "image/png")
 
         # Call OpenAI Image Edit API
-        response = client.images.edit(**edit_params)
+        async with get_guard("openai", Config.IMAGE_MODEL).slot():
+            response = await get_clients().openai.images.edit(**edit_params)
         
         # Extract the edited image
         edited_base64 = response.data[0].b64_json
@@ -87,21 +160,30 @@ def edit_image(
         # Generate output filename (preserve original name + add "_edited")
         original_name = os.path.splitext(os.path.basename(image_url))[0]
         timestamp = datetime.now().strftime("%H%M%S")
-        filename = f"{original_name}_edited_{timestamp}.png"
+        # Concurrent edits of one image can land in the same second
+        filename = f"{original_name}_edited_{timestamp}_{uuid.uuid4().hex[:8]}.png"
         filepath = os.path.join(Config.OUTPUT_DIR, filename)
         
         # Save edited image
-        image_bytes = base64.b64decode(edited_base64)
-        with open(filepath, "wb") as f:
-            f.write(image_bytes)
+        await run_blocking(_save_result, prepared, edited_base64, filepath)
+        await run_blocking(get_storage_manager().track, filepath)
+        get_output_store().add(filepath)
         
-        print(f"✅ Edited image saved to: {filepath}")
+        log.info("✅ Edited image saved to: %s", filepath)
+
+        record_image(
+            filepath, source=image_url, instructions=edit_instructions,
+            size=prepared["size"], masked=prepared["api_mask"] is not None
+        )
         
         return f"Image edited successfully! Changes made: {edit_instructions[:100]}... [IMAGE_PATH:{filepath}]"
-        
+
+    except UpstreamUnavailable as e:
+        log.warning("⏳ Image edit refused locally: %s", e)
+        return f"Image editing is temporarily unavailable: {e}. Please try again shortly."
     except Exception as e:
         error_msg = str(e)
-        print(f"❌ Image editing failed: {error_msg}")
+        log.error("❌ Image editing failed: %s", error_msg)
         
         if "rate_limit" in error_msg.lower():
             return "Image editing failed: Rate limit reached. Please wait a moment and try again."
@@ -113,25 +195,164 @@ def edit_image(
             return f"Image editing failed: {error_msg}"
 
 
-def download_image_from_url(image_url: str) -> io.BytesIO:
+def _prepare_edit(
+    source: io.BytesIO,
+    mask_path: Optional[str],
+    regions: Optional[List[dict]],
+    feather: int,
+    invert: bool
+) -> dict:
     """
-    Download an image from a public URL and return it as BytesIO (PNG).
+    Build everything the edit call needs. Runs in the offload pool.
+
+    Returns the normalized upload and, when a selection was given, the
+    mask at the upright source size (for compositing) and the API mask.
     """
-    response = requests.get(image_url, timeout=10)
-    response.raise_for_status()
+    data = source.getvalue()
+    selective = bool(regions or mask_path)
 
-    img = Image.open(io.BytesIO(response.content))
+    normalized = get_edit_normalizer().normalize(data, keep_original=selective)
+    prepared = {
+        "image": normalized["png"],
+        "size": normalized["size"],
+        "normalized": normalized,
+        "mask": None,
+        "api_mask": None
+    }
+    if not selective:
+        return prepared
 
-    # Convert to RGBA PNG (OpenAI friendly)
-    if img.mode != "RGBA":
-        img = img.convert("RGBA")
+    # Selections are in the coordinates of the upright (EXIF-rotated) image
+    source_size = normalized["source_size"]
+    if regions:
+        mask = get_mask_cache().get_or_build(
+            hashlib.sha256(data).hexdigest(), source_size, regions, feather, invert
+        )
+    else:
+        local_mask = resolve_local_image(mask_path)
+        if not local_mask:
+            raise ValueError(f"Mask not found: {mask_path}")
+        mask = load_mask_file(local_mask, source_size)
+        if feather:
+            mask = feather_mask(mask, feather)
+        if invert:
+            mask = 1.0 - mask
+
+    if not mask.any():
+        raise ValueError("The mask does not select any part of the image")
+
+    prepared["mask"] = mask
+    prepared["api_mask"] = to_api_mask(fit_mask(mask, normalized), normalized["canvas"])
+    return prepared
+
+
+def _save_result(prepared: dict, edited_base64: str, filepath: str):
+    """
+    Save an edit result. Runs in the offload pool.
+
+    The normalization padding is cropped off; with a mask, the edit is
+    blended into the original through it at full resolution.
+    """
+    normalized = prepared["normalized"]
+    if prepared["mask"] is None and normalized["box"] == (0, 0) + normalized["canvas"]:
+        _write_image(edited_base64, filepath)
+        return
+
+    with Image.open(io.BytesIO(base64.b64decode(edited_base64))) as edited:
+        result = crop_result(edited, normalized)
+        if prepared["mask"] is not None:
+            result = composite(normalized["original"], result, prepared["mask"])
+        result.save(filepath, format="PNG")
 
-    buffer = io.BytesIO()
-    img.save(buffer, format="PNG")
-    buffer.seek(0)
 
+async def run_edit_job(params: dict) -> dict:
+    """Job handler for "image_edit"."""
+    with collect_artifacts() as artifacts:
+        message = await apply_edit(**params)
+    return image_job_result(message, artifacts)
+
+
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+
+LOCAL_HOSTS = {"localhost", "127.0.0.1", "0.0.0.0"}
+
+
+def resolve_local_image(image_url: str) -> Optional[str]:
+    """
+    Map an image reference to a file on this server, if it is one.
+
+    Handles "/outputs/x.png", "outputs/x.png", "uploads/x.png", the same
+    paths on a localhost URL, and paths already inside OUTPUT_DIR or
+    UPLOAD_DIR. Anything that would resolve outside those directories
+    is rejected.
+    """
+    parsed = urlparse(image_url)
+    if parsed.scheme in ("http", "https"):
+        if parsed.hostname not in LOCAL_HOSTS:
+            return None
+        path = parsed.path
+    elif parsed.scheme:
+        return None
+    else:
+        # Drop any query, e.g. "/outputs/x.png?variant=preview"
+        path = parsed.path or image_url
+
+    roots = {"outputs": Config.OUTPUT_DIR, "uploads": Config.UPLOAD_DIR}
+    candidates = [path]
+    relative = path.lstrip("/")
+    prefix, _, rest = relative.partition("/")
+    if prefix in roots and rest:
+        candidates.insert(0, os.path.join(roots[prefix], rest))
+
+    for candidate in candidates:
+        real = os.path.realpath(candidate)
+        for root in roots.values():
+            root = os.path.realpath(root)
+            if real.startswith(root + os.sep) and os.path.isfile(real):
+                return real
+
+    return None
+
+
+async def _read_limited(image_url: str) -> io.BytesIO:
+    """Stream a remote image into memory, enforcing MAX_FILE_SIZE_MB as it arrives."""
+    max_bytes = Config.MAX_FILE_SIZE_MB * 1024 * 1024
+    timeout = httpx.Timeout(Config.DOWNLOAD_TIMEOUT_SECONDS, connect=5.0)
+
+    async with get_clients().http.stream("GET", image_url, timeout=timeout) as response:
+        response.raise_for_status()
+
+        length = response.headers.get("Content-Length")
+        if length and int(length) > max_bytes:
+            raise ValueError(f"Image is larger than {Config.MAX_FILE_SIZE_MB} MB")
+
+        buffer = io.BytesIO()
+        async for chunk in response.aiter_bytes(DOWNLOAD_CHUNK_SIZE):
+            buffer.write(chunk)
+            if buffer.tell() > max_bytes:
+                raise ValueError(f"Image is larger than {Config.MAX_FILE_SIZE_MB} MB")
+
+    buffer.seek(0)
     return buffer
 
+
+def _read_local(local_path: str) -> io.BytesIO:
+    if os.path.getsize(local_path) > Config.MAX_FILE_SIZE_MB * 1024 * 1024:
+        raise ValueError(f"Image is larger than {Config.MAX_FILE_SIZE_MB} MB")
+    with open(local_path, "rb") as f:
+        return io.BytesIO(f.read())
+
+
+async def _aload_source(image_url: str) -> io.BytesIO:
+    """The image's original bytes, from disk if it is local."""
+    local_path = resolve_local_image(image_url)
+
+    if local_path:
+        return await run_blocking(_read_local, local_path)
+
+    return await _read_limited(image_url)
+
+
 def prepare_image_for_edit(image_path: str) -> bytes:
     """
     Prepare an image file for the OpenAI edit API.
@@ -141,31 +362,21 @@ def prepare_image_for_edit(image_path: str) -> bytes:
     - Less than 4MB (for DALL-E 2) or 50MB (for gpt-image-1)
     - Square images work best
     
-    This function handles conversion if needed.
+    The image is normalized the same way edit_image does it: upright,
+    scaled and padded to the closest supported edit size, alpha
+    dropped when unused.
     """
-    # Open the image with PIL
-    with Image.open(image_path) as img:
-        # Convert to RGBA (PNG format with transparency support)
-        if img.mode != "RGBA":
-            img = img.convert("RGBA")
-        
-        # Resize if too large (optional, for faster processing)
-        max_size = 2048
-        if max(img.size) > max_size:
-            img.thumbnail((max_size, max_size), Image.Resampling.LANCZOS)
-        
-        # Save to bytes buffer as PNG
-        buffer = io.BytesIO()
-        img.save(buffer, format="PNG")
-        buffer.seek(0)
-        
-        return buffer.read()
+    with open(image_path, "rb") as f:
+        return get_edit_normalizer().normalize(f.read())["png"].getvalue()
 
 
 def create_mask_from_selection(
     image_path: str,
     x: int, y: int,
-    width: int, height: int
+    width: int, height: int,
+    regions: Optional[List[dict]] = None,
+    feather: int = 0,
+    invert: bool = False
 ) -> str:
     """
     Create a mask image for selective editing.
@@ -177,6 +388,9 @@ def create_mask_from_selection(
         image_path: Original image path (to get dimensions)
         x, y: Top-left corner of edit area
         width, height: Size of edit area
+        regions: Extra rect/ellipse/polygon regions (see edit_image)
+        feather: Soften the edges by this many pixels
+        invert: Select everything outside the regions instead
     
     Returns:
         Path to the created mask file
@@ -185,16 +399,13 @@ def create_mask_from_selection(
     with Image.open(image_path) as img:
         original_size = img.size
     
-    # Create black image (areas to preserve)
-    mask = Image.new("RGBA", original_size, (0, 0, 0, 255))
-    
-    # Draw white rectangle (area to edit)
-    from PIL import ImageDraw
-    draw = ImageDraw.Draw(mask)
-    draw.rectangle([x, y, x + width, y + height], fill=(255, 255, 255, 255))
+    # White = area to edit, black = area to preserve
+    selection = [{"type": "rect", "x": x, "y": y, "width": width, "height": height}] + (regions or [])
+    mask = to_selection_image(build_mask(original_size, selection, feather, invert))
     
     # Save mask
     mask_path = os.path.join(Config.OUTPUT_DIR, f"mask_{uuid.uuid4().hex[:8]}.png")
     mask.save(mask_path)
+    get_storage_manager().track(mask_path)
     
-    return mask_path
\ No newline at end of file
+    return mask_path
@@ -1,19 +1,71 @@
 import os 
 import base64
 import uuid
+import asyncio
+import logging
 from datetime import datetime
+from typing import AsyncIterator, List, Tuple
 from strands import tool
-from openai import OpenAI
 from src.agents.config import Config
+from src.services.clients import get_clients
+from src.services.offload import run_blocking
+from src.services.jobs import get_job_manager, image_job_result
+from src.services.artifacts import collect_artifacts, record_image, record_job
+from src.services.rate_limiter import UpstreamUnavailable, get_guard
+from src.services.output_store import OutputStore, get_output_store
+from src.services.storage import get_storage_manager, current_session_id
+from src.tools.image_cache import ImageCache, get_image_cache
 
-# from langchain_openai import ChatOpenAI
-from langchain_core.prompts import PromptTemplate
+log = logging.getLogger(__name__)
 
+def _write_image(image_base64: str, filepath: str):
+    """Decode and save an image. Runs in the offload pool."""
+    with open(filepath, "wb") as f:
+        f.write(base64.b64decode(image_base64))
+
+
+def _write_images(images: List[Tuple[str, str]]):
+    """Save several (base64, path) images in a single offload call."""
+    for image_base64, filepath in images:
+        _write_image(image_base64, filepath)
+
+
+async def _render(prompt: str, size: str, quality: str, n: int = 1) -> List[str]:
+    """
+    Make one image API call for `n` images and save them all to OUTPUT_DIR.
+
+    Returns the saved paths. Errors are raised, not turned into text.
+    """
+    async with get_guard("openai", Config.IMAGE_MODEL).slot():
+        response = await get_clients().openai.images.generate(
+            model=Config.IMAGE_MODEL,
+            prompt=prompt,
+            n=n,
+            size=size,
+            quality=quality
+        )
+
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    unique_id = uuid.uuid4().hex[:8]
+
+    images = []
+    for i, item in enumerate(response.data):
+        suffix = f"_{i + 1}" if n > 1 else ""
+        filename = f"generated_{timestamp}_{unique_id}{suffix}.png"
+        images.append((item.b64_json, os.path.join(Config.OUTPUT_DIR, filename)))
+
+    await run_blocking(_write_images, images)
+
+    paths = [filepath for _, filepath in images]
+    await run_blocking(get_storage_manager().track, *paths)
+    for filepath in paths:
+        get_output_store().add(filepath)
+
+    return paths
 
-client = OpenAI(api_key=Config.OPENAI_API_KEY)
 
 @tool
-def generate_image(prompt: str, size: str = "1024x1024", quality: str = "high")-> str:
+async def generate_image(prompt: str, size: str = "1024x1024", quality: str = "high")-> str:
     """
     Generate a NEW image from a text description.
     
@@ -55,39 +107,79 @@ def generate_image(prompt: str, size: str = "1024x1024", quality: str = "high")-
         generate_image("Sunset over mountains, oil painting style", size="1536x1024")
     """
 
+    if Config.IMAGE_JOBS_ENABLED and get_job_manager().running:
+        job_id = await get_job_manager().submit(
+            "image_generate",
+            {"prompt": prompt, "size": size, "quality": quality},
+            session_id=current_session_id.get()
+        )
+        record_job(job_id, "image_generate")
+        return (
+            f"Image generation started in the background (job {job_id}). "
+            f"The image will be ready shortly. [JOB_ID:{job_id}]"
+        )
+
+    return await create_image(prompt, size, quality)
+
+
+async def create_image(prompt: str, size: str = "1024x1024", quality: str = "high") -> str:
+    """
+    Generate an image and save it to OUTPUT_DIR.
+
+    This is the work behind the generate_image tool, shared by the
+    inline tool call and the background job worker.
+    """
     try:
-        print(f"Generating image: {prompt}")
+        cache_key = None
+        if Config.IMAGE_CACHE_ENABLED:
+            cache_key = ImageCache.make_key(prompt, size, quality, Config.IMAGE_MODEL)
+            cached_path = await run_blocking(get_image_cache().get, cache_key)
+            if cached_path:
+                log.info("⚡ Image cache hit: %s", cached_path)
+                record_image(cached_path, prompt=prompt, size=size, quality=quality, cached=True)
+                return f"Image generated successfully! The image shows: {prompt[:100]}... [IMAGE_PATH:{cached_path}]"
 
-        response = client.images.generate(
-            model=Config.IMAGE_MODEL,
-            prompt=prompt,
-            n=1,
-            size=size,
-            quality=quality
-            
-        )
+            if Config.IMAGE_NEAR_DUP_ENABLED:
+                match = await run_blocking(
+                    get_image_cache().find_similar, prompt, size, quality, Config.IMAGE_MODEL
+                )
+                if match:
+                    log.info("⚡ Near-duplicate cache hit (%s): \"%s\"", match["similarity"], match["prompt"])
+                    record_image(
+                        match["path"], prompt=prompt, size=size, quality=quality, cached=True,
+                        matched_prompt=match["prompt"], similarity=match["similarity"]
+                    )
+                    return (
+                        f"Image generated successfully! Reused the cached image for the similar prompt "
+                        f"\"{match['prompt'][:100]}\" (similarity {match['similarity']}). "
+                        f"[IMAGE_PATH:{match['path']}]"
+                    )
 
-        image_base64 = response.data[0].b64_json
-        image_bytes = base64.b64decode(image_base64)
+        log.info("🎨 Generating image: %s", prompt)
 
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        unique_id = uuid.uuid4().hex[:8]
-        filename = f"generated_{timestamp}_{unique_id}.png"
-        filepath = os.path.join(Config.OUTPUT_DIR, filename)
-        
-       
-       
-        with open(filepath, "wb") as f:
-            f.write(image_bytes)
-        
-        print(f"✅ Image saved to: {filepath}")
+        filepath = (await _render(prompt, size, quality))[0]
+
+        log.info("✅ Image saved to: %s", filepath)
+
+        if cache_key:
+            await run_blocking(
+                get_image_cache().put,
+                cache_key,
+                filepath,
+                ImageCache.normalize_params(prompt, size, quality, Config.IMAGE_MODEL)
+            )
         
-        # Return success message with special marker
-        # The [IMAGE_PATH:...] marker helps the system identify the image location
+        record_image(filepath, prompt=prompt, size=size, quality=quality, cached=False)
+
+        # The [IMAGE_PATH:...] marker tells the model where the image is,
+        # so follow-up requests can refer to it
         return f"Image generated successfully! The image shows: {prompt[:100]}... [IMAGE_PATH:{filepath}]"
+    except UpstreamUnavailable as e:
+        log.warning("⏳ Image generation refused locally: %s", e)
+        return f"Image generation is temporarily unavailable: {e}. Please try again shortly."
     except Exception as e:
         error_msg = str(e)
-        print(f"❌ Image generation failed: {error_msg}")
+        log.error("❌ Image generation failed: %s", error_msg)
         
         # Provide helpful error messages
         if "rate_limit" in error_msg.lower():
@@ -98,3 +190,150 @@ def generate_image(prompt: str, size: str = "1024x1024", quality: str = "high")-
             return "Image generation failed: Invalid API key. Please check your OpenAI API key."
         else:
             return f"Image generation failed: {error_msg}"
+
+
+async def run_generate_job(params: dict) -> dict:
+    """Job handler for "image_generate"."""
+    with collect_artifacts() as artifacts:
+        message = await create_image(**params)
+    return image_job_result(message, artifacts)
+
+
+def validate_batch(prompts: List[str], n: int) -> List[str]:
+    """
+    Return the non-blank prompts, or raise ValueError if the batch is
+    empty or over the configured limits.
+    """
+    prompts = [p for p in prompts if p and p.strip()]
+    if not prompts:
+        raise ValueError("At least one prompt is required")
+    if len(prompts) > Config.IMAGE_BATCH_MAX_ITEMS:
+        raise ValueError(f"At most {Config.IMAGE_BATCH_MAX_ITEMS} prompts per batch")
+    if not 1 <= n <= Config.IMAGE_BATCH_MAX_VARIANTS:
+        raise ValueError(f"n must be between 1 and {Config.IMAGE_BATCH_MAX_VARIANTS}")
+
+    return prompts
+
+
+async def _batch_item(
+    index: int,
+    prompt: str,
+    n: int,
+    size: str,
+    quality: str,
+    semaphore: asyncio.Semaphore
+) -> dict:
+    item = {"index": index, "prompt": prompt, "status": "succeeded", "images": [], "error": None}
+
+    async with semaphore:
+        try:
+            if n == 1:
+                # Single images go through the cache like generate_image
+                paths = [image_job_result(await create_image(prompt, size, quality))["image_path"]]
+            else:
+                # Variants come from one API call and are never cached
+                log.info("🎨 Generating %d variants: %s", n, prompt)
+                paths = await _render(prompt, size, quality, n)
+                for variant, path in enumerate(paths):
+                    record_image(path, prompt=prompt, size=size, quality=quality, cached=False, variant=variant + 1)
+        except Exception as e:
+            log.error("❌ Batch item %d failed: %s", index, e)
+            item["status"] = "failed"
+            item["error"] = str(e)
+            return item
+
+    # Public URLs only: items are streamed to HTTP clients as they are
+    item["images"] = []
+    for path in paths:
+        image_url = f"/outputs/{os.path.basename(path)}"
+        item["images"].append({"image_url": image_url, **OutputStore.variant_urls(image_url)})
+    return item
+
+
+async def generate_batch(
+    prompts: List[str],
+    n: int = 1,
+    size: str = "1024x1024",
+    quality: str = "high"
+) -> AsyncIterator[dict]:
+    """
+    Generate images for several prompts at once.
+
+    Every prompt gets `n` variants. At most IMAGE_BATCH_CONCURRENCY
+    prompts are in flight at a time, and each item is yielded as soon
+    as it finishes (so not in input order; use "index"). A failed item
+    is reported with status "failed" and does not stop the others.
+    Stopping the iteration cancels whatever is still running.
+    """
+    prompts = validate_batch(prompts, n)
+
+    semaphore = asyncio.Semaphore(Config.IMAGE_BATCH_CONCURRENCY)
+    tasks = [
+        asyncio.create_task(_batch_item(i, prompt, n, size, quality, semaphore))
+        for i, prompt in enumerate(prompts)
+    ]
+
+    try:
+        for finished in asyncio.as_completed(tasks):
+            yield await finished
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+@tool
+async def generate_images(
+    prompts: List[str],
+    n: int = 1,
+    size: str = "1024x1024",
+    quality: str = "high"
+) -> str:
+    """
+    Generate SEVERAL images at once: a set of different prompts and/or
+    several variants of each.
+
+    Use this instead of calling generate_image repeatedly, e.g.
+    "show this product in 3 styles" or "give me 4 versions of this logo".
+
+    Args:
+        prompts: One detailed description per image to create.
+                 Example: ["A red sneaker, studio photo", "A red sneaker, watercolor"]
+
+        n: Number of variants to create for EACH prompt (default 1).
+
+        size: "1024x1024" (default), "1536x1024", "1024x1536" or "auto".
+
+        quality: "low", "medium" or "high" (default).
+
+    Returns:
+        One line per prompt with the image URLs, or the error for that
+        prompt. The first image's [IMAGE_PATH:...] marker is included.
+
+    Examples:
+        generate_images(["A cozy cabin, oil painting", "A cozy cabin, pixel art"])
+        generate_images(["Minimalist fox logo"], n=4)
+    """
+    try:
+        items = [item async for item in generate_batch(prompts, n, size, quality)]
+    except ValueError as e:
+        return f"Image generation failed: {e}"
+
+    lines = []
+    first_path = None
+    for item in sorted(items, key=lambda i: i["index"]):
+        if item["status"] == "succeeded":
+            urls = ", ".join(image["image_url"] for image in item["images"])
+            lines.append(f"{item['index'] + 1}. {item['prompt'][:80]}: {urls}")
+            first_path = first_path or os.path.join(
+                Config.OUTPUT_DIR, os.path.basename(item["images"][0]["image_url"])
+            )
+        else:
+            lines.append(f"{item['index'] + 1}. {item['prompt'][:80]}: failed ({item['error']})")
+
+    succeeded = sum(1 for item in items if item["status"] == "succeeded")
+    summary = f"Generated images for {succeeded} of {len(items)} prompts:\n" + "\n".join(lines)
+
+    if first_path:
+        summary += f"\n[IMAGE_PATH:{first_path}]"
+
+    return summary
@@ -0,0 +1,248 @@
+import os
+import io
+import json
+import hashlib
+import threading
+from typing import List, Optional, Tuple
+import numpy as np
+from PIL import Image
+from src.agents.config import Config
+
+# A mask is a float32 array in [0, 1] at image resolution: 1 = edit,
+# 0 = keep. Regions use image pixel coordinates:
+#   {"type": "rect",    "x": 10, "y": 20, "width": 100, "height": 50}
+#   {"type": "ellipse", "x": 10, "y": 20, "width": 100, "height": 50}  (bounding box)
+#   {"type": "polygon", "points": [[x, y], [x, y], [x, y], ...]}
+
+
+def _rect(region: dict, yy: np.ndarray, xx: np.ndarray) -> np.ndarray:
+    x, y = float(region["x"]), float(region["y"])
+    return (xx >= x) & (xx < x + float(region["width"])) & (yy >= y) & (yy < y + float(region["height"]))
+
+
+def _ellipse(region: dict, yy: np.ndarray, xx: np.ndarray) -> np.ndarray:
+    rx, ry = float(region["width"]) / 2, float(region["height"]) / 2
+    if rx <= 0 or ry <= 0:
+        return np.zeros((yy.shape[0], xx.shape[1]), dtype=bool)
+    cx, cy = float(region["x"]) + rx, float(region["y"]) + ry
+    return ((xx - cx) / rx) ** 2 + ((yy - cy) / ry) ** 2 <= 1.0
+
+
+def _polygon(region: dict, yy: np.ndarray, xx: np.ndarray) -> np.ndarray:
+    """Even-odd fill: one vectorized ray-crossing test per edge."""
+    points = [(float(x), float(y)) for x, y in region["points"]]
+    if len(points) < 3:
+        raise ValueError("A polygon needs at least 3 points")
+
+    inside = np.zeros((yy.shape[0], xx.shape[1]), dtype=bool)
+    for (x1, y1), (x2, y2) in zip(points, points[1:] + points[:1]):
+        if y1 == y2:
+            continue
+        spans = (yy > min(y1, y2)) & (yy <= max(y1, y2))
+        x_cross = x1 + (yy - y1) * (x2 - x1) / (y2 - y1)
+        inside ^= spans & (xx < x_cross)
+
+    return inside
+
+
+REGION_TYPES = {
+    "rect": _rect,
+    "rectangle": _rect,
+    "ellipse": _ellipse,
+    "polygon": _polygon
+}
+
+
+def _box_blur(mask: np.ndarray, radius: int, axis: int) -> np.ndarray:
+    """Running mean over 2*radius+1 pixels along one axis (edges clamped)."""
+    pad = [(0, 0), (0, 0)]
+    pad[axis] = (radius + 1, radius)
+    summed = np.cumsum(np.pad(mask, pad, mode="edge"), axis=axis, dtype=np.float64)
+
+    width = 2 * radius + 1
+    upper = np.take(summed, np.arange(width, summed.shape[axis]), axis=axis)
+    lower = np.take(summed, np.arange(0, summed.shape[axis] - width), axis=axis)
+    return ((upper - lower) / width).astype(np.float32)
+
+
+def feather(mask: np.ndarray, radius: float) -> np.ndarray:
+    """Soften mask edges; three box blurs approximate a Gaussian."""
+    box = max(1, int(round(radius / 2)))
+    for _ in range(3):
+        mask = _box_blur(_box_blur(mask, box, axis=0), box, axis=1)
+    return np.clip(mask, 0.0, 1.0)
+
+
+def build_mask(
+    size: Tuple[int, int],
+    regions: List[dict],
+    feather_radius: float = 0,
+    invert: bool = False
+) -> np.ndarray:
+    """Rasterize regions into a (height, width) mask; 1 = edit."""
+    width, height = size
+    # Sample at pixel centres
+    yy = np.arange(height, dtype=np.float32)[:, None] + 0.5
+    xx = np.arange(width, dtype=np.float32)[None, :] + 0.5
+
+    selected = np.zeros((height, width), dtype=bool)
+    for region in regions:
+        shape = REGION_TYPES.get(str(region.get("type", "rect")).lower())
+        if shape is None:
+            raise ValueError(f"Unknown region type: {region.get('type')}")
+        selected |= shape(region, yy, xx)
+
+    mask = selected.astype(np.float32)
+    if feather_radius and feather_radius > 0:
+        mask = feather(mask, feather_radius)
+    if invert:
+        mask = 1.0 - mask
+
+    return mask
+
+
+def load_mask_file(path: str, size: Tuple[int, int]) -> np.ndarray:
+    """
+    Read a mask image as drawn by users (white = edit, black = keep).
+
+    A mask that already uses transparency (the edit API's convention,
+    transparent = edit) is read from its alpha channel instead.
+    """
+    with Image.open(path) as img:
+        if img.mode in ("RGBA", "LA") and img.getchannel("A").getextrema()[0] < 255:
+            channel = img.getchannel("A").resize(size, Image.Resampling.BILINEAR)
+            return 1.0 - np.asarray(channel, dtype=np.float32) / 255.0
+
+        channel = img.convert("L").resize(size, Image.Resampling.BILINEAR)
+        return np.asarray(channel, dtype=np.float32) / 255.0
+
+
+def to_api_mask(mask: np.ndarray, size: Tuple[int, int]) -> bytes:
+    """
+    PNG for the edit API at `size`: fully transparent where anything may
+    change (including feathered edges), opaque elsewhere.
+    """
+    image = Image.fromarray((mask * 255).astype(np.uint8))
+    if image.size != tuple(size):
+        image = image.resize(size, Image.Resampling.BILINEAR)
+
+    alpha = np.where(np.asarray(image) > 0, 0, 255).astype(np.uint8)
+    rgba = np.zeros(alpha.shape + (4,), dtype=np.uint8)
+    rgba[..., 3] = alpha
+
+    buffer = io.BytesIO()
+    Image.fromarray(rgba).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def to_selection_image(mask: np.ndarray) -> Image.Image:
+    """Mask as a user-facing RGBA image: white = edit, black = keep."""
+    gray = (mask * 255).astype(np.uint8)
+    rgba = np.stack([gray, gray, gray, np.full_like(gray, 255)], axis=-1)
+    return Image.fromarray(rgba)
+
+
+def composite(original: Image.Image, edited: Image.Image, mask: np.ndarray) -> Image.Image:
+    """
+    Blend the edited image into the original through the mask, at the
+    original's resolution, so pixels outside the mask stay untouched.
+    """
+    mode = "RGBA" if original.mode in ("RGBA", "LA", "PA") else "RGB"
+    base = np.asarray(original.convert(mode), dtype=np.float32)
+    top = np.asarray(
+        edited.convert(mode).resize(original.size, Image.Resampling.LANCZOS),
+        dtype=np.float32
+    )
+
+    weight = mask[..., None]
+    blended = base + (top - base) * weight
+    return Image.fromarray(np.clip(blended + 0.5, 0, 255).astype(np.uint8))
+
+
+class MaskCache:
+    """
+    Masks cached on disk by (image hash, geometry).
+
+    Stored as 8-bit PNGs under OUTPUT_DIR/.masks. The oldest files are
+    pruned once there are more than MASK_CACHE_MAX_ENTRIES.
+    """
+
+    def __init__(self, cache_dir: str = os.path.join(Config.OUTPUT_DIR, ".masks")):
+        self.cache_dir = cache_dir
+        self.max_entries = Config.MASK_CACHE_MAX_ENTRIES
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(image_hash: str, size: Tuple[int, int], regions: List[dict], feather_radius: float, invert: bool) -> str:
+        geometry = json.dumps(
+            {"size": list(size), "regions": regions, "feather": feather_radius, "invert": bool(invert)},
+            sort_keys=True
+        )
+        return hashlib.sha256(f"{image_hash}:{geometry}".encode("utf-8")).hexdigest()
+
+    def get_or_build(
+        self,
+        image_hash: str,
+        size: Tuple[int, int],
+        regions: List[dict],
+        feather_radius: float = 0,
+        invert: bool = False
+    ) -> np.ndarray:
+        """Blocking; run in the offload pool."""
+        key = self.make_key(image_hash, size, regions, feather_radius, invert)
+        path = os.path.join(self.cache_dir, f"{key}.png")
+
+        try:
+            with Image.open(path) as img:
+                mask = np.asarray(img, dtype=np.float32) / 255.0
+            os.utime(path)
+            self.hits += 1
+            return mask
+        except (FileNotFoundError, OSError):
+            pass
+
+        self.misses += 1
+        mask = build_mask(size, regions, feather_radius, invert)
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        Image.fromarray(np.round(mask * 255).astype(np.uint8)).save(tmp_path, format="PNG")
+        os.replace(tmp_path, path)
+        self._prune()
+
+        return mask
+
+    def _prune(self):
+        with self._lock:
+            entries = [e for e in os.scandir(self.cache_dir) if e.name.endswith(".png")]
+            if len(entries) <= self.max_entries:
+                return
+            entries.sort(key=lambda e: e.stat().st_mtime)
+            for entry in entries[:len(entries) - self.max_entries]:
+                try:
+                    os.remove(entry.path)
+                except FileNotFoundError:
+                    pass
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0
+        }
+
+
+_mask_cache: Optional[MaskCache] = None
+
+
+def get_mask_cache() -> MaskCache:
+    global _mask_cache
+
+    if _mask_cache is None:
+        _mask_cache = MaskCache()
+
+    return _mask_cache
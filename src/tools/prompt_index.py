@@ -0,0 +1,100 @@
+import re
+import random
+import hashlib
+from typing import List
+
+# MinHash signature = NUM_PERM hash minimums, split into BANDS buckets of
+# ROWS values for locality-sensitive lookup. 16 bands x 4 rows surfaces
+# candidates from roughly 0.5 Jaccard up; the exact check does the rest.
+NUM_PERM = 64
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_rng = random.Random(1337)
+_PERMUTATIONS = [
+    (_rng.randrange(1, _MERSENNE_PRIME), _rng.randrange(0, _MERSENNE_PRIME))
+    for _ in range(NUM_PERM)
+]
+
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+# Separators between the independent parts of a prompt ("red sneaker, studio photo")
+_PHRASE_RE = re.compile(r"[,;|\n]+")
+
+
+def _pairs(words: List[str]) -> List[str]:
+    return [f"{first} {second}" for first, second in zip(words, words[1:])]
+
+
+def prompt_tokens(prompt: str) -> List[str]:
+    """
+    Normalize a prompt to its sorted set of lowercase words and word
+    pairs (2-shingles).
+
+    Whitespace, casing and punctuation are ignored, so "a cat in a hat"
+    and "A cat, in a hat." give the same tokens. The pairs keep word
+    order: "a dog chasing a cat" and "a cat chasing a dog" share all
+    their words but only one of their four pairs. These tokens feed the
+    MinHash/LSH index; prompt_similarity makes the final call.
+    """
+    words = _WORD_RE.findall(prompt.lower())
+    return sorted(set(words) | set(_pairs(words)))
+
+
+def phrase_tokens(prompt: str) -> List[str]:
+    """
+    Words plus the word pairs inside each comma/semicolon-separated
+    phrase, so reordering whole phrases ("studio photo, red sneaker")
+    changes nothing while word order within a phrase still counts.
+    """
+    tokens = set()
+    for phrase in _PHRASE_RE.split(prompt.lower()):
+        words = _WORD_RE.findall(phrase)
+        tokens.update(words)
+        tokens.update(_pairs(words))
+    return sorted(tokens)
+
+
+def prompt_similarity(a: str, b: str) -> float:
+    """
+    Near-duplicate score of two prompts: the better of the whole-prompt
+    shingle Jaccard (ignores punctuation) and the per-phrase one
+    (ignores the order of phrases).
+    """
+    return max(
+        jaccard(prompt_tokens(a), prompt_tokens(b)),
+        jaccard(phrase_tokens(a), phrase_tokens(b))
+    )
+
+
+def _token_hash(token: str) -> int:
+    return int.from_bytes(hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+def minhash(tokens: List[str]) -> List[int]:
+    if not tokens:
+        return [_MERSENNE_PRIME] * NUM_PERM
+
+    hashes = [_token_hash(t) for t in tokens]
+    return [
+        min((a * h + b) % _MERSENNE_PRIME for h in hashes)
+        for a, b in _PERMUTATIONS
+    ]
+
+
+def band_buckets(signature: List[int]) -> List[str]:
+    """One bucket id per band; prompts sharing any bucket are candidates."""
+    return [
+        hashlib.blake2b(
+            ",".join(str(v) for v in signature[i * ROWS:(i + 1) * ROWS]).encode(),
+            digest_size=8
+        ).hexdigest()
+        for i in range(BANDS)
+    ]
+
+
+def jaccard(a: List[str], b: List[str]) -> float:
+    set_a, set_b = set(a), set(b)
+    if not set_a and not set_b:
+        return 1.0
+    return len(set_a & set_b) / len(set_a | set_b)
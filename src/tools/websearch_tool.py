@@ -1,8 +1,49 @@
 import json
-import anyio
 from strands import tool
 from ddgs import DDGS
 from ddgs.exceptions import DDGSException, RatelimitException
+from src.agents.config import Config
+from src.services.clients import get_clients
+from src.services.offload import run_blocking
+from src.services.ttl_cache import AsyncTTLCache
+from src.services.rate_limiter import UpstreamUnavailable, get_guard
+
+# Shared across sessions: identical searches within the TTL are answered
+# from memory, concurrent ones share a single DuckDuckGo call, and stale
+# results are served while DuckDuckGo is rate limiting us or our own
+# limiter/circuit breaker is holding calls back. With a shared
+# STATE_BACKEND, results are shared between worker processes too.
+search_cache = AsyncTTLCache(
+    ttl=Config.SEARCH_CACHE_TTL_SECONDS,
+    max_entries=Config.SEARCH_CACHE_MAX_ENTRIES,
+    stale_ttl=Config.SEARCH_CACHE_STALE_SECONDS,
+    stale_on=(RatelimitException, UpstreamUnavailable),
+    shared_namespace="websearch"
+)
+
+
+def _cache_key(keywords: str, region: str, max_results: int) -> tuple:
+    return (" ".join(keywords.lower().split()), region.strip().lower(), int(max_results))
+
+
+def _ddgs_text(keywords: str, region: str, max_results: int) -> list:
+    return DDGS().text(keywords, region=region, max_results=max_results) or []
+
+
+async def _search_api(keywords: str, region: str, max_results: int) -> list:
+    response = await get_clients().http.get(
+        Config.SEARCH_API_URL,
+        params={"q": keywords, "region": region, "max_results": max_results}
+    )
+    response.raise_for_status()
+    return response.json()
+
+
+async def _fetch(keywords: str, region: str, max_results: int) -> list:
+    async with get_guard("duckduckgo", "text").slot():
+        if Config.SEARCH_API_URL:
+            return await _search_api(keywords, region, max_results)
+        return await run_blocking(_ddgs_text, keywords, region, max_results)
 
 
 @tool
@@ -19,16 +60,20 @@ async def websearch(keywords: str, region: str = "us-en", max_results: int = 5)
         A **pretty JSON string** list of results on success, e.g.:
         `[{"title": "...", "href": "...", "body": "..."}, ...]`
         - On rate-limit: `"Rate limit reached. Please try again later."`
+        - While the search guard is refusing calls: `"Search is temporarily unavailable: ..."`
         - On library/other errors: `"Search error: <message>"`
     """
     try:
-        results = await anyio.to_thread.run_sync(
-            lambda: DDGS().text(keywords, region=region, max_results=max_results)
+        results = await search_cache.get_or_fetch(
+            _cache_key(keywords, region, max_results),
+            lambda: _fetch(keywords, region, max_results)
         )
-        return json.dumps(results or [], ensure_ascii=False, indent=2)
+        return json.dumps(results, ensure_ascii=False, indent=2)
     except RatelimitException:
         return "Rate limit reached. Please try again later."
+    except UpstreamUnavailable as e:
+        return f"Search is temporarily unavailable: {e}. Please try again later."
     except DDGSException as e:
         return f"Search error: {e}"
     except Exception as e:
-        return f"Search error: {str(e)}"
\ No newline at end of file
+        return f"Search error: {str(e)}"